@@ -1,5 +1,6 @@
 import streamlit as st
-import pandas as pd
+import precompute
+import profiling
 
 # Page config
 st.set_page_config(
@@ -7,6 +8,17 @@ st.set_page_config(
     page_icon="🦠",
 )
 
+# Hidden diagnostics page: open the app with ?diagnostics in the URL
+if "diagnostics" in st.query_params:
+    import diagnostics
+    profiling.page("Diagnostics")
+    diagnostics.render()
+    st.stop()
+profiling.page("Home")
+
+# Start filling the caches for all pages in the background as soon as the app is opened
+precompute.start()
+
 # ---- TITLE SECTION ----
 st.markdown("<h1 style='text-align: center; color: #6C63FF;'>🌍 Explaining COVID-19 Death Rates Across Countries:</h1>", unsafe_allow_html=True)
 st.markdown("<h4 style='text-align: center;'>The Role of Demographics, Health, and Development</h4>", unsafe_allow_html=True)
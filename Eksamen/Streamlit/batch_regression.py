@@ -0,0 +1,175 @@
+"""
+Batched linear regression over every combination of the candidate predictors.
+
+Instead of fitting one LinearRegression per feature list, all models are solved from one
+shared Gram (cross-product) matrix of the standardized predictors and targets. The subsets
+are visited in Gray-code order, so each model differs from the previous one by a single
+column. That column is added or removed with one sweep of the matrix, which updates the
+coefficients and residual sums of squares of both targets at once.
+
+The models are fitted on all countries (no train/test split), so the table is meant for
+comparing feature sets, not for reporting test scores.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import require_master, dataset_version
+import profiling
+
+# Predictors listed on the Data Modeling page
+CANDIDATE_FEATURES = [
+    "median_age", "aged_65_older", "aged_70_older",
+    "cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers",
+    "life_expectancy", "human_development_index", "population",
+]
+
+TARGETS = ["total_deaths", "total_deaths_per_million"]
+
+# Which dataset's median fills each column's missing values
+SOURCE_COLUMNS = {
+    "age": ["median_age", "aged_65_older", "aged_70_older", "life_expectancy"],
+    "health": ["cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers"],
+    "covid": ["human_development_index", "population", "total_deaths", "total_deaths_per_million"],
+}
+
+# A column whose remaining variance (relative to its own) is below this is treated as collinear
+SINGULAR_TOLERANCE = 1e-10
+
+
+def candidate_frame():
+    """
+    Returns one row per country that is in all three cleaned datasets, with every candidate
+    predictor and both targets.
+    """
+    master = require_master()
+    rows = master.rows(list(SOURCE_COLUMNS))
+    parts = [master.view(dataset, columns, rows=rows) for dataset, columns in SOURCE_COLUMNS.items()]
+    df = pd.concat(parts, axis=1)
+    df.insert(0, "location", master.frame.index[rows].astype(str))
+    return df[["location"] + CANDIDATE_FEATURES + TARGETS]
+
+
+def sweep(A, k, reverse=False):
+    """
+    Sweeps the symmetric matrix A on column k in place. After sweeping a set of predictor
+    columns, A[target, target] is the residual sum of squares and A[predictor, target] the
+    coefficient of that predictor. A reverse sweep on the same column takes it out again.
+    """
+    d = A[k, k]
+    row = A[k].copy()
+    col = A[:, k].copy()
+    A -= np.outer(col, row) / d
+    sign = -1.0 if reverse else 1.0
+    A[k, :] = sign * row / d
+    A[:, k] = sign * col / d
+    A[k, k] = -1.0 / d
+
+
+def gray_code_steps(n):
+    """
+    Yields (subset mask, column toggled) for all 2**n - 1 non-empty subsets of n columns,
+    each subset differing from the previous one by a single column.
+    """
+    for i in range(1, 2 ** n):
+        column = (i & -i).bit_length() - 1
+        yield i ^ (i >> 1), column
+
+
+def all_subsets_ols(X, Y):
+    """
+    Fits OLS with an intercept for every non-empty subset of the columns of X against every
+    column of Y. Returns (masks, r2, coefs, intercepts):
+      masks       (m, p) bool, the columns in each model
+      r2          (m, t) R² per model and target (NaN when the subset is collinear)
+      coefs       (m, p, t) coefficients in the original units (0 for columns not in the model)
+      intercepts  (m, t)
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    n, p = X.shape
+    t = Y.shape[1]
+
+    # Standardized columns keep the sweeps well conditioned (population is ~1e9, HDI ~1)
+    data = np.hstack([X, Y])
+    mean = data.mean(axis=0)
+    scale = data.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (data - mean) / scale
+    A = Z.T @ Z
+    base_diag = np.diag(A).copy()
+    total = base_diag[p:]
+
+    m = 2 ** p - 1
+    masks = np.zeros((m, p), dtype=bool)
+    r2 = np.full((m, t), np.nan)
+    std_coefs = np.zeros((m, p, t))
+
+    swept = np.zeros(p, dtype=bool)
+    wanted = np.zeros(p, dtype=bool)
+    for row, (mask, k) in enumerate(gray_code_steps(p)):
+        if wanted[k]:
+            wanted[k] = False
+            if swept[k]:
+                sweep(A, k, reverse=True)
+                swept[k] = False
+        else:
+            wanted[k] = True
+            # Skip columns that are (nearly) a combination of the ones already in the model
+            if A[k, k] > SINGULAR_TOLERANCE * base_diag[k]:
+                sweep(A, k)
+                swept[k] = True
+
+        masks[row] = wanted
+        if (swept == wanted).all():
+            r2[row] = 1.0 - np.diag(A)[p:] / total
+            std_coefs[row, swept] = A[np.ix_(swept, np.arange(p, p + t))]
+
+    # Back to the original units
+    coefs = std_coefs * scale[p:] / scale[:p, None]
+    intercepts = mean[p:] - np.einsum("mpt,p->mt", coefs, mean[:p])
+    return masks, r2, coefs, intercepts
+
+
+def subset_table(df, features=CANDIDATE_FEATURES, targets=TARGETS):
+    """
+    Returns one row per (target, feature subset) with R², adjusted R², the intercept and a
+    coefficient column per feature (NaN when the feature is not in the model), ranked by
+    adjusted R² within each target.
+    """
+    masks, r2, coefs, intercepts = all_subsets_ols(df[features], df[targets])
+    n = len(df)
+    n_features = masks.sum(axis=1)
+    names = np.array([" + ".join(np.array(features)[mask]) for mask in masks])
+
+    tables = []
+    for j, target in enumerate(targets):
+        table = pd.DataFrame({
+            "target": target,
+            "features": names,
+            "n_features": n_features,
+            "r2": r2[:, j],
+            "adj_r2": 1 - (1 - r2[:, j]) * (n - 1) / (n - n_features - 1),
+            "intercept": intercepts[:, j],
+        })
+        coef = pd.DataFrame(np.where(masks, coefs[:, :, j], np.nan), columns=features)
+        tables.append(pd.concat([table, coef], axis=1))
+
+    result = pd.concat(tables, ignore_index=True).dropna(subset=["r2"])
+    result = result.sort_values(["target", "adj_r2"], ascending=[True, False], ignore_index=True)
+    result.insert(2, "rank", result.groupby("target").cumcount() + 1)
+    return result
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+@profiling.counts_miss("subsets")
+def _subset_table(version):
+    return subset_table(candidate_frame())
+
+
+@profiling.timed("fit:all_subsets", cache="subsets")
+def get_subset_table():
+    """
+    Returns the ranked table of all feature subsets for both targets, computed once per dataset version.
+    """
+    return _subset_table(dataset_version())
@@ -0,0 +1,436 @@
+"""
+Benchmarks for the Streamlit app.
+
+Measures wall time and peak memory for:
+  - the cold start: booting the Streamlit server, and the first render of every page in a
+    fresh Python process (with the heavy libraries each page ended up importing)
+  - every page script, run headlessly with Streamlit's AppTest (cold and warm caches)
+  - the dataset loaders (CSV and Parquet)
+  - the regression and decision tree fits from the Data Modeling page, the all-subsets engine
+    and the feature importances
+  - the figures from the Data Visualisation, Explorer and World Map pages, with the size of
+    the plotly figures sent to the browser
+
+The loaders, fits and figures are also run on synthetic datasets with 10x/100x/1000x the rows
+of the real data, to see how they scale. Results are saved as a JSON baseline; later runs can
+be compared against it.
+
+Run from the Streamlit folder with:
+    python benchmark.py --save      (measure and save the baseline)
+    python benchmark.py             (measure and compare against the saved baseline)
+    python benchmark.py --scales 1 10 --skip-pages --skip-startup
+"""
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import batch_regression
+import clustering
+import data
+import figures
+import importance
+import maps
+import models
+import profiling
+import rendering
+import scoring
+import storage
+
+BASE_DIR = Path(__file__).resolve().parent
+BASELINE_FILE = BASE_DIR / ".cache" / "benchmark_baseline.json"
+
+PAGES = [
+    "app.py",
+    "pages/DataPreparation.py",
+    "pages/DataVisualisation.py",
+    "pages/DataModeling.py",
+    "pages/WorldMap.py",
+    "pages/Conclusion.py",
+    "pages/Explorer.py",
+    "pages/TimeSeries.py",
+]
+
+# Libraries that are slow to import; the startup benchmark lists which ones a page loaded
+HEAVY_MODULES = ["matplotlib", "seaborn", "sklearn", "scipy", "plotly", "pyarrow", "pandas", "joblib", "PIL"]
+
+# Runs one page in a fresh interpreter and prints its render time, peak memory and heavy imports
+FIRST_RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+import profiling
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300).run()
+seconds = time.perf_counter() - start
+loaded = {name.split(".")[0] for name in set(sys.modules) - before}
+print(json.dumps({
+    "seconds": seconds,
+    "peak_mb": profiling.peak_memory_mb(),
+    "heavy_modules": sorted(loaded & set(sys.argv[2:])),
+    "error": str(at.exception[0].value) if at.exception else None,
+}))
+"""
+
+# Seconds to wait for the server to answer its health check
+SERVER_BOOT_TIMEOUT = 120
+
+SCALES = [1, 10, 100, 1000]
+
+# A run counts as slower than the baseline when it takes this much longer
+DEFAULT_THRESHOLD = 0.25
+
+# ...and at least this many seconds longer, so timer noise on tiny benchmarks is not flagged
+MIN_SLOWDOWN_SECONDS = 0.01
+
+
+def measure(func, repeat=3):
+    """
+    Runs func repeat times for the wall time (best and median run) and once more under
+    tracemalloc for the peak memory, so the tracing does not slow down the timed runs.
+    tracemalloc sees Python and numpy allocations but not memory allocated inside pyarrow.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(times),
+        "median_seconds": float(np.median(times)),
+        "peak_mb": peak / 2 ** 20,
+    }
+
+
+def synthetic_dataset(df, scale, seed=0):
+    """
+    Returns a dataset with scale times the rows of df: rows are drawn at random and every
+    numeric value gets a little noise. Copies of a country get their own location name.
+    """
+    if scale == 1:
+        return df.copy()
+    rng = np.random.default_rng(seed)
+    n = len(df) * scale
+    out = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+
+    numeric = out.select_dtypes("number").columns
+    noise = rng.lognormal(0, 0.05, size=(n, len(numeric)))
+    out[numeric] = out[numeric].to_numpy(dtype=float) * noise
+
+    if "location" in out:
+        copy = (np.arange(n) // len(df)).astype(str)
+        out["location"] = out["location"].astype(str) + " #" + copy
+    return out
+
+
+def clear_streamlit_caches():
+    import streamlit as st
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def bench_pages(repeat):
+    """
+    Runs every page with AppTest, once right after clearing Streamlit's caches (cold) and
+    again with the caches filled (warm). Models saved under .cache/models are kept.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page in PAGES:
+        path = str(BASE_DIR / page)
+
+        def run():
+            at = AppTest.from_file(path, default_timeout=300).run()
+            if at.exception:
+                raise RuntimeError(f"{page} failed: {at.exception[0].value}")
+
+        def run_cold():
+            clear_streamlit_caches()
+            run()
+
+        results[f"page/{page}/cold"] = measure(run_cold, repeat)
+        results[f"page/{page}/warm"] = measure(run, repeat)
+    return results
+
+
+def first_render(page):
+    """
+    Renders one page with AppTest in a new Python process, so nothing is imported or cached yet.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_RENDER_SCRIPT, str(BASE_DIR / page)] + HEAVY_MODULES,
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    if result["error"]:
+        raise RuntimeError(f"{page} failed: {result['error']}")
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_boot():
+    """
+    Starts `streamlit run app.py` headless and returns the seconds until its health check answers.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "streamlit", "run", "app.py", "--server.headless", "true",
+               "--server.port", str(port), "--browser.gatherUsageStats", "false"]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < SERVER_BOOT_TIMEOUT:
+            if server.poll() is not None:
+                raise RuntimeError(f"streamlit exited with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"streamlit did not answer within {SERVER_BOOT_TIMEOUT} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_startup(repeat):
+    """
+    Times the cold start: the server boot and the first render of every page, each in a new process.
+    """
+    boots = [server_boot() for _ in range(repeat)]
+    results = {"startup/server_boot": {"seconds": min(boots), "median_seconds": float(np.median(boots)), "peak_mb": 0.0}}
+    for page in PAGES:
+        runs = [first_render(page) for _ in range(repeat)]
+        times = [run["seconds"] for run in runs]
+        results[f"startup/first_render/{page}"] = {
+            "seconds": min(times),
+            "median_seconds": float(np.median(times)),
+            # None where the peak memory cannot be measured (Windows without psutil)
+            "peak_mb": None if runs[0]["peak_mb"] is None else max(run["peak_mb"] for run in runs),
+            "heavy_modules": ", ".join(runs[0]["heavy_modules"]),
+        }
+    return results
+
+
+def bench_loaders(datasets, scale, folder, repeat):
+    """
+    Times reading each dataset from CSV (with the dtype downcast) and from a Parquet snapshot.
+    """
+    results = {}
+    for name, df in datasets.items():
+        csv_path = Path(folder) / f"{name}.csv"
+        df.to_csv(csv_path, index=False)
+        parquet_path = storage.write_snapshot(df, name, folder)
+
+        results[f"load/{name}/csv/{scale}x"] = measure(
+            lambda: data.downcast_dtypes(pd.read_csv(csv_path)), repeat)
+        results[f"load/{name}/parquet/{scale}x"] = measure(
+            lambda: storage.read_snapshot(parquet_path), repeat)
+    return results
+
+
+def bench_models(datasets, scale, repeat):
+    results = {}
+    for key, spec in models.MODEL_SPECS.items():
+        df = datasets[spec["dataset"]]
+        results[f"fit/{key}/{scale}x"] = measure(lambda: models.fit_regression(spec, df), repeat)
+    spec = models.TREE_SPEC
+    results[f"fit/tree/{scale}x"] = measure(lambda: models.fit_tree(spec, datasets[spec["dataset"]]), repeat)
+    return results
+
+
+def bench_scoring(scorer, scale, repeat):
+    """
+    Times validating and scoring a batch of countries with all models, with and without a scenario.
+    """
+    batch = synthetic_dataset(scoring.country_batch(scorer.features()), scale)
+    scenario = scoring.parse_scenario(["aged_65_older=+5%"])
+    return {
+        f"score/all_models/{scale}x": measure(lambda: scorer.score(batch), repeat),
+        f"score/scenario/{scale}x": measure(lambda: scorer.score(batch, scenario=scenario), repeat),
+    }
+
+
+def bench_clustering(countries, scale, repeat):
+    """
+    Times the k sweep of the risk-profile clustering (scaling, mini-batch k-means and silhouettes).
+    """
+    df = synthetic_dataset(countries, scale)
+    return {f"fit/clusters/{scale}x": measure(lambda: clustering.fit_clusters(clustering.CLUSTER_SPEC, df), repeat)}
+
+
+def bench_batch_regression(candidates, scale, repeat):
+    """
+    Times fitting every feature subset for both targets with the batched engine.
+    """
+    df = synthetic_dataset(candidates, scale)
+    return {f"fit/all_subsets/{scale}x": measure(lambda: batch_regression.subset_table(df), repeat)}
+
+
+def bench_importance(candidates, scale, repeat):
+    """
+    Times the permutation and drop-column importances of every candidate predictor.
+    """
+    df = synthetic_dataset(candidates, scale)
+    return {f"fit/importance/{scale}x": measure(
+        lambda: importance.compute_importance(importance.IMPORTANCE_SPEC, df), repeat)}
+
+
+def bench_figures(datasets, scale, repeat):
+    """
+    Times drawing and saving every Data Visualisation plot and building every World Map figure,
+    and the Explorer scatter plot with the size of its JSON.
+    """
+    results = {}
+    for section, plots in figures.PLOTS.items():
+        for name, (dataset, draw, params) in plots.items():
+            df = datasets[dataset]
+            results[f"figure/{section}/{name}/{scale}x"] = measure(
+                lambda: figures.figure_to_png(draw(df, **params)), repeat)
+
+    covid = datasets["covid"]
+    scatter = lambda: rendering.scatter_figure(
+        covid, x="human_development_index", y="total_deaths_per_million", color="continent",
+        hover_name="location", title="HDI vs Deaths per Million").to_json()
+    results[f"figure/explorer_scatter/{scale}x"] = {
+        **measure(scatter, repeat), "payload_kb": len(scatter()) / 1024}
+
+    # The map has one row per country, so the synthetic copies reuse the real ISO codes
+    for label in maps.METRIC_OPTIONS:
+        payload = maps.map_payload(label)
+        payload = synthetic_dataset(payload, scale)
+        results[f"map/{label}/{scale}x"] = measure(
+            lambda: maps.build_map_figure(label, payload).to_json(), repeat)
+    return results
+
+
+def read_full(name):
+    """
+    Reads a whole dataset without Streamlit's cache, as the base for the synthetic datasets.
+    """
+    path = data.source_path(name)
+    if path.suffix == ".parquet":
+        return storage.read_snapshot(path)
+    return pd.read_csv(path)
+
+
+def run_benchmarks(scales=SCALES, repeat=3, pages=True, startup=True, log=print):
+    results = {}
+    if startup:
+        log("..Startup")
+        results.update(bench_startup(repeat))
+    if pages:
+        log("..Pages")
+        results.update(bench_pages(repeat))
+
+    base = {name: read_full(name) for name in ["covid", "age", "health", "raw"]}
+    candidates = batch_regression.candidate_frame()
+    scorer = scoring.load_scorer()
+    countries = clustering.cluster_frame()
+
+    for scale in scales:
+        log(f"..Scale {scale}x")
+        datasets = {name: synthetic_dataset(df, scale) for name, df in base.items()}
+        with tempfile.TemporaryDirectory() as folder:
+            results.update(bench_loaders(datasets, scale, folder, repeat))
+        model_data = {name: df for name, df in datasets.items() if name != "raw"}
+        results.update(bench_models(model_data, scale, repeat))
+        results.update(bench_batch_regression(candidates, scale, repeat))
+        results.update(bench_importance(candidates, scale, repeat))
+        results.update(bench_scoring(scorer, scale, repeat))
+        results.update(bench_clustering(countries, scale, repeat))
+        results.update(bench_figures(model_data, scale, repeat))
+
+    return {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "dataset_version": data.dataset_version(),
+        "max_rss_mb": profiling.peak_memory_mb(),
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns a table of every benchmark in both runs with the time and memory ratio
+    (current / baseline) and whether it got slower than the threshold allows.
+    """
+    rows = []
+    for key, result in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        time_ratio = result["seconds"] / before["seconds"] if before["seconds"] else np.nan
+        memory_ratio = result["peak_mb"] / before["peak_mb"] if before["peak_mb"] and result["peak_mb"] is not None else np.nan
+        rows.append({
+            "benchmark": key,
+            "seconds": result["seconds"],
+            "baseline_seconds": before["seconds"],
+            "time_ratio": time_ratio,
+            "peak_mb": result["peak_mb"],
+            "baseline_peak_mb": before["peak_mb"],
+            "memory_ratio": memory_ratio,
+            "slower": time_ratio > 1 + threshold and result["seconds"] - before["seconds"] > MIN_SLOWDOWN_SECONDS,
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Streamlit app and compare against a baseline.")
+    parser.add_argument("--save", action="store_true", help="save this run as the new baseline")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="path of the JSON baseline")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="dataset sizes to test, as multiples of the real data")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--skip-pages", action="store_true", help="do not run the page scripts")
+    parser.add_argument("--skip-startup", action="store_true", help="do not measure the server boot and first page renders")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown before a benchmark is flagged")
+    args = parser.parse_args()
+
+    current = run_benchmarks(scales=args.scales, repeat=args.repeat, pages=not args.skip_pages,
+                             startup=not args.skip_startup)
+    baseline_path = Path(args.baseline)
+
+    if args.save or not baseline_path.exists():
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2))
+        table = pd.DataFrame.from_dict(current["results"], orient="index")
+        print(table.round(4).to_string())
+        print(f"..Saved baseline to {baseline_path}")
+        return 0
+
+    table = compare(current, json.loads(baseline_path.read_text()), args.threshold)
+    with pd.option_context("display.width", 200):
+        print(table.round(3).to_string(index=False))
+    slower = table[table["slower"]] if len(table) else table
+    print(f"..{len(slower)} of {len(table)} benchmarks slower than the baseline (threshold {args.threshold:.0%})")
+    return 1 if len(slower) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
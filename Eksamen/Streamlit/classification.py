@@ -0,0 +1,192 @@
+"""
+Hyperparameter search for the death rate decision tree from hypothesis 3.
+
+total_deaths_per_million is split into n quantile classes (pd.qcut) and a DecisionTreeClassifier
+is tuned over depth, min_samples_leaf, criterion and the number of classes, using repeated
+stratified k-fold accuracy. The search runs in rounds on a joblib worker pool:
+
+  - within a round, the depths of a (classes, criterion, min_samples_leaf) group are tried
+    from shallow to deep; once no fold's tree reaches the depth limit, every deeper setting
+    grows the same tree, so those configs are dropped without fitting them
+  - after each round only the best third of the configs for each class count is kept, and
+    only those are scored on the next round's folds
+
+The search and the best tree per class count are saved with the model registry (models.py),
+so they are computed once per dataset version.
+"""
+import itertools
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import dataset_version
+import profiling
+from models import TREE_SPEC, fit_tree, load_or_fit
+
+# Class names for each number of quantile bins
+CLASS_LABELS = {
+    2: ["Low", "High"],
+    3: ["Low", "Medium", "High"],
+    4: ["Low", "Medium-low", "Medium-high", "High"],
+    5: ["Very low", "Low", "Medium", "High", "Very high"],
+}
+
+SEARCH_SPEC = {
+    "dataset": TREE_SPEC["dataset"],
+    "features": TREE_SPEC["features"],
+    "target": TREE_SPEC["target"],
+    "grid": {
+        "n_bins": [2, 3, 4, 5],
+        "criterion": ["gini", "entropy"],
+        "min_samples_leaf": [1, 2, 4, 8, 16],
+        "max_depth": [1, 2, 3, 4, 5, 6, 8, None],
+    },
+    "n_splits": 5,
+    "rounds": 3,
+    "keep": 1 / 3,
+    # The best tree per class count is refitted on the same split as hypothesis 3
+    "test_size": TREE_SPEC["test_size"],
+    "random_state": TREE_SPEC["random_state"],
+}
+
+CONFIG_COLUMNS = ["n_bins", "criterion", "min_samples_leaf", "max_depth"]
+
+
+def depth_order(depth):
+    # None (no limit) is the deepest setting
+    return math.inf if depth is None else depth
+
+
+def score_depths(X, y, folds, criterion, min_samples_leaf, depths):
+    """
+    Scores one (criterion, min_samples_leaf) group on the given folds, from shallow to deep.
+    Returns {depth: list of fold accuracies} and {depth: depth it grows the same trees as}.
+    """
+    from sklearn.tree import DecisionTreeClassifier
+
+    scores, same_as = {}, {}
+    saturated = None
+    for depth in sorted(depths, key=depth_order):
+        if saturated is not None:
+            same_as[depth] = saturated
+            continue
+        fold_scores, reached_limit = [], False
+        for train, test in folds:
+            tree = DecisionTreeClassifier(
+                max_depth=depth, min_samples_leaf=min_samples_leaf, criterion=criterion, random_state=0
+            ).fit(X[train], y[train])
+            fold_scores.append(tree.score(X[test], y[test]))
+            reached_limit |= depth is not None and tree.get_depth() >= depth
+        scores[depth] = fold_scores
+        if not reached_limit:
+            saturated = depth
+    return scores, same_as
+
+
+def search_trees(spec, df, n_jobs=-1):
+    """
+    Runs the pruned search. Returns a table with one row per config (its CV accuracy, the
+    number of folds it was scored on and whether/why it was pruned) and the best tree per class count.
+    """
+    # Imported here so that pages reading the saved search do not import scikit-learn
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import StratifiedKFold
+
+    grid = spec["grid"]
+    X = df[spec["features"]].to_numpy()
+    labels = {
+        n_bins: pd.qcut(df[spec["target"]], q=n_bins, labels=False).to_numpy()
+        for n_bins in grid["n_bins"]
+    }
+
+    # Every round scores on a fresh shuffled stratified split
+    folds = {
+        (n_bins, round_): list(StratifiedKFold(spec["n_splits"], shuffle=True, random_state=round_).split(X, y))
+        for n_bins, y in labels.items() for round_ in range(spec["rounds"])
+    }
+
+    configs = list(itertools.product(*[grid[c] for c in CONFIG_COLUMNS]))
+    fold_scores = {config: [] for config in configs}
+    status = {config: "kept" for config in configs}
+    alive = set(configs)
+
+    for round_ in range(spec["rounds"]):
+        groups = {}
+        for n_bins, criterion, leaf, depth in alive:
+            groups.setdefault((n_bins, criterion, leaf), []).append(depth)
+
+        tasks = list(groups.items())
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(score_depths)(X, labels[n_bins], folds[(n_bins, round_)], criterion, leaf, depths)
+            for (n_bins, criterion, leaf), depths in tasks
+        )
+
+        for ((n_bins, criterion, leaf), _), (scores, same_as) in zip(tasks, results):
+            for depth, values in scores.items():
+                fold_scores[(n_bins, criterion, leaf, depth)] += values
+            for depth, same in same_as.items():
+                config = (n_bins, criterion, leaf, depth)
+                status[config] = f"same tree as max_depth={same}"
+                alive.discard(config)
+
+        if round_ == spec["rounds"] - 1:
+            break
+
+        # Successive halving: keep the best share of each class count for the next round
+        for n_bins in grid["n_bins"]:
+            candidates = sorted(
+                (config for config in alive if config[0] == n_bins),
+                key=lambda config: np.mean(fold_scores[config]), reverse=True,
+            )
+            n_keep = max(1, math.ceil(len(candidates) * spec["keep"]))
+            for config in candidates[n_keep:]:
+                status[config] = f"pruned after round {round_ + 1}"
+                alive.discard(config)
+
+    table = pd.DataFrame(configs, columns=CONFIG_COLUMNS)
+    # Keep "no limit" as None rather than NaN
+    table["max_depth"] = pd.Series([c[3] for c in configs], dtype=object)
+    table["cv_accuracy"] = [np.mean(fold_scores[c]) if fold_scores[c] else np.nan for c in configs]
+    table["cv_std"] = [np.std(fold_scores[c]) if fold_scores[c] else np.nan for c in configs]
+    table["n_folds"] = [len(fold_scores[c]) for c in configs]
+    table["chance"] = 1 / table["n_bins"]
+    table["status"] = [status[c] for c in configs]
+
+    best = {}
+    for n_bins in grid["n_bins"]:
+        finished = [c for c in configs if c[0] == n_bins and status[c] == "kept"]
+        # Ties go to the simpler tree: shallower, then larger leaves
+        _, criterion, leaf, depth = max(
+            finished, key=lambda c: (np.mean(fold_scores[c]), -depth_order(c[3]), c[2])
+        )
+        tree_spec = {
+            **TREE_SPEC,
+            "classes": CLASS_LABELS[n_bins],
+            "max_depth": depth,
+            "min_samples_leaf": leaf,
+            "criterion": criterion,
+        }
+        result = fit_tree(tree_spec, df)
+        result["config"] = {"max_depth": depth, "min_samples_leaf": leaf, "criterion": criterion}
+        result["cv_accuracy"] = np.mean(fold_scores[(n_bins, criterion, leaf, depth)])
+        result["cv_std"] = np.std(fold_scores[(n_bins, criterion, leaf, depth)])
+        best[n_bins] = result
+
+    table = table.sort_values(["n_bins", "cv_accuracy"], ascending=[True, False], ignore_index=True)
+    return {"table": table, "best": best}
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("tree_search")
+def _get_tree_search(version):
+    return load_or_fit(SEARCH_SPEC, search_trees, version)
+
+
+@profiling.timed("fit:tree_search", cache="tree_search")
+def get_tree_search():
+    """
+    Returns the tree search results (table of configs and best tree per class count) for the current dataset version.
+    """
+    return _get_tree_search(dataset_version())
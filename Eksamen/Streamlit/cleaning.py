@@ -0,0 +1,527 @@
+"""
+Cleaning pipeline for the COVID-19 datasets.
+
+Rebuilds df_covid_cleaned.csv, df_age_cleaned.csv and df_health_cleaned.csv from the raw
+OWID file and the HDI file, following the same steps as BI_exam.ipynb.
+
+Run from the Streamlit folder with:
+    python cleaning.py            (only rebuilds datasets whose inputs changed)
+    python cleaning.py --force    (rebuilds everything)
+    python cleaning.py --incremental  (only redoes countries that changed since the last build)
+
+Every dataset is also written as a typed Parquet snapshot in snapshots/. The raw OWID file
+gets a snapshot too, and so does the master table (one row per country with the columns of
+all three datasets, see master.py), which is what the pages read.
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import hdi
+from hdi import file_hash
+import storage
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR.parent / "Data"
+CACHE_DIR = BASE_DIR / ".cache"
+
+RAW_COVID_FILE = DATA_DIR / "owid-covid-latest.csv"
+HDI_FILE = DATA_DIR / "human-development-index.csv"
+STAGE_CACHE_FILE = CACHE_DIR / "pipeline_stages.json"
+
+# Bump this when the cleaning steps change, so cached stages are rebuilt
+PIPELINE_VERSION = 2
+
+# OWID aggregates removed before the datasets are split
+AGGREGATE_ROWS = ["OWID_UMC", "OWID_WRL", "OWID_LMC", "OWID_LIC", "OWID_HIC"]
+
+# Continent aggregates removed from df_covid after the HDI merge
+CONTINENT_ROWS = ["OWID_AFR", "OWID_ASI", "OWID_EUR", "OWID_EUN", "OWID_NAM", "OWID_OCE", "OWID_SAM"]
+
+AGE_COLUMNS = ["continent", "location", "total_deaths_per_million", "median_age", "aged_65_older", "aged_70_older", "life_expectancy"]
+
+HEALTH_COLUMNS = ["continent", "location", "total_deaths_per_million", "cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers", "life_expectancy"]
+
+COVID_COLUMNS = [
+    "iso_code", "continent", "location", "total_cases", "total_deaths",
+    "total_cases_per_million", "total_deaths_per_million",
+    "life_expectancy", "population"]
+
+HDI_YEAR = 2021
+
+# Territories without their own HDI get the value of their sovereign country (resolved in hdi.py)
+territory_to_country = {
+    'American Samoa': 'United States',
+    'Anguilla': 'United Kingdom',
+    'Aruba': 'Netherlands',
+    'Bermuda': 'United Kingdom',
+    'Bonaire Sint Eustatius and Saba': 'Netherlands',
+    'British Virgin Islands': 'United Kingdom',
+    'Cayman Islands': 'United Kingdom',
+    'Cook Islands': 'New Zealand',
+    'Curacao': 'Netherlands',
+    'Falkland Islands': 'United Kingdom',
+    'Faroe Islands': 'Denmark',
+    'French Guiana': 'France',
+    'French Polynesia': 'France',
+    'Gibraltar': 'United Kingdom',
+    'Greenland': 'Denmark',
+    'Guadeloupe': 'France',
+    'Guam': 'United States',
+    'Guernsey': 'United Kingdom',
+    'Isle of Man': 'United Kingdom',
+    'Jersey': 'United Kingdom',
+    'Kosovo': 'Serbia',
+    'Martinique': 'France',
+    'Mayotte': 'France',
+    'Monaco': 'France',
+    'Montserrat': 'United Kingdom',
+    'Nauru': 'Nauru',
+    'New Caledonia': 'France',
+    'Niue': 'New Zealand',
+    'North Korea': 'North Korea',
+    'Northern Mariana Islands': 'United States',
+    'Pitcairn': 'United Kingdom',
+    'Puerto Rico': 'United States',
+    'Reunion': 'France',
+    'Saint Barthelemy': 'France',
+    'Saint Helena': 'United Kingdom',
+    'Saint Martin (French part)': 'France',
+    'Saint Pierre and Miquelon': 'France',
+    'Sint Maarten (Dutch part)': 'Netherlands',
+    'Somalia': 'Somalia',
+    'Tokelau': 'New Zealand',
+    'Turks and Caicos Islands': 'United Kingdom',
+    'United States Virgin Islands': 'United States',
+    'Vatican': 'Italy',
+    'Wallis and Futuna': 'France'
+}
+
+# HDI values looked up by hand for countries missing from the HDI file
+manual_hdi_values = {
+    'Nauru': 0.692,
+    'Somalia': 0.385,
+}
+
+
+# Function to filter the DataFrame based on a list of values
+def filter_dataframe(df, values, filter_type='rows', row_filter_column=None):
+    if filter_type == 'rows':
+        if row_filter_column is None:
+            raise ValueError("Must specify 'row_filter_column' when filtering rows.")
+        return df[df[row_filter_column].isin(values)]
+    elif filter_type == 'columns':
+        # Keep only columns present in df and in values list (avoid key error)
+        columns_to_keep = [col for col in values if col in df.columns]
+        return df[columns_to_keep]
+    else:
+        raise ValueError("filter_type must be either 'rows' or 'columns'")
+
+
+# Method for replacing missing values in a column with the column median
+def fill_na_with_median(df, column_name):
+    median_value = df[column_name].median()
+    df[column_name] = df[column_name].fillna(median_value)
+    return median_value
+
+
+# Method for replacing cell with a value
+def replace_cell(df, row_filter, column, value):
+    df.loc[row_filter, column] = value
+
+
+def remove_aggregates(df_raw, drop_empty_columns=True):
+    """
+    Removes the OWID aggregate rows and the columns without any values.
+    """
+    df = df_raw[~df_raw["iso_code"].isin(AGGREGATE_ROWS)]
+    if not drop_empty_columns:
+        return df
+    return df.dropna(axis=1, how='all')
+
+
+# Columns filled with the median in each dataset
+MEDIAN_COLUMNS = {
+    "age": ["total_deaths_per_million", "aged_65_older", "aged_70_older"],
+    "health": ["cardiovasc_death_rate", "male_smokers"],
+    "covid": ["human_development_index", "total_cases", "total_deaths",
+              "total_cases_per_million", "total_deaths_per_million", "life_expectancy"],
+}
+
+# Rows kept in each dataset: countries with a value in this column (None keeps every country)
+REQUIRED_COLUMNS = {
+    "covid": None,
+    "age": "median_age",
+    "health": "female_smokers",
+}
+
+# Each cleaning step is split in two:
+#   prepare_*  - row-by-row work (column selection, dropped rows, HDI lookup). Keeps iso_code.
+#   finalize_* - work that needs the whole column (medians). Drops iso_code.
+# This lets the incremental update redo only the rows of changed countries.
+
+
+def prepare_age(df_base):
+    df_age = filter_dataframe(df_base, ["iso_code"] + AGE_COLUMNS, filter_type='columns')
+    return df_age.dropna(subset=[REQUIRED_COLUMNS["age"]])
+
+
+def finalize_age(df_age):
+    df_age = df_age.drop(columns=['iso_code']).copy()
+    for col in MEDIAN_COLUMNS["age"]:
+        fill_na_with_median(df_age, col)
+    return df_age
+
+
+def prepare_health(df_base):
+    df_health = filter_dataframe(df_base, ["iso_code"] + HEALTH_COLUMNS, filter_type='columns')
+    return df_health.dropna(subset=[REQUIRED_COLUMNS["health"]])
+
+
+def finalize_health(df_health):
+    df_health = df_health.drop(columns=['iso_code']).copy()
+    for col in MEDIAN_COLUMNS["health"]:
+        fill_na_with_median(df_health, col)
+    return df_health
+
+
+def load_hdi_index(df_raw, hdi_path=HDI_FILE):
+    """
+    Returns the HDI index (see hdi.py) with the territory -> sovereign fallback resolved.
+    """
+    location_codes = df_raw.dropna(subset=['iso_code']).set_index('location')['iso_code'].to_dict()
+    return hdi.load_index(hdi_path, location_codes, territory_to_country)
+
+
+def prepare_covid(df_base, hdi_index):
+    df_covid = filter_dataframe(df_base, COVID_COLUMNS, filter_type='columns').copy()
+
+    # Look up the HDI by iso_code; territories already get their sovereign country's value
+    df_covid['human_development_index'] = hdi_index.lookup(df_covid['iso_code'], HDI_YEAR)
+
+    # Remove the continent aggregates
+    df_covid = df_covid[~df_covid['iso_code'].isin(CONTINENT_ROWS)]
+    return df_covid.dropna(subset=['iso_code'])
+
+
+def apply_manual_hdi(df):
+    for location, value in manual_hdi_values.items():
+        replace_cell(df, df['location'] == location, 'human_development_index', value)
+
+
+def finalize_covid(df_covid):
+    df_covid = df_covid.drop(columns=['iso_code']).copy()
+    apply_manual_hdi(df_covid)
+
+    for col in MEDIAN_COLUMNS["covid"]:
+        fill_na_with_median(df_covid, col)
+    return df_covid
+
+
+def clean_age(df_base):
+    return finalize_age(prepare_age(df_base))
+
+
+def clean_health(df_base):
+    return finalize_health(prepare_health(df_base))
+
+
+def clean_covid(df_base, hdi_index):
+    return finalize_covid(prepare_covid(df_base, hdi_index))
+
+
+def prepare_datasets(df_raw, hdi_index, drop_empty_columns=True):
+    """
+    Runs the row-level cleaning steps and returns the prepared (not yet imputed) datasets.
+    """
+    df_base = remove_aggregates(df_raw, drop_empty_columns)
+    return {
+        "covid": prepare_covid(df_base, hdi_index),
+        "age": prepare_age(df_base),
+        "health": prepare_health(df_base),
+    }
+
+
+FINALIZERS = {
+    "covid": finalize_covid,
+    "age": finalize_age,
+    "health": finalize_health,
+}
+
+
+def build_master(prepared, df_raw):
+    """
+    Builds the master table from the prepared datasets: one row per country in any of them
+    (in raw file order), every column before imputation, and an in_<dataset> flag per dataset.
+    Returns the table and the medians each dataset fills in, {dataset: {column: median}},
+    computed exactly like the finalize_* steps do.
+    """
+    locations = df_raw["location"].drop_duplicates()
+    kept = pd.concat([df["location"] for df in prepared.values()])
+    master = pd.DataFrame({"location": locations[locations.isin(kept)].to_numpy()})
+
+    for stage, df in prepared.items():
+        df = df.set_index("location").reindex(master["location"])
+        for col in df.columns:
+            values = df[col].to_numpy()
+            master[col] = values if col not in master else master[col].where(master[col].notna(), values)
+        master[f"in_{stage}"] = master["location"].isin(prepared[stage]["location"])
+    apply_manual_hdi(master)
+
+    fills = {}
+    for stage in prepared:
+        rows = master[master[f"in_{stage}"]]
+        fills[stage] = {col: float(rows[col].median()) for col in MEDIAN_COLUMNS[stage]}
+    return master, fills
+
+
+def build_datasets(df_raw, hdi_path=HDI_FILE):
+    """
+    Runs all cleaning steps in memory and returns the three cleaned datasets.
+    """
+    prepared = prepare_datasets(df_raw, load_hdi_index(df_raw, hdi_path))
+    return {stage: FINALIZERS[stage](df) for stage, df in prepared.items()}
+
+
+# ---- Stage cache ----
+
+def load_stage_cache():
+    if STAGE_CACHE_FILE.exists():
+        return json.loads(STAGE_CACHE_FILE.read_text())
+    return {}
+
+
+def save_stage_cache(cache):
+    CACHE_DIR.mkdir(exist_ok=True)
+    STAGE_CACHE_FILE.write_text(json.dumps(cache, indent=2, sort_keys=True))
+
+
+# Which input files each output dataset depends on
+STAGE_INPUTS = {
+    "covid": [RAW_COVID_FILE, HDI_FILE],
+    "age": [RAW_COVID_FILE],
+    "health": [RAW_COVID_FILE],
+    "raw": [RAW_COVID_FILE],
+    "master": [RAW_COVID_FILE, HDI_FILE],
+}
+
+# CSV written by each stage; the raw stage only writes a Parquet snapshot
+STAGE_CSV = {
+    "covid": "df_covid_cleaned.csv",
+    "age": "df_age_cleaned.csv",
+    "health": "df_health_cleaned.csv",
+    "raw": None,
+    "master": None,
+}
+
+
+def stage_outputs(stage, output_dir):
+    outputs = [storage.snapshot_path(stage, Path(output_dir) / "snapshots")]
+    if STAGE_CSV[stage] is not None:
+        outputs.append(Path(output_dir) / STAGE_CSV[stage])
+    return outputs
+
+
+def write_dataset(df, stage, output_dir=BASE_DIR, metadata=None):
+    """
+    Writes a dataset as Parquet snapshot (and CSV for the cleaned datasets). Returns the written paths.
+    """
+    output_dir = Path(output_dir)
+    storage.write_snapshot(df, stage, output_dir / "snapshots", metadata)
+    if STAGE_CSV[stage] is not None:
+        df.to_csv(output_dir / STAGE_CSV[stage], index=False)
+    return stage_outputs(stage, output_dir)
+
+
+def stage_key(stage, input_hashes):
+    parts = [f"v{PIPELINE_VERSION}", stage] + [input_hashes[p] for p in STAGE_INPUTS[stage]]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def is_up_to_date(stage, output_dir, input_hashes, cache):
+    entry = cache.get(str(Path(output_dir).resolve() / stage))
+    if entry is None or entry["key"] != stage_key(stage, input_hashes):
+        return False
+    for output in stage_outputs(stage, output_dir):
+        if not output.exists() or entry["outputs"].get(output.name) != file_hash(output):
+            return False
+    return True
+
+
+def run_pipeline(output_dir=BASE_DIR, force=False, log=print):
+    """
+    Rebuilds the cleaned datasets (CSV and Parquet snapshot), skipping stages whose inputs
+    and outputs are unchanged. Returns the list of stages that were rebuilt.
+    """
+    output_dir = Path(output_dir)
+    input_hashes = {p: file_hash(p) for p in {RAW_COVID_FILE, HDI_FILE}}
+    cache = load_stage_cache()
+
+    stale = []
+    for stage in STAGE_INPUTS:
+        if not force and is_up_to_date(stage, output_dir, input_hashes, cache):
+            log(f"..Skipping {stage}: inputs unchanged")
+        else:
+            stale.append(stage)
+
+    if not stale:
+        return []
+
+    df_raw = pd.read_csv(RAW_COVID_FILE)
+    prepared = prepare_datasets(df_raw, load_hdi_index(df_raw))
+
+    for stage in stale:
+        df, metadata = build_stage(stage, df_raw, prepared)
+        outputs = write_dataset(df, stage, output_dir, metadata)
+        record_stage(cache, stage, output_dir, input_hashes, outputs)
+        log(f"..Rebuilt {stage}: {df.shape[0]} rows -> {', '.join(output.name for output in outputs)}")
+
+    save_stage_cache(cache)
+    save_state(output_dir, df_raw, prepared, input_hashes[HDI_FILE])
+    return stale
+
+
+def build_stage(stage, df_raw, prepared):
+    """
+    Returns (output table, snapshot metadata) for one stage.
+    """
+    if stage == "raw":
+        return df_raw, None
+    if stage == "master":
+        master, fills = build_master(prepared, df_raw)
+        return master, {"fills": fills}
+    return FINALIZERS[stage](prepared[stage]), None
+
+
+def record_stage(cache, stage, output_dir, input_hashes, outputs):
+    cache[str(Path(output_dir).resolve() / stage)] = {
+        "key": stage_key(stage, input_hashes),
+        "outputs": {output.name: file_hash(output) for output in outputs},
+    }
+
+
+# ---- Incremental update ----
+# After a build, the prepared datasets and a hash of every raw row are kept in .cache/prepared.
+# When a new OWID snapshot arrives, only the rows of countries whose raw row changed are
+# prepared again. The medians are then recomputed on the patched columns.
+
+def state_dir(output_dir):
+    return Path(output_dir) / ".cache" / "prepared"
+
+
+def row_hashes(df_raw):
+    """
+    Returns one hash per country (iso_code) covering every column of its raw row.
+    """
+    hashes = pd.util.hash_pandas_object(df_raw, index=False)
+    return pd.Series(hashes.values, index=df_raw["iso_code"].values, name="row_hash")
+
+
+def save_state(output_dir, df_raw, prepared, hdi_hash):
+    folder = state_dir(output_dir)
+    folder.mkdir(parents=True, exist_ok=True)
+    for stage, df in prepared.items():
+        df.to_parquet(folder / f"{stage}.parquet", index=False)
+    row_hashes(df_raw).to_frame().to_parquet(folder / "row_hashes.parquet")
+    meta = {"pipeline_version": PIPELINE_VERSION, "hdi_hash": hdi_hash}
+    (folder / "meta.json").write_text(json.dumps(meta))
+
+
+def load_state(output_dir, hdi_hash):
+    """
+    Returns (prepared datasets, row hashes) from the last build, or None if they can't be reused.
+    """
+    folder = state_dir(output_dir)
+    if not (folder / "meta.json").exists():
+        return None
+    meta = json.loads((folder / "meta.json").read_text())
+    if meta != {"pipeline_version": PIPELINE_VERSION, "hdi_hash": hdi_hash}:
+        return None
+    prepared = {stage: pd.read_parquet(folder / f"{stage}.parquet") for stage in FINALIZERS}
+    hashes = pd.read_parquet(folder / "row_hashes.parquet")["row_hash"]
+    return prepared, hashes
+
+
+def diff_rows(old_hashes, new_hashes):
+    """
+    Compares two snapshots by iso_code. Returns (changed, added, removed) iso codes.
+    """
+    common = new_hashes.index.intersection(old_hashes.index)
+    changed = common[new_hashes.loc[common].values != old_hashes.loc[common].values]
+    added = new_hashes.index.difference(old_hashes.index)
+    removed = old_hashes.index.difference(new_hashes.index)
+    return changed, added, removed
+
+
+def patch_rows(prepared, new_rows, affected, order):
+    """
+    Replaces the rows of the affected countries and keeps the row order of a full rebuild.
+    """
+    kept = prepared[~prepared["iso_code"].isin(affected)]
+    patched = pd.concat([kept, new_rows.reindex(columns=prepared.columns)], ignore_index=True)
+    position = order.get_indexer(patched["iso_code"])
+    return patched.iloc[np.argsort(position, kind="stable")].reset_index(drop=True)
+
+
+def run_incremental(output_dir=BASE_DIR, log=print):
+    """
+    Updates the cleaned datasets from a new raw snapshot by redoing only the changed countries.
+    Falls back to a full rebuild when there is no usable state from an earlier build.
+    Returns the iso codes that were updated.
+    """
+    output_dir = Path(output_dir)
+    input_hashes = {p: file_hash(p) for p in {RAW_COVID_FILE, HDI_FILE}}
+    state = load_state(output_dir, input_hashes[HDI_FILE])
+    if state is None:
+        log("..No earlier build to update, running a full rebuild")
+        run_pipeline(output_dir=output_dir, force=True, log=log)
+        return None
+
+    prepared, old_hashes = state
+    df_raw = pd.read_csv(RAW_COVID_FILE)
+    changed, added, removed = diff_rows(old_hashes, row_hashes(df_raw))
+    affected = changed.union(added).union(removed)
+    if affected.empty:
+        log("..No countries changed")
+        return []
+    log(f"..{len(changed)} changed, {len(added)} added, {len(removed)} removed countries")
+
+    df_changed = df_raw[df_raw["iso_code"].isin(changed.union(added))]
+    new_rows = prepare_datasets(df_changed, load_hdi_index(df_raw), drop_empty_columns=False)
+    order = pd.Index(df_raw["iso_code"])
+
+    cache = load_stage_cache()
+    for stage in FINALIZERS:
+        prepared[stage] = patch_rows(prepared[stage], new_rows[stage], affected, order)
+        df = FINALIZERS[stage](prepared[stage])
+        outputs = write_dataset(df, stage, output_dir)
+        record_stage(cache, stage, output_dir, input_hashes, outputs)
+        log(f"..Updated {stage}: {df.shape[0]} rows")
+
+    for stage in ["raw", "master"]:
+        df, metadata = build_stage(stage, df_raw, prepared)
+        outputs = write_dataset(df, stage, output_dir, metadata)
+        record_stage(cache, stage, output_dir, input_hashes, outputs)
+    save_stage_cache(cache)
+    save_state(output_dir, df_raw, prepared, input_hashes[HDI_FILE])
+    return list(affected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the cleaned COVID-19 datasets.")
+    parser.add_argument("--force", action="store_true", help="rebuild all datasets even if inputs are unchanged")
+    parser.add_argument("--incremental", action="store_true", help="only redo the countries that changed since the last build")
+    parser.add_argument("--output-dir", default=str(BASE_DIR), help="folder the cleaned datasets are written to")
+    args = parser.parse_args()
+    if args.incremental:
+        run_incremental(output_dir=args.output_dir)
+    else:
+        run_pipeline(output_dir=args.output_dir, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Country risk-profile clusters for the World Map page.
+
+Countries are grouped by their combined age, health and development profile (the columns of
+df_age and df_health plus the HDI). The features are standardized, and MiniBatchKMeans is
+fitted for every k in CLUSTER_SPEC["k_values"] on a joblib worker pool. Each k is scored by its
+silhouette on the same fixed sample of rows, and the k with the best silhouette is kept.
+Clusters are numbered from the lowest to the highest mean HDI, so their labels stay stable
+between fits.
+
+The sweep, the model for every k and one cluster per row are saved with the model registry
+(models.py), so the map reads finished assignments once per dataset version. Nothing assumes
+one row per country: a country x date frame (with a date column) is clustered the same way,
+mini-batches keep the fit cheap and the silhouette sample caps its cost, and the map then
+shows each country's cluster on its latest date.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import require_master, dataset_version
+import profiling
+from models import load_or_fit
+
+CLUSTER_SPEC = {
+    # Columns of the cleaned datasets (with their median fills) used as features
+    "sources": {
+        "covid": ["human_development_index"],
+        "age": ["median_age", "aged_65_older", "aged_70_older", "life_expectancy"],
+        "health": ["cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers"],
+    },
+    "k_values": [2, 3, 4, 5, 6, 7, 8],
+    "batch_size": 1024,
+    "n_init": 10,
+    # Rows the silhouette of every k is computed on (it costs the square of this)
+    "silhouette_sample": 5000,
+    "order_by": "human_development_index",
+    "random_state": 0,
+}
+
+# Columns identifying a row, kept with its cluster when present
+ID_COLUMNS = ["location", "iso_code", "date"]
+
+
+def cluster_features(spec=CLUSTER_SPEC):
+    return [column for columns in spec["sources"].values() for column in columns]
+
+
+def cluster_frame(spec=CLUSTER_SPEC):
+    """
+    Returns one row per country that is in all source datasets: location, iso_code and the
+    feature columns, filled with each dataset's medians like the cleaned datasets.
+    """
+    master = require_master()
+    rows = master.rows(list(spec["sources"]))
+    parts = [master.view(dataset, columns, rows=rows) for dataset, columns in spec["sources"].items()]
+    df = pd.concat(parts, axis=1)
+    df.insert(0, "location", master.frame.index.to_numpy()[rows].astype(str))
+    df.insert(1, "iso_code", master.frame["iso_code"].to_numpy()[rows])
+    return df
+
+
+def cluster_name(number):
+    return f"Cluster {number}"
+
+
+def fit_k(X, k, sample, spec):
+    """
+    Fits MiniBatchKMeans with k clusters and scores it by inertia and the silhouette of the sample rows.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    model = MiniBatchKMeans(
+        n_clusters=k, batch_size=spec["batch_size"], n_init=spec["n_init"], random_state=spec["random_state"]
+    ).fit(X)
+    labels = model.predict(X[sample])
+    silhouette = silhouette_score(X[sample], labels) if len(np.unique(labels)) > 1 else np.nan
+    return model, model.inertia_, silhouette
+
+
+def fit_clusters(spec, df, n_jobs=-1):
+    """
+    Runs the silhouette sweep over k on df. Returns the sweep table, the best k, the scaler,
+    and for every k the model, the cluster centers and the cluster of every row.
+    """
+    # Imported here so that pages reading the saved clusters do not import scikit-learn
+    from joblib import Parallel, delayed
+    from sklearn.preprocessing import StandardScaler
+
+    features = cluster_features(spec)
+    complete = df[features].notna().all(axis=1).to_numpy()
+    scaler = StandardScaler()
+    X = scaler.fit_transform(df.loc[complete, features].to_numpy(dtype=np.float64))
+
+    # Every k is scored on the same rows
+    rng = np.random.default_rng(spec["random_state"])
+    sample = np.sort(rng.choice(len(X), min(len(X), spec["silhouette_sample"]), replace=False))
+
+    k_values = [k for k in spec["k_values"] if k < len(X)]
+    fits = Parallel(n_jobs=n_jobs)(delayed(fit_k)(X, k, sample, spec) for k in k_values)
+    sweep = pd.DataFrame({
+        "k": k_values,
+        "inertia": [inertia for _, inertia, _ in fits],
+        "silhouette": [silhouette for _, _, silhouette in fits],
+    })
+    best = int(sweep["silhouette"].fillna(-np.inf).to_numpy().argmax())
+
+    ids = df[[column for column in ID_COLUMNS if column in df.columns]].reset_index(drop=True)
+    clusters, centers = {}, {}
+    for k, (model, _, _) in zip(k_values, fits):
+        clusters[k], centers[k] = name_clusters(model, scaler, X, complete, features, spec["order_by"])
+
+    return {
+        "features": features,
+        "sweep": sweep,
+        "k": k_values[best],
+        "scaler": scaler,
+        "models": {k: model for k, (model, _, _) in zip(k_values, fits)},
+        "ids": ids,
+        "clusters": clusters,
+        "centers": centers,
+    }
+
+
+def name_clusters(model, scaler, X, complete, features, order_by):
+    """
+    Numbers the clusters of a fitted model by their mean of order_by, lowest first. Returns the
+    cluster of every row (none where a feature is missing) and the centers in the features' own units.
+    """
+    centers = pd.DataFrame(scaler.inverse_transform(model.cluster_centers_), columns=features)
+    order = np.argsort(np.argsort(centers[order_by].to_numpy()))
+    names = [cluster_name(number) for number in range(1, len(order) + 1)]
+    centers = centers.iloc[np.argsort(order)]
+    centers.index = names
+
+    codes = np.full(len(complete), -1)
+    codes[complete] = order[model.predict(X)]
+    clusters = pd.Categorical.from_codes(codes, categories=names)
+    centers.insert(0, "rows", pd.Series(clusters).value_counts().reindex(names).to_numpy())
+    return clusters, centers
+
+
+def assignments(result, k=None):
+    """
+    Returns the ID columns of every row with its cluster for k clusters (the best k by default).
+    """
+    k = result["k"] if k is None else k
+    return result["ids"].assign(cluster=result["clusters"][k])
+
+
+def country_clusters(result, k=None):
+    """
+    Returns one row per country with its cluster; for country x date rows, the cluster on the latest date.
+    """
+    rows = assignments(result, k)
+    if "date" in rows.columns:
+        rows = rows.sort_values("date").groupby("location", observed=True, sort=False).tail(1)
+    return rows.dropna(subset=["cluster"]).reset_index(drop=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("clusters")
+def _get_clusters(version):
+    return load_or_fit(CLUSTER_SPEC, fit_clusters, version, load=cluster_frame)
+
+
+@profiling.timed("fit:clusters", cache="clusters")
+def get_clusters():
+    """
+    Returns the clustering (sweep, best k, and the models, centers and clusters per k) for the current dataset version.
+    """
+    return _get_clusters(dataset_version())
@@ -0,0 +1,169 @@
+"""
+Pre-aggregated cubes for the Explorer page.
+
+Countries are put into cells by continent, HDI band and age band (quartiles of
+human_development_index and median_age). For every cell the cube keeps the number of countries,
+the sum of total_deaths_per_million and a fixed-bin histogram of it, so any combination of
+filters is answered by adding up a few cells: count and mean exactly, the median and the
+distribution from the merged histogram.
+
+There is also one cube per predictor (continent x quartile of the predictor, with the same
+counts, sums and histograms), used for the "deaths by band" chart. All cubes are built once
+per dataset version.
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import require_master, dataset_version
+import profiling
+
+TARGET = "total_deaths_per_million"
+
+# Quartile bands used as filters: band column -> predictor
+BAND_COLUMNS = {"hdi_band": "human_development_index", "age_band": "median_age"}
+
+# Predictors that get a continent x band cube
+PREDICTORS = ["human_development_index", "median_age", "aged_65_older", "life_expectancy", "population"]
+
+BAND_LABELS = ["Low", "Lower middle", "Upper middle", "High"]
+
+NO_DATA = "No data"
+
+CELL_COLUMNS = ["continent", "hdi_band", "age_band"]
+
+# Bins of the deaths per million histogram kept per cell
+HISTOGRAM_BINS = 40
+
+
+def explorer_frame():
+    """
+    Returns one row per country with its continent, ISO code, predictors, target and bands.
+    Countries missing from the age dataset get the band "No data".
+    """
+    master = require_master()
+    rows = master.rows("covid")
+    covid = master.view("covid", ["location", "continent", "human_development_index", "population", TARGET])
+    # The age columns of the same countries: filled like df_age, missing outside it
+    age = master.view("age", ["median_age", "aged_65_older", "life_expectancy"], rows=rows)
+    df = pd.concat([covid.astype({"location": str, "continent": str}), age], axis=1)
+    df.insert(1, "iso_code", master.frame["iso_code"].to_numpy()[rows])
+    return df
+
+
+def band(values, labels=BAND_LABELS):
+    bands = pd.qcut(values, q=len(labels), labels=labels)
+    return bands.cat.add_categories([NO_DATA]).fillna(NO_DATA)
+
+
+def median_from_histogram(counts, edges):
+    """
+    Median of the values behind a histogram, assuming they are spread evenly within each bin.
+    """
+    total = counts.sum()
+    if total == 0:
+        return np.nan
+    cumulative = np.cumsum(counts)
+    i = np.searchsorted(cumulative, total / 2)
+    before = cumulative[i - 1] if i > 0 else 0
+    share = (total / 2 - before) / counts[i]
+    return edges[i] + share * (edges[i + 1] - edges[i])
+
+
+def aggregate(df, columns, edges):
+    """
+    Groups df by columns and returns the cells (columns, count, total) and one histogram of
+    the target per cell, plus the cell number of every row.
+    """
+    grouped = df.groupby(columns, observed=True)
+    cells = grouped[TARGET].agg(count="count", total="sum").reset_index()
+    cell_codes = grouped.ngroup().to_numpy()
+    bins = np.clip(np.searchsorted(edges, df[TARGET], side="right") - 1, 0, len(edges) - 2)
+    histograms = np.zeros((len(cells), len(edges) - 1))
+    np.add.at(histograms, (cell_codes, bins), 1)
+    return cells, histograms, cell_codes
+
+
+def summarize(cells, histograms, selected, edges):
+    count = cells.loc[selected, "count"].sum()
+    histogram = histograms[selected].sum(axis=0)
+    return {
+        "count": int(count),
+        "mean": cells.loc[selected, "total"].sum() / count if count else np.nan,
+        "median": median_from_histogram(histogram, edges),
+        "histogram": histogram,
+    }
+
+
+def build_cubes(df):
+    """
+    Builds the cell cube, the per-predictor cubes and the per-country rows used by the page.
+    """
+    df = df.copy()
+    for column, predictor in BAND_COLUMNS.items():
+        df[column] = band(df[predictor])
+
+    # All histograms share the same bin edges, so they can be added up
+    edges = np.linspace(0, df[TARGET].max() * (1 + 1e-9), HISTOGRAM_BINS + 1)
+    cells, histograms, df["cell"] = aggregate(df, CELL_COLUMNS, edges)
+
+    predictor_cubes = {}
+    for predictor in PREDICTORS:
+        banded = df.assign(band=band(df[predictor]))
+        cube_cells, cube_histograms, _ = aggregate(banded, ["continent", "band"], edges)
+        predictor_cubes[predictor] = (cube_cells, cube_histograms)
+
+    return {
+        "cells": cells,
+        "histograms": histograms,
+        "edges": edges,
+        "predictor_cubes": predictor_cubes,
+        "countries": df,
+    }
+
+
+@profiling.timed("query:cubes")
+def query(cubes, continents=None, hdi_bands=None, age_bands=None):
+    """
+    Answers a filter from the cubes. None means no filter on that dimension. Returns the
+    matching cells' count, mean and median deaths per million, their merged histogram and a
+    mask of the matching countries.
+    """
+    cells = cubes["cells"]
+    selected = np.ones(len(cells), dtype=bool)
+    for column, values in zip(CELL_COLUMNS, [continents, hdi_bands, age_bands]):
+        if values is not None:
+            selected &= cells[column].isin(values).to_numpy()
+
+    result = summarize(cells, cubes["histograms"], selected, cubes["edges"])
+    result["countries"] = np.isin(cubes["countries"]["cell"].to_numpy(), np.flatnonzero(selected))
+    return result
+
+
+def predictor_bands(cubes, predictor, continents=None):
+    """
+    Returns count, mean and median deaths per million for each band of a predictor, within the selected continents.
+    """
+    cells, histograms = cubes["predictor_cubes"][predictor]
+    in_continents = np.ones(len(cells), dtype=bool) if continents is None else cells["continent"].isin(continents).to_numpy()
+    rows = []
+    for band_label in cells["band"].cat.categories:
+        selected = in_continents & (cells["band"] == band_label).to_numpy()
+        if selected.any():
+            summary = summarize(cells, histograms, selected, cubes["edges"])
+            rows.append({"band": band_label, "count": summary["count"], "mean": summary["mean"], "median": summary["median"]})
+    return pd.DataFrame(rows)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("cubes")
+def _get_cubes(version):
+    return build_cubes(explorer_frame())
+
+
+@profiling.timed("load:cubes", cache="cubes")
+def get_cubes():
+    """
+    Returns the cubes for the current dataset version.
+    """
+    return _get_cubes(dataset_version())
@@ -0,0 +1,154 @@
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import profiling
+import storage
+from master import DATASET_COLUMNS, read_master
+
+# All datasets live next to app.py, so paths work no matter where streamlit is started from
+BASE_DIR = Path(__file__).resolve().parent
+
+DATASETS = {
+    "covid": "df_covid_cleaned.csv",
+    "age": "df_age_cleaned.csv",
+    "health": "df_health_cleaned.csv",
+    "raw": "owid-covid-latest.csv",
+}
+
+# Text columns with few distinct values are stored as categories
+CATEGORY_COLUMNS = ["continent", "location"]
+
+# Whole counts above this value can't be stored exactly as float32, so those columns stay float64
+FLOAT32_EXACT_LIMIT = 2 ** 24
+
+
+def dataset_path(name):
+    """
+    Returns the path of a dataset's CSV file from its short name (covid, age, health or raw).
+    """
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset '{name}'. Choose one of: {', '.join(DATASETS)}")
+    return BASE_DIR / DATASETS[name]
+
+
+def source_path(name):
+    """
+    Returns the file a dataset is read from: the Parquet snapshot if there is one, otherwise the CSV.
+    """
+    snapshot = storage.snapshot_path(name)
+    if snapshot.exists():
+        return snapshot
+    return dataset_path(name)
+
+
+def downcast_dtypes(df):
+    """
+    Shrinks a DataFrame in memory: categories for continent/location and float32 for the metric columns.
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif pd.api.types.is_float_dtype(df[col]):
+            if not (df[col].abs() > FLOAT32_EXACT_LIMIT).any():
+                df[col] = df[col].astype(np.float32)
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+@profiling.counts_miss("datasets")
+def _read_dataset(path, mtime_ns, columns):
+    # mtime_ns is only part of the cache key, so a changed file on disk gets read again
+    columns = list(columns) if columns is not None else None
+    if path.endswith(".parquet"):
+        return storage.read_snapshot(path, columns=columns)
+    df = downcast_dtypes(pd.read_csv(path, usecols=columns))
+    # usecols keeps the file order, so put the columns back in the order asked for
+    return df[columns] if columns is not None else df
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@profiling.counts_miss("master")
+def _read_master(path, mtime_ns):
+    return read_master(path)
+
+
+def master_path():
+    return storage.snapshot_path("master")
+
+
+@profiling.timed("load:master", cache="master")
+def load_master():
+    """
+    Returns the country master table (see master.py), read once per file version and shared
+    between all sessions. Returns None when the pipeline has not written it yet.
+    """
+    path = master_path()
+    if not path.exists():
+        return None
+    return _read_master(str(path), os.stat(path).st_mtime_ns)
+
+
+def require_master():
+    """
+    Returns the country master table like load_master, for code that cannot work without it.
+    Raises FileNotFoundError with instructions when the pipeline has not written it yet.
+    """
+    master = load_master()
+    if master is None:
+        raise FileNotFoundError(
+            f"The master table {master_path()} does not exist yet. "
+            "Build it by running `python cleaning.py` from the Streamlit folder."
+        )
+    return master
+
+
+@profiling.timed("load:{0}", cache="datasets")
+def load_dataset(name, columns=None):
+    """
+    Loads a dataset once per file version and shares it between all sessions.
+    Pass columns to read only those columns (in that order).
+    The cleaned datasets are column selections of one filled frame per dataset of the master
+    table when it exists (see MasterTable.filled), so they share its data instead of copying it.
+    The returned DataFrame is shared, so pages must not modify it in place.
+    """
+    if name in DATASET_COLUMNS and master_path().exists():
+        return load_master().view(name, columns)
+    key = tuple(columns) if columns is not None else None
+    path = source_path(name)
+    return _read_dataset(str(path), os.stat(path).st_mtime_ns, key)
+
+
+def load_covid(columns=None):
+    return load_dataset("covid", columns)
+
+
+def load_age(columns=None):
+    return load_dataset("age", columns)
+
+
+def load_health(columns=None):
+    return load_dataset("health", columns)
+
+
+def load_raw(columns=None):
+    return load_dataset("raw", columns)
+
+
+def dataset_version():
+    """
+    Returns a short string that changes whenever the master table (or, without it, one of the
+    cleaned datasets) changes on disk.
+    Used as a cache key for anything computed from the data.
+    """
+    stamps = []
+    paths = [master_path()] if master_path().exists() else [source_path(name) for name in ["covid", "age", "health"]]
+    for path in paths:
+        stat = os.stat(path)
+        stamps.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+    return hashlib.md5("_".join(stamps).encode()).hexdigest()[:12]
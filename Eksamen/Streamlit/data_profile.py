@@ -0,0 +1,306 @@
+"""
+Missing-data and column profiles of the datasets.
+
+A profile describes every column of a dataset in one table: dtype, non-null and null counts,
+distinct values, min/quartiles/median/max, mean and the IQR outlier fences with the number of
+values outside them (the same 1.5 x IQR rule as in the notebook). It is built in a single pass
+over the data, one chunk at a time, so it also works for the full daily OWID file:
+
+  - counts, sums, min and max are added up per chunk
+  - distinct values are counted from hashes: the smallest DISTINCT_SKETCH_SIZE hashes are
+    kept per column, which is an exact count below that size and an estimate above it
+  - quantiles and outliers come from a uniform sample of QUANTILE_SAMPLE_SIZE values per
+    column, which holds every value (exact results) unless the column is larger
+
+Profiles are cached per file version, in memory and under .cache/profiles.
+
+Run from the Streamlit folder with:
+    python data_profile.py raw          (or covid, age, health, master, daily, or a file path)
+"""
+import argparse
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+import data
+import profiling
+import storage
+from timeseries import DAILY_FILE
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_DIR = BASE_DIR / ".cache" / "profiles"
+
+# Bump when the profile contents change, so cached profiles are rebuilt
+PROFILE_VERSION = 1
+
+# Profiles that can be asked for by name besides the datasets in data.DATASETS
+EXTRA_SOURCES = {
+    "master": lambda: storage.snapshot_path("master"),
+    "daily": lambda: DAILY_FILE,
+}
+
+# Profiles offered on the Data Preparation page, label -> name (built in the background when the file exists)
+PAGE_PROFILES = {
+    "Raw OWID file": "raw",
+    "Country-level dataset": "covid",
+    "Master table (before imputation)": "master",
+    "Daily OWID time series": "daily",
+}
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Values kept per column for the quantiles; smaller columns are profiled exactly
+QUANTILE_SAMPLE_SIZE = 50_000
+
+# Smallest hashes kept per column for the distinct count
+DISTINCT_SKETCH_SIZE = 4096
+
+IQR_FACTOR = 1.5
+
+HEAD_ROWS = 10
+
+
+@dataclass
+class DataProfile:
+    """
+    n_rows: number of rows; table: one row per column (see ProfileBuilder.finish); head: the first rows.
+    """
+    n_rows: int
+    table: pd.DataFrame
+    head: pd.DataFrame
+
+    def missing_overview(self, high_share=0.5):
+        """
+        Returns the number of columns in total, without any data, with some data and with
+        more than high_share of the values missing.
+        """
+        nulls = self.table["nulls"]
+        empty = int((nulls == self.n_rows).sum())
+        return {
+            "total": len(nulls),
+            "empty": empty,
+            "some_data": len(nulls) - empty,
+            "high_missing": int((nulls / self.n_rows > high_share).sum()) if self.n_rows else 0,
+        }
+
+    def missing_percent(self):
+        """
+        Percentage of missing values per column, for the columns that are neither complete nor empty.
+        """
+        percent = self.table["null_pct"]
+        return percent[(percent > 0) & (percent < 100)].sort_values(ascending=False)
+
+
+class ProfileBuilder:
+    """
+    Accumulates the profile of a dataset chunk by chunk.
+    """
+
+    def __init__(self, sample_size=QUANTILE_SAMPLE_SIZE, sketch_size=DISTINCT_SKETCH_SIZE, seed=0):
+        self.sample_size = sample_size
+        self.sketch_size = sketch_size
+        self.rng = np.random.default_rng(seed)
+        self.n_rows = 0
+        self.head = None
+        self.columns = {}
+
+    def update(self, chunk):
+        if self.head is None:
+            self.head = chunk.head(HEAD_ROWS).reset_index(drop=True)
+        self.n_rows += len(chunk)
+        for name in chunk.columns:
+            self._update_column(name, chunk[name])
+
+    def _update_column(self, name, column):
+        numeric = pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column)
+        stats = self.columns.get(name)
+        if stats is None:
+            stats = self.columns[name] = {
+                "dtype": str(column.dtype), "count": 0, "hashes": np.empty(0, dtype=np.uint64),
+                "numeric": numeric, "sum": 0.0, "min": np.inf, "max": -np.inf,
+                "sample_keys": np.empty(0), "sample": np.empty(0),
+            }
+        elif stats["dtype"] != str(column.dtype):
+            # CSV chunks can infer different types for the same column, e.g. int64 and float64
+            stats["numeric"] = stats["numeric"] and numeric
+            stats["dtype"] = str(np.result_type(stats["dtype"], column.dtype)) if stats["numeric"] else "object"
+
+        values = column.dropna().to_numpy()
+        if not len(values):
+            return
+        stats["count"] += len(values)
+        if stats["numeric"]:
+            values = values.astype(np.float64)
+            stats["sum"] += values.sum()
+            stats["min"] = min(stats["min"], values.min())
+            stats["max"] = max(stats["max"], values.max())
+            self._update_sample(stats, values)
+
+        hashes = pd.util.hash_array(values.astype(object) if not stats["numeric"] else values)
+        stats["hashes"] = np.union1d(stats["hashes"], hashes)[:self.sketch_size]
+
+    def _update_sample(self, stats, values):
+        # Every value gets a random key and the values with the largest keys are kept,
+        # which is a uniform sample of everything seen so far
+        keys = np.concatenate([stats["sample_keys"], self.rng.random(len(values))])
+        sample = np.concatenate([stats["sample"], values])
+        if len(sample) > self.sample_size:
+            keep = np.argpartition(keys, -self.sample_size)[-self.sample_size:]
+            keys, sample = keys[keep], sample[keep]
+        stats["sample_keys"], stats["sample"] = keys, sample
+
+    def distinct(self, stats):
+        hashes = stats["hashes"]
+        if len(hashes) < self.sketch_size:
+            return len(hashes), True
+        # k smallest of uniformly spread 64-bit hashes: about k / (k-th smallest / 2**64) distinct values
+        kth = hashes[-1] / 2.0 ** 64
+        return int(round((self.sketch_size - 1) / kth)), False
+
+    def finish(self):
+        """
+        Returns the DataProfile. Its table has one row per column with: dtype, non_null, nulls,
+        null_pct, distinct, min, q1, median, q3, max, mean, iqr_low, iqr_high, outliers, and
+        exact (False when the distinct count or the quantiles are estimates).
+        """
+        rows = {}
+        for name, stats in self.columns.items():
+            distinct, distinct_exact = self.distinct(stats)
+            row = {
+                "dtype": stats["dtype"],
+                "non_null": stats["count"],
+                "nulls": self.n_rows - stats["count"],
+                "null_pct": 100 * (self.n_rows - stats["count"]) / self.n_rows if self.n_rows else 0.0,
+                "distinct": distinct,
+                "exact": distinct_exact,
+            }
+            if stats["numeric"] and stats["count"]:
+                sample = stats["sample"]
+                q1, median, q3 = np.quantile(sample, [0.25, 0.5, 0.75])
+                low, high = q1 - IQR_FACTOR * (q3 - q1), q3 + IQR_FACTOR * (q3 - q1)
+                # Outliers counted in the sample, scaled up when the sample is not the whole column
+                outliers = ((sample < low) | (sample > high)).sum() * stats["count"] / len(sample)
+                row.update({
+                    "min": stats["min"], "q1": q1, "median": median, "q3": q3, "max": stats["max"],
+                    "mean": stats["sum"] / stats["count"],
+                    "iqr_low": low, "iqr_high": high, "outliers": int(round(outliers)),
+                    "exact": distinct_exact and len(sample) == stats["count"],
+                })
+            rows[name] = row
+
+        columns = ["dtype", "non_null", "nulls", "null_pct", "distinct", "min", "q1", "median", "q3",
+                   "max", "mean", "iqr_low", "iqr_high", "outliers", "exact"]
+        table = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=columns)
+        table.index.name = "column"
+        table["outliers"] = table["outliers"].astype("Int64")
+        head = self.head if self.head is not None else pd.DataFrame()
+        return DataProfile(self.n_rows, table, head)
+
+
+def profile_chunks(chunks, **kwargs):
+    builder = ProfileBuilder(**kwargs)
+    for chunk in chunks:
+        builder.update(chunk)
+    return builder.finish()
+
+
+def frame_chunks(df, chunksize=DEFAULT_CHUNKSIZE):
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def file_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields a CSV or Parquet file in chunks of rows, without reading the whole file.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, low_memory=False)
+
+
+def profile_frame(df, **kwargs):
+    return profile_chunks(frame_chunks(df), **kwargs)
+
+
+def profile_file(path, chunksize=DEFAULT_CHUNKSIZE, **kwargs):
+    return profile_chunks(file_chunks(path, chunksize), **kwargs)
+
+
+def source_file(name):
+    """
+    Returns the file profiled for a name: a dataset (see data.DATASETS), "master", "daily" or a path.
+    """
+    if name in data.DATASETS:
+        return data.source_path(name)
+    if name in EXTRA_SOURCES:
+        return EXTRA_SOURCES[name]()
+    return Path(name)
+
+
+def cache_path(path, stat):
+    key = f"v{PROFILE_VERSION}|{Path(path).resolve()}|{stat.st_mtime_ns}|{stat.st_size}"
+    return PROFILE_DIR / f"{Path(path).stem}-{hashlib.md5(key.encode()).hexdigest()[:12]}.joblib"
+
+
+def load_or_build(path):
+    """
+    Returns the profile of a file from .cache/profiles, or builds and saves it.
+    """
+    cached = cache_path(path, os.stat(path))
+    profiling.count("profile files")
+    if cached.exists():
+        try:
+            return joblib.load(cached)
+        except Exception:
+            # A broken or outdated file is simply rebuilt
+            pass
+    profiling.count("profile files", miss=True)
+    profile = profile_file(path)
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    joblib.dump(profile, cached)
+    return profile
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+@profiling.counts_miss("profiles")
+def _get_profile(path, mtime_ns, size):
+    # mtime_ns and size are only part of the cache key
+    return load_or_build(path)
+
+
+def profile_available(name):
+    return source_file(name).exists()
+
+
+@profiling.timed("profile:{0}", cache="profiles")
+def get_profile(name):
+    """
+    Returns the profile of a dataset, "master", "daily" or a file path, built once per file version.
+    """
+    path = source_file(name)
+    stat = os.stat(path)
+    return _get_profile(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the column profile of a dataset.")
+    parser.add_argument("source", help="covid, age, health, raw, master, daily or a CSV/Parquet path")
+    args = parser.parse_args()
+    profile = load_or_build(source_file(args.source))
+    print(f"{profile.n_rows} rows")
+    with pd.option_context("display.width", 200, "display.max_rows", None, "display.max_columns", None):
+        print(profile.table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Hidden diagnostics page, shown by app.py when the app is opened with ?diagnostics in the URL.
+
+Shows what profiling.py recorded: p50/p95 per stage (overall, per page or per session),
+cache hit rates and memory per cache and per session, with a JSON download.
+
+Anyone who knows the URL can read the page, so switching recording on or off (which wraps
+the chart functions of every session) and resetting the recorded data are only offered when
+the server enables them: COVID_APP_DIAGNOSTICS_CONTROLS=1, or diagnostics_controls = true in
+.streamlit/secrets.toml.
+"""
+import os
+import time
+
+import pandas as pd
+import streamlit as st
+
+import profiling
+
+
+CONTROLS_ENV = "COVID_APP_DIAGNOSTICS_CONTROLS"
+CONTROLS_SECRET = "diagnostics_controls"
+
+
+def controls_enabled():
+    """
+    True when the server allows visitors of this page to toggle recording and reset the data.
+    """
+    if os.environ.get(CONTROLS_ENV, "") not in ("", "0"):
+        return True
+    try:
+        return bool(st.secrets.get(CONTROLS_SECRET, False))
+    except FileNotFoundError:
+        # No secrets file
+        return False
+
+
+def cache_memory():
+    """
+    Returns the bytes held by each st.cache_data / st.cache_resource function, from Streamlit's stats manager.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.stats import CacheStat
+
+    if not Runtime.exists():
+        return pd.DataFrame(columns=["type", "cache", "MB"])
+    rows = {}
+    for stats in Runtime.instance().stats_mgr.get_stats().values():
+        for stat in stats:
+            if isinstance(stat, CacheStat) and stat.category_name.startswith("st_cache"):
+                key = (stat.category_name.removeprefix("st_"), stat.cache_name.rsplit(".", 1)[-1])
+                rows[key] = rows.get(key, 0) + stat.byte_length
+    df = pd.DataFrame([(kind, name, size / 2 ** 20) for (kind, name), size in rows.items()], columns=["type", "cache", "MB"])
+    return df.sort_values("MB", ascending=False, ignore_index=True)
+
+
+def render():
+    st.title("Diagnostics")
+
+    controls = controls_enabled()
+    recording = st.toggle("Record timings", value=profiling.is_enabled(), disabled=not controls,
+                          help="Times data loads, model fits, figure builds and chart calls in every session.")
+    if controls and recording and not profiling.is_enabled():
+        profiling.enable()
+    elif controls and not recording and profiling.is_enabled():
+        profiling.disable()
+    if not controls:
+        st.caption(f"Read-only: recording and Reset are switched on for the server with {CONTROLS_ENV}=1 "
+                   f"or {CONTROLS_SECRET} = true in the Streamlit secrets.")
+    if not profiling.is_enabled():
+        st.info("Recording is off. Start the app with COVID_APP_PROFILE=1 (or switch it on above), use the app, then come back here.")
+
+    data = profiling.recorder.snapshot()
+
+    st.subheader("Time per Stage")
+    grouping = st.radio("Group by:", ["Stage", "Page", "Session"], horizontal=True)
+    by = {"Stage": ("stage",), "Page": ("page", "stage"), "Session": ("session", "page", "stage")}[grouping]
+    st.dataframe(pd.DataFrame(profiling.summarize(data["spans"], by=by)), hide_index=True, use_container_width=True)
+
+    st.subheader("Cache Hit Rates")
+    st.dataframe(pd.DataFrame(profiling.cache_hit_rates(data["caches"])), hide_index=True, use_container_width=True)
+
+    st.subheader("Memory")
+    peak_mb = profiling.peak_memory_mb()
+    if peak_mb is not None:
+        st.metric("Peak memory of the server process", f"{peak_mb:,.0f} MB")
+    st.dataframe(cache_memory(), hide_index=True, use_container_width=True)
+    sessions = pd.DataFrame([
+        {"session": session, "last_page": info["page"],
+         "seconds_since_last_run": round(time.time() - info["last_seen"]),
+         "session_state_KB": info["session_state_bytes"] / 1024,
+         "spans_recorded": sum(len(r["seconds"]) for r in data["spans"] if r["session"] == session)}
+        for session, info in data["sessions"].items()
+    ])
+    st.write("Sessions (the cached data above is shared by all of them):")
+    st.dataframe(sessions, hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    col1.download_button("Download JSON", profiling.export_json(), file_name="timings.json", mime="application/json")
+    if col2.button("Reset", disabled=not controls):
+        profiling.recorder.reset()
+        st.rerun()
+    st.caption("For a cProfile dump of a page run: python profiling.py pages/<Page>.py --pstats page.prof")
@@ -0,0 +1,447 @@
+"""
+Static export of the dashboard.
+
+Every page is run once headless (with Streamlit's AppTest, as in benchmark.py), once for each
+option of its first selectbox: every hypothesis of Data Modeling, every section of Data
+Visualisation, every World Map metric and so on. What a run shows (headings, text, tables,
+metrics, plotly figures and images) is converted to plain HTML pages, and the same content
+is written to bundle.json. The bundle folder needs nothing else: images are saved next to
+the pages and plotly.js is included once, so any static file server can serve it to any
+number of viewers without running Python.
+
+Page runs are independent, so they are spread over a process pool. Run from the Streamlit
+folder with:
+    python export.py                     (writes .cache/export)
+    python export.py --output site --jobs 4
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from data import dataset_version
+
+BASE_DIR = Path(__file__).resolve().parent
+EXPORT_DIR = BASE_DIR / ".cache" / "export"
+
+# Pages in the order of the navigation; the first one becomes index.html
+EXPORT_PAGES = {
+    "Home": "app.py",
+    "Data Preparation": "pages/DataPreparation.py",
+    "Data Visualisation": "pages/DataVisualisation.py",
+    "Data Modeling": "pages/DataModeling.py",
+    "World Map": "pages/WorldMap.py",
+    "Conclusion": "pages/Conclusion.py",
+}
+
+# Seconds a single page run may take (the first run may wait for background jobs)
+RUN_TIMEOUT = 900
+
+STYLE = """
+body { font-family: "Source Sans Pro", sans-serif; margin: 0; color: #31333f; }
+nav { background: #f0f2f6; padding: 1rem; position: fixed; top: 0; bottom: 0; width: 14rem; overflow-y: auto; }
+nav a { display: block; color: #31333f; text-decoration: none; padding: 0.2rem 0; }
+nav a.current { font-weight: bold; }
+nav .variants a { padding-left: 1rem; font-size: 0.9rem; }
+main { margin-left: 17rem; padding: 1rem 2rem; max-width: 60rem; }
+table { border-collapse: collapse; font-size: 0.85rem; margin: 0.5rem 0; }
+th, td { border: 1px solid #e6e9ef; padding: 0.2rem 0.5rem; text-align: right; }
+img { max-width: 100%; }
+.alert { padding: 0.8rem; border-radius: 0.4rem; margin: 0.5rem 0; }
+.success { background: #dff5e3; } .info { background: #e0ecfb; } .warning { background: #fff6d9; } .error { background: #fde2e2; }
+.columns { display: flex; gap: 1rem; } .columns > div { flex: 1; }
+.metric .label { font-size: 0.9rem; } .metric .value { font-size: 2rem; }
+.caption { color: #808495; font-size: 0.85rem; }
+.tab { border-top: 1px solid #e6e9ef; margin-top: 1rem; }
+"""
+
+
+def slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+
+
+def page_file(page, option=None):
+    return f"{slug(page)}{'-' + slug(option) if option is not None else ''}.html"
+
+
+# ---------------------- Running the pages ----------------------
+
+def keep_media():
+    """
+    Makes AppTest keep the in-memory storage its page runs save images to (it normally drops
+    it with the mock runtime after each run), so the exported images can be read from it.
+    """
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+
+    class KeptStorage(MemoryMediaFileStorage):
+        last = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            KeptStorage.last = self
+
+    if not hasattr(app_test.MemoryMediaFileStorage, "last"):
+        app_test.MemoryMediaFileStorage = KeptStorage
+    return app_test.MemoryMediaFileStorage
+
+
+def media_bytes(url):
+    """
+    Returns the bytes of an image the last page run stored under url.
+    """
+    return keep_media().last.get_file(url.rsplit("/", 1)[-1]).content
+
+
+def element_record(node):
+    """
+    Converts one element of a page run to a plain dict, or None for widgets and other elements that are not exported.
+    """
+    from streamlit.testing.v1 import element_tree as et
+
+    if isinstance(node, (et.Title, et.Header, et.Subheader)):
+        return {"type": type(node).__name__.lower(), "text": node.value}
+    if isinstance(node, (et.Caption, et.Divider)):
+        return {"type": type(node).__name__.lower(), "text": node.value}
+    if isinstance(node, et.Markdown):
+        return {"type": "markdown", "text": node.value}
+    if isinstance(node, et.AlertBase):
+        return {"type": "alert", "kind": type(node).__name__.lower(), "text": node.value}
+    if isinstance(node, et.Exception):
+        return {"type": "alert", "kind": "error", "text": node.value}
+    if isinstance(node, (et.Dataframe, et.Table)):
+        return {"type": "table", "table": json.loads(node.value.to_json(orient="split", date_format="iso"))}
+    if isinstance(node, et.Metric):
+        return {"type": "metric", "label": node.label, "value": node.value, "delta": node.delta}
+    if isinstance(node, et.Image):
+        return {"type": "images", "images": [media_bytes(url) for url in node.value], "captions": list(node.captions or [])}
+    if isinstance(node, et.UnknownElement) and node.type == "plotly_chart":
+        return {"type": "plotly", "spec": json.loads(node.proto.spec)}
+    return None
+
+
+def block_records(block):
+    """
+    Converts the children of a block (the page, a tab, an expander, columns) to a list of records.
+    """
+    from streamlit.testing.v1 import element_tree as et
+
+    records = []
+    for key in sorted(block.children):
+        node = block.children[key]
+        if isinstance(node, et.Expander):
+            records.append({"type": "expander", "label": node.label, "children": block_records(node)})
+        elif isinstance(node, et.Tab):
+            records.append({"type": "tab", "label": node.label, "children": block_records(node)})
+        elif isinstance(node, et.Column):
+            records.append({"type": "column", "children": block_records(node)})
+        elif isinstance(node, et.Block):
+            if node.type in ("sidebar", "event"):
+                continue
+            children = block_records(node)
+            if node.type == "tab_container":
+                records.append({"type": "tabs", "children": children})
+            elif children and all(child["type"] == "column" for child in children):
+                records.append({"type": "columns", "children": children})
+            else:
+                records.extend(children)
+        else:
+            record = element_record(node)
+            if record is not None:
+                records.append(record)
+    return records
+
+
+def run_page(path, option=None, timeout=RUN_TIMEOUT):
+    """
+    Runs a page headless, with its first selectbox set to option if given. Returns the page
+    content as records, the options of its first selectbox and any exceptions it raised.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    keep_media()
+    at = AppTest.from_file(str(BASE_DIR / path), default_timeout=timeout).run()
+    if option is not None:
+        at.selectbox[0].select(option).run()
+    options = list(at.selectbox[0].options) if len(at.selectbox) else []
+    selected = at.selectbox[0].value if len(at.selectbox) else None
+    return {
+        "records": block_records(at.main),
+        "options": options,
+        "selected": selected,
+        "errors": [e.value for e in at.exception],
+    }
+
+
+def export_task(page, option):
+    started = time.perf_counter()
+    result = run_page(EXPORT_PAGES[page], option)
+    result.update(page=page, option=option, seconds=time.perf_counter() - started)
+    return result
+
+
+# ---------------------- Writing the bundle ----------------------
+
+def inline_markdown(text):
+    text = html.escape(text, quote=False)
+    text = re.sub(r"`([^`]+)`", r"<code>\1</code>", text)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)\*", r"<em>\1</em>", text)
+    return re.sub(r"\[([^\]]+)\]\(([^)\s]+)\)", r'<a href="\2">\1</a>', text)
+
+
+def markdown_to_html(text):
+    """
+    Converts the markdown used on the pages (headings, lists, quotes, rules, bold, italics,
+    code, links and raw HTML blocks) to HTML.
+    """
+    if text.lstrip().startswith("<"):
+        # Raw HTML written with unsafe_allow_html
+        return text
+    parts, items, list_tag, paragraph, quote = [], [], None, [], []
+
+    def flush(lists=True):
+        nonlocal items, list_tag, paragraph, quote
+        if paragraph:
+            parts.append(f"<p>{'<br>'.join(inline_markdown(line) for line in paragraph)}</p>")
+            paragraph = []
+        if quote:
+            parts.append(f"<blockquote>{'<br>'.join(inline_markdown(line) for line in quote)}</blockquote>")
+            quote = []
+        if items and lists:
+            parts.append(f"<{list_tag}>{''.join(f'<li>{item}</li>' for item in items)}</{list_tag}>")
+            items, list_tag = [], None
+
+    for raw in text.splitlines():
+        line = raw.strip()
+        heading = re.match(r"^(#{1,6})\s+(.*)$", line)
+        bullet = re.match(r"^[-*]\s+(.*)$", line)
+        numbered = re.match(r"^\d+\.\s+(.*)$", line)
+        if not line:
+            # A list goes on after a blank line if the next line is another item
+            flush(lists=False)
+        elif re.match(r"^(---+|\*\*\*+)$", line):
+            flush()
+            parts.append("<hr>")
+        elif line.startswith(">"):
+            if paragraph or items:
+                flush()
+            quote.append(line.lstrip("> "))
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            parts.append(f"<h{level}>{inline_markdown(heading.group(2))}</h{level}>")
+        elif bullet or numbered:
+            tag = "ul" if bullet else "ol"
+            # An indented bullet under a numbered item continues that item
+            if items and list_tag == "ol" and bullet and raw[:1] == " ":
+                items[-1] += f"<br>{inline_markdown(bullet.group(1))}"
+                continue
+            if paragraph or (items and list_tag != tag):
+                flush()
+            list_tag = tag
+            items.append(inline_markdown((bullet or numbered).group(1)))
+        elif items and raw[:1] == " ":
+            items[-1] += f"<br>{inline_markdown(line)}"
+        else:
+            if items or quote:
+                flush()
+            paragraph.append(line)
+    flush()
+    return "\n".join(parts)
+
+
+def table_to_html(table):
+    df = pd.DataFrame(table["data"], columns=table["columns"], index=table["index"])
+    return df.to_html(na_rep="", float_format=lambda v: f"{v:,.4f}".rstrip("0").rstrip("."), border=0)
+
+
+class BundleWriter:
+    """
+    Writes the pages of the bundle: images are saved once under assets/ by content hash.
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        (self.folder / "assets").mkdir(parents=True, exist_ok=True)
+        self.figures = 0
+
+    def save_image(self, content):
+        name = f"assets/{hashlib.md5(content).hexdigest()[:16]}.png"
+        path = self.folder / name
+        if not path.exists():
+            path.write_bytes(content)
+        return name
+
+    def store_images(self, records):
+        """
+        Replaces image bytes in the records with the paths of the saved files.
+        """
+        for record in records:
+            if record["type"] == "images":
+                record["images"] = [self.save_image(content) for content in record["images"]]
+            self.store_images(record.get("children", []))
+
+    def render(self, records):
+        out = []
+        for record in records:
+            kind = record["type"]
+            if kind == "title":
+                out.append(f"<h1>{html.escape(record['text'])}</h1>")
+            elif kind == "header":
+                out.append(f"<h2>{html.escape(record['text'])}</h2>")
+            elif kind == "subheader":
+                out.append(f"<h3>{html.escape(record['text'])}</h3>")
+            elif kind == "markdown":
+                out.append(markdown_to_html(record["text"]))
+            elif kind == "caption":
+                out.append(f"<div class='caption'>{inline_markdown(record['text'])}</div>")
+            elif kind == "divider":
+                out.append("<hr>")
+            elif kind == "alert":
+                out.append(f"<div class='alert {record['kind']}'>{markdown_to_html(record['text'])}</div>")
+            elif kind == "table":
+                out.append(table_to_html(record["table"]))
+            elif kind == "metric":
+                delta = f"<div class='delta'>{html.escape(record['delta'])}</div>" if record["delta"] else ""
+                out.append(f"<div class='metric'><div class='label'>{html.escape(record['label'])}</div>"
+                           f"<div class='value'>{html.escape(record['value'])}</div>{delta}</div>")
+            elif kind == "images":
+                for image, caption in zip(record["images"], record["captions"] + [""] * len(record["images"])):
+                    out.append(f"<figure><img src='{image}' alt=''>"
+                               f"{f'<figcaption>{html.escape(caption)}</figcaption>' if caption else ''}</figure>")
+            elif kind == "plotly":
+                self.figures += 1
+                figure_id = f"figure-{self.figures}"
+                spec = json.dumps(record["spec"]).replace("</", "<\\/")
+                out.append(f"<div id='{figure_id}'></div><script>(function () {{ var spec = {spec}; "
+                           f"Plotly.newPlot('{figure_id}', spec.data, spec.layout, {{responsive: true}}); }})();</script>")
+            elif kind == "expander":
+                out.append(f"<details><summary>{html.escape(record['label'])}</summary>{self.render(record['children'])}</details>")
+            elif kind == "tabs":
+                out.append(self.render(record["children"]))
+            elif kind == "tab":
+                out.append(f"<section class='tab'><h4>{html.escape(record['label'])}</h4>{self.render(record['children'])}</section>")
+            elif kind == "columns":
+                columns = "".join(f"<div>{self.render(column['children'])}</div>" for column in record["children"])
+                out.append(f"<div class='columns'>{columns}</div>")
+        return "\n".join(out)
+
+    def write_page(self, file, title, navigation, records):
+        document = f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<script src="plotly.min.js"></script>
+<style>{STYLE}</style>
+</head>
+<body>
+<nav>{navigation}</nav>
+<main>
+{self.render(records)}
+</main>
+</body>
+</html>
+"""
+        (self.folder / file).write_text(document, encoding="utf-8")
+
+
+def navigation_html(pages, current):
+    """
+    pages: [(page, [(option, file)])]. Pages with several options list them under the page link.
+    """
+    out = []
+    for page, variants in pages:
+        out.append(f"<a href='{variants[0][1]}'{' class=current' if current in dict(variants).values() and len(variants) == 1 else ''}>{html.escape(page)}</a>")
+        if len(variants) > 1:
+            links = "".join(
+                f"<a href='{file}'{' class=current' if file == current else ''}>{html.escape(str(option))}</a>"
+                for option, file in variants
+            )
+            out.append(f"<div class='variants'>{links}</div>")
+    return "\n".join(out)
+
+
+def run_tasks(tasks, n_jobs):
+    if n_jobs == 1:
+        return [export_task(page, option) for page, option in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(export_task, *zip(*tasks)))
+
+
+def export(folder=EXPORT_DIR, n_jobs=None, log=print):
+    """
+    Runs every page and every option of its first selectbox, and writes the HTML pages,
+    bundle.json and plotly.js to folder. Returns the bundle manifest.
+    """
+    import plotly.offline
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    # First run every page as it opens, which also tells which options each page has
+    log(f"..Running {len(EXPORT_PAGES)} pages on {n_jobs} worker(s)")
+    first = {result["page"]: result for result in run_tasks([(page, None) for page in EXPORT_PAGES], n_jobs)}
+    tasks = [
+        (page, option) for page, result in first.items()
+        for option in result["options"] if option != result["selected"]
+    ]
+    log(f"..Running {len(tasks)} more sections")
+    results = {(page, result["selected"]): result for page, result in first.items()}
+    results.update({(result["page"], result["option"]): result for result in run_tasks(tasks, n_jobs)})
+
+    # Pages and their variants in navigation order
+    pages = []
+    for page, result in first.items():
+        options = result["options"] or [None]
+        pages.append((page, [(option, page_file(page, option if len(options) > 1 else None)) for option in options]))
+    pages[0] = (pages[0][0], [(option, "index.html") if i == 0 else (option, file)
+                              for i, (option, file) in enumerate(pages[0][1])])
+
+    writer = BundleWriter(folder)
+    (writer.folder / "plotly.min.js").write_text(plotly.offline.get_plotlyjs(), encoding="utf-8")
+    manifest = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "dataset_version": dataset_version(),
+        "pages": [],
+    }
+    for page, variants in pages:
+        for option, file in variants:
+            result = results[(page, option if option is not None else first[page]["selected"])]
+            writer.store_images(result["records"])
+            title = f"{page} - {option}" if option is not None and len(variants) > 1 else page
+            writer.write_page(file, title, navigation_html(pages, file), result["records"])
+            manifest["pages"].append({
+                "page": page, "section": option, "file": file, "seconds": round(result["seconds"], 2),
+                "errors": result["errors"], "content": result["records"],
+            })
+            if result["errors"]:
+                log(f"..{title}: {len(result['errors'])} error(s)")
+
+    (writer.folder / "bundle.json").write_text(json.dumps(manifest, indent=1, default=str), encoding="utf-8")
+    log(f"..Wrote {len(manifest['pages'])} pages to {writer.folder} in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every page and section of the dashboard as static HTML and JSON.")
+    parser.add_argument("--output", default=str(EXPORT_DIR), help="folder to write the bundle to")
+    parser.add_argument("--jobs", type=int, help="page runs in parallel (default: number of CPUs)")
+    args = parser.parse_args()
+
+    # Run as __main__, this file would be looked up in the page scripts AppTest runs as __main__
+    import export
+    manifest = export.export(args.output, args.jobs)
+    return 1 if any(page["errors"] for page in manifest["pages"]) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""
+Figure cache for the Data Visualisation page.
+
+Every plot is drawn on its own matplotlib figure, saved as PNG or SVG bytes and closed straight
+away, so nothing is left behind in the global pyplot state. The bytes are cached per section,
+plot, format, dataset version and plot parameters, so a repeat visit to a section does no
+plotting at all.
+
+matplotlib and seaborn are imported inside the drawing functions: a page that shows cached
+PNGs never imports them. Above rendering.ROW_THRESHOLD rows the histograms, box plots and
+scatter plots are binned and sampled (see rendering.py), so drawing time stays bounded.
+"""
+import io
+
+import streamlit as st
+
+from data import load_dataset, dataset_version
+import profiling
+import rendering
+
+# Same output settings as st.pyplot
+PNG_DPI = 200
+
+# Formats a plot can be rendered in (matplotlib savefig formats)
+FORMATS = ["png", "svg"]
+
+HISTOGRAM_COLUMNS = [
+    'total_deaths_per_million',
+    'life_expectancy',
+    'median_age',
+    'aged_65_older',
+    'aged_70_older'
+]
+
+
+def draw_histograms(df, columns, n_cols=3):
+    """
+    Visualizes the distribution of selected numeric columns with histograms.
+    """
+    import matplotlib.pyplot as plt
+
+    n_rows = (len(columns) + n_cols - 1) // n_cols
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(10, 3 * n_rows))
+    axes = axes.flatten()
+
+    for i, col in enumerate(columns):
+        rendering.histogram(axes[i], df[col], color='green')
+        axes[i].set_title(f'Distribution of {col}')
+        axes[i].set_xlabel(col.replace('_', ' ').title())
+
+    # Hide unused axes if any
+    for ax in axes[len(columns):]:
+        fig.delaxes(ax)
+
+    fig.tight_layout()
+    return fig
+
+
+def draw_boxplot(df, column, title):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    if rendering.is_large(len(df)):
+        rendering.boxplot(ax, df[column], label=column, patch_artist=True, boxprops=dict(facecolor='lightgreen'))
+        ax.grid(True)
+    else:
+        df.boxplot(column=column, patch_artist=True, boxprops=dict(facecolor='lightgreen'), ax=ax)
+    ax.set_title(title)
+    return fig
+
+
+def draw_scatter(df, x, y, title):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots()
+    if rendering.is_large(len(df)):
+        rendering.scatter(ax, df[x], df[y], color='green')
+        ax.set_xlabel(x)
+        ax.set_ylabel(y)
+    else:
+        sns.scatterplot(data=df, x=x, y=y, color='green', ax=ax)
+    ax.set_title(title)
+    return fig
+
+
+def draw_pairplot(df, x_vars, y_var, title):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if rendering.is_large(len(df)):
+        # Same layout as the pairplot below, with binned panels
+        fig, axes = plt.subplots(1, len(x_vars), figsize=(5 * len(x_vars), 5), sharey=True, squeeze=False)
+        for ax, x in zip(axes.flat, x_vars):
+            rendering.scatter(ax, df[x], df[y_var], color='green')
+            ax.set_xlabel(x)
+        axes.flat[0].set_ylabel(y_var)
+        axes.flat[-1].set_title(title)
+        fig.tight_layout()
+        return fig
+
+    grid = sns.pairplot(df, x_vars=x_vars, y_vars=y_var, height=5, aspect=1, plot_kws={'color': 'green'})
+    grid.axes.flat[-1].set_title(title)
+    return grid.figure
+
+
+def draw_heatmap(df, columns, title=None, cmap=None):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots()
+    sns.heatmap(df[columns].corr(), annot=True, cmap=cmap, ax=ax)
+    if title:
+        ax.set_title(title)
+    return fig
+
+
+# Plots per section: name -> (dataset, draw function, default parameters)
+PLOTS = {
+    "Histograms": {
+        "age_histograms": ("age", draw_histograms, {"columns": HISTOGRAM_COLUMNS}),
+    },
+    "Box Plots": {
+        "deaths_per_million": ("covid", draw_boxplot, {
+            "column": "total_deaths_per_million", "title": "Outliers in total deaths pr million"}),
+        "total_deaths": ("covid", draw_boxplot, {
+            "column": "total_deaths", "title": "Outliers in total deaths"}),
+    },
+    "Scatter Plots": {
+        "hdi_deaths": ("covid", draw_scatter, {
+            "x": "human_development_index", "y": "total_deaths_per_million",
+            "title": "Human Development Index vs Total Deaths per Million"}),
+        "age_factors": ("age", draw_pairplot, {
+            "x_vars": ["life_expectancy", "median_age", "aged_65_older"],
+            "y_var": "total_deaths_per_million", "title": "Scatterplot"}),
+    },
+    "Correlation Matrix": {
+        "hdi_deaths": ("covid", draw_heatmap, {
+            "columns": ["human_development_index", "total_deaths_per_million"]}),
+        "population_deaths": ("covid", draw_heatmap, {
+            "columns": ["population", "total_deaths", "total_deaths_per_million"],
+            "title": "Correlation Matrix", "cmap": "coolwarm"}),
+    },
+}
+
+
+def plot_columns(params):
+    """
+    Returns the dataset columns a plot needs, so only those are loaded.
+    """
+    columns = []
+    for key in ["columns", "column", "x", "y", "x_vars", "y_var"]:
+        value = params.get(key)
+        if value is not None:
+            columns += value if isinstance(value, list) else [value]
+    return list(dict.fromkeys(columns))
+
+
+def figure_to_bytes(fig, fmt="png", dpi=PNG_DPI):
+    """
+    Saves a figure as PNG or SVG bytes and closes it, so the figure's memory is freed right away.
+    """
+    import matplotlib.pyplot as plt
+
+    try:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def figure_to_png(fig, dpi=PNG_DPI):
+    return figure_to_bytes(fig, "png", dpi)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+@profiling.counts_miss("figures")
+def _render_figure(section, name, version, fmt, params):
+    dataset, draw, _ = PLOTS[section][name]
+    params = {k: list(v) if isinstance(v, tuple) else v for k, v in params}
+    dpi = params.pop("dpi", PNG_DPI)
+    df = load_dataset(dataset, plot_columns(params))
+    return figure_to_bytes(draw(df, **params), fmt, dpi)
+
+
+@profiling.timed("figure:{0}/{1}", cache="figures")
+def render_figure(section, name, fmt="png", **params):
+    """
+    Returns a plot from the page as PNG or SVG bytes. Keyword arguments override the plot's
+    default parameters (and dpi); every combination is cached per format and dataset version.
+    """
+    if section not in PLOTS or name not in PLOTS[section]:
+        raise ValueError(f"Unknown plot '{section}/{name}'")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Choose one of: {', '.join(FORMATS)}")
+    params = {**PLOTS[section][name][2], **params}
+    # Lists are turned into tuples so the parameters can be part of the cache key
+    key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()))
+    return _render_figure(section, name, dataset_version(), fmt, key)
+
+
+def render_png(section, name, **params):
+    """
+    Returns a plot from the page as PNG bytes (see render_figure).
+    """
+    return render_figure(section, name, "png", **params)
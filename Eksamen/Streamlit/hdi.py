@@ -0,0 +1,162 @@
+"""
+Indexed Human Development Index lookup.
+
+The HDI file is turned once into a dense (country x year) array keyed by ISO code. Territories
+without their own HDI (see cleaning.territory_to_country) already carry their sovereign
+country's values, so a lookup is a plain array index per row - no merge, no row-wise apply.
+The index is saved under .cache and rebuilt only when the HDI file or the mapping changes.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+INDEX_FILE = BASE_DIR / ".cache" / "hdi_index.npz"
+
+# Bump this when the index layout changes
+INDEX_VERSION = 1
+
+
+def nearest_fill(values):
+    """
+    Fills every missing year with the value of the nearest year that has data (earlier year on ties).
+    Works on the whole (country x year) array at once.
+    """
+    n_years = values.shape[1]
+    positions = np.arange(n_years)
+    has_value = ~np.isnan(values)
+
+    # Index of the closest year with data before/after each year (-1 / n_years if none)
+    before = np.where(has_value, positions, -1)
+    before = np.maximum.accumulate(before, axis=1)
+    after = np.where(has_value, positions, n_years)
+    after = np.minimum.accumulate(after[:, ::-1], axis=1)[:, ::-1]
+
+    use_after = (before < 0) | ((after < n_years) & (after - positions < positions - before))
+    source = np.where(use_after, after, before)
+    found = (source >= 0) & (source < n_years)
+
+    rows = np.arange(values.shape[0])[:, None]
+    filled = np.full_like(values, np.nan)
+    filled[found] = values[np.broadcast_to(rows, values.shape)[found], source[found]]
+    return filled
+
+
+class HDIIndex:
+    """
+    HDI values by (ISO code, year), with exact and nearest-year lookups.
+    """
+
+    def __init__(self, codes, first_year, values):
+        self.codes = pd.Index(codes)
+        self.first_year = int(first_year)
+        self.values = values
+        self.nearest_values = nearest_fill(values)
+
+    @property
+    def years(self):
+        return np.arange(self.first_year, self.first_year + self.values.shape[1])
+
+    def lookup(self, iso_codes, years, nearest=False):
+        """
+        Returns the HDI for each (iso_code, year) pair as a float array (NaN where unknown).
+        years can be a single year or one year per code. With nearest=True a missing year
+        takes the value of the closest year that has data.
+        """
+        code_idx = self.codes.get_indexer(pd.Index(iso_codes))
+        year_idx = np.broadcast_to(np.asarray(years, dtype=np.int64), code_idx.shape) - self.first_year
+        n_years = self.values.shape[1]
+
+        table = self.nearest_values if nearest else self.values
+        if nearest:
+            # Years outside the file take the first/last year
+            year_idx = np.clip(year_idx, 0, n_years - 1)
+        valid = (code_idx >= 0) & (year_idx >= 0) & (year_idx < n_years)
+
+        result = np.full(code_idx.shape, np.nan)
+        result[valid] = table[code_idx[valid], year_idx[valid]]
+        return result
+
+    def save(self, path, key):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, codes=np.asarray(self.codes, dtype=str), first_year=self.first_year,
+                 values=self.values, key=key)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+        Loads a saved index, or returns None if it was built from different inputs.
+        """
+        if not path.exists():
+            return None
+        with np.load(path) as saved:
+            if str(saved["key"]) != key:
+                return None
+            return cls(saved["codes"], int(saved["first_year"]), saved["values"])
+
+
+def build_index(df_hdi, territory_codes):
+    """
+    Builds the index from the HDI file. territory_codes maps a territory's ISO code to the ISO
+    code of its sovereign country; missing territory values are filled from the sovereign.
+    """
+    df = df_hdi.dropna(subset=["Code"])
+    df = df[~df["Code"].str.startswith("OWID_")]
+    table = df.pivot_table(index="Code", columns="Year", values="Human Development Index", aggfunc="first")
+    table = table.reindex(columns=range(int(table.columns.min()), int(table.columns.max()) + 1))
+
+    # Add the territories and fill their missing years from the sovereign country
+    territories = [code for code in territory_codes if code not in table.index]
+    table = table.reindex(table.index.append(pd.Index(territories)))
+    sovereign = pd.Index(territory_codes.values())
+    territory = pd.Index(territory_codes.keys())
+    sovereign_rows = table.reindex(sovereign).to_numpy()
+    current = table.loc[territory].to_numpy()
+    table.loc[territory] = np.where(np.isnan(current), sovereign_rows, current)
+
+    return HDIIndex(table.index, table.columns[0], table.to_numpy(dtype=float))
+
+
+def territory_iso_codes(location_codes, territory_to_country):
+    """
+    Turns the territory -> sovereign country name mapping into ISO codes, using the OWID
+    location -> iso_code mapping. Territories mapped to themselves are left out.
+    """
+    codes = {}
+    for territory, country in territory_to_country.items():
+        territory_code = location_codes.get(territory)
+        country_code = location_codes.get(country)
+        if territory_code is not None and country_code is not None and territory_code != country_code:
+            codes[territory_code] = country_code
+    return codes
+
+
+def file_hash(path):
+    """
+    SHA-256 of a file, read in 1 MB blocks (also used by the cleaning pipeline's stage cache).
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_index(hdi_path, location_codes, territory_to_country, path=INDEX_FILE):
+    """
+    Returns the HDI index from .cache. The HDI file is only parsed when the index has to be
+    (re)built because the file or the territory mapping changed.
+    """
+    territory_codes = territory_iso_codes(location_codes, territory_to_country)
+    key = hashlib.sha256(
+        json.dumps([INDEX_VERSION, file_hash(hdi_path), sorted(territory_codes.items())]).encode()
+    ).hexdigest()
+
+    index = HDIIndex.load(path, key)
+    if index is None:
+        index = build_index(pd.read_csv(hdi_path), territory_codes)
+        index.save(path, key)
+    return index
@@ -0,0 +1,214 @@
+"""
+Feature importance for the Data Modeling page, on one scale for every candidate predictor.
+
+The hypotheses each fit their own feature list on their own split, so their coefficients and
+scores cannot be compared with each other. Here the linear regression and the decision tree
+from the hypotheses are both fitted on every candidate predictor, on the countries that are in
+all three datasets, with k-fold cross-validation. For every held-out fold:
+
+  - permutation importance: the drop in the held-out score (R² for the regression, accuracy
+    for the tree) when one column is shuffled, over IMPORTANCE_SPEC["n_repeats"] shuffles
+  - drop-column importance: the drop in the held-out score when the model is refitted without
+    the column
+
+Each model's permutation importances are then turned into shares of its total, so the two
+models can be ranked side by side. The folds and all shuffles are drawn up front from one
+seed, and the (model, fold) pairs run on the process pool shared with resampling.py
+(workers.py), reading the data from shared memory, so the results do not depend on the
+number of workers. They are saved with the model registry (models.py) once per dataset
+version.
+"""
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from batch_regression import CANDIDATE_FEATURES, candidate_frame
+from data import dataset_version
+import profiling
+from models import TREE_SPEC, load_or_fit
+import workers
+
+IMPORTANCE_SPEC = {
+    "features": CANDIDATE_FEATURES,
+    "target": "total_deaths_per_million",
+    "models": {
+        "Linear regression": {"kind": "regression"},
+        "Decision tree": {"kind": "tree", "classes": TREE_SPEC["classes"], "max_depth": TREE_SPEC["max_depth"]},
+    },
+    "n_splits": 5,
+    "n_repeats": 30,
+    "random_state": 0,
+}
+
+# Score each kind of model is measured by
+METRICS = {"regression": "R²", "tree": "accuracy"}
+
+
+def make_model(settings):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.tree import DecisionTreeClassifier
+
+    if settings["kind"] == "regression":
+        # Standardized first: with population (~1e9) next to the HDI (~1) the least squares
+        # solver would treat the small columns as zero
+        return make_pipeline(StandardScaler(), LinearRegression())
+    return DecisionTreeClassifier(max_depth=settings["max_depth"], random_state=0)
+
+
+def scores(kind, y_true, y_pred):
+    """
+    Held-out score of every row of y_pred (one row per shuffle) against y_true.
+    """
+    if kind == "tree":
+        return (y_pred == y_true).mean(axis=-1)
+    sse = ((y_pred - y_true) ** 2).sum(axis=-1)
+    return 1 - sse / ((y_true - y_true.mean()) ** 2).sum()
+
+
+def _score_fold(shm_name, shape, n_features, label, settings, train, test, permutations):
+    """
+    Fits one model on the train rows of the data in shared memory and returns its held-out
+    score, the score drop for every column and shuffle (columns x shuffles), and the score
+    drop for every column when it is left out. The first n_features data columns are the
+    features; the model learns column label.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        X, y = data[:, :n_features], data[:, label]
+        X_train, X_test, y_train, y_test = X[train], X[test], y[train], y[test]
+    finally:
+        shm.close()
+
+    kind = settings["kind"]
+    model = make_model(settings).fit(X_train, y_train)
+    baseline = scores(kind, y_test, model.predict(X_test))
+
+    n_repeats, n_test = permutations.shape
+    permuted = np.empty((n_features, n_repeats))
+    dropped = np.empty(n_features)
+    # All shuffles of a column are predicted in one call
+    stacked = np.tile(X_test, (n_repeats, 1))
+    for j in range(n_features):
+        stacked[:, j] = X_test[permutations, j].ravel()
+        y_pred = model.predict(stacked).reshape(n_repeats, n_test)
+        permuted[j] = baseline - scores(kind, y_test, y_pred)
+        stacked[:, j] = np.tile(X_test[:, j], n_repeats)
+
+        keep = np.arange(n_features) != j
+        refitted = make_model(settings).fit(X_train[:, keep], y_train)
+        dropped[j] = baseline - scores(kind, y_test, refitted.predict(X_test[:, keep]))
+    return baseline, permuted, dropped
+
+
+def _run_folds(data, tasks, n_jobs):
+    """
+    Copies data into shared memory once and scores the (model, fold) tasks on the shared process pool.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        args = [(shm.name, data.shape) + task for task in tasks]
+        return workers.run_all(_score_fold, args, n_jobs)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def compute_importance(spec, df, n_jobs=None):
+    """
+    Computes the permutation and drop-column importance of every feature for every model in
+    spec. Returns a dict with:
+      scores      held-out score of every model (mean and std over the folds)
+      importance  one row per model and feature: permutation mean and std, drop-column mean
+      ranking     one row per feature with each model's share of its permutation importance,
+                  sorted by the mean share
+    """
+    from sklearn.model_selection import KFold, StratifiedKFold
+
+    features = spec["features"]
+    df = df.dropna(subset=features + [spec["target"]])
+    X = df[features].to_numpy(dtype=np.float64)
+    y = df[spec["target"]].to_numpy(dtype=np.float64)
+
+    # The data block holds the features, the target and the classes of every tree model
+    models = spec["models"]
+    columns = [X, y]
+    labels = {}
+    for name, settings in models.items():
+        if settings["kind"] == "tree":
+            labels[name] = len(features) + len(columns) - 1
+            columns.append(pd.qcut(y, q=len(settings["classes"]), labels=False).astype(np.float64))
+        else:
+            labels[name] = len(features)
+    data = np.column_stack(columns)
+
+    # The folds and shuffles are drawn here from one seed per (model, fold), not in the workers
+    seeds = iter(np.random.SeedSequence(spec["random_state"]).spawn(len(models) * spec["n_splits"]))
+    tasks, owners = [], []
+    for name, settings in models.items():
+        if settings["kind"] == "tree":
+            splits = StratifiedKFold(spec["n_splits"], shuffle=True, random_state=spec["random_state"])
+        else:
+            splits = KFold(spec["n_splits"], shuffle=True, random_state=spec["random_state"])
+        for train, test in splits.split(X, data[:, labels[name]]):
+            rng = np.random.default_rng(next(seeds))
+            permutations = rng.permuted(np.tile(np.arange(len(test)), (spec["n_repeats"], 1)), axis=1)
+            tasks.append((len(features), labels[name], settings, train, test, permutations))
+            owners.append(name)
+
+    n_jobs = n_jobs or min(len(tasks), os.cpu_count() or 1)
+    results = _run_folds(data, tasks, n_jobs)
+
+    score_rows, importance_rows = [], []
+    for name, settings in models.items():
+        fold_results = [result for result, owner in zip(results, owners) if owner == name]
+        baseline = np.array([b for b, _, _ in fold_results])
+        permuted = np.concatenate([p for _, p, _ in fold_results], axis=1)
+        dropped = np.stack([d for _, _, d in fold_results], axis=1)
+        score_rows.append({"model": name, "metric": METRICS[settings["kind"]],
+                           "score": baseline.mean(), "std": baseline.std()})
+        for j, feature in enumerate(features):
+            importance_rows.append({
+                "model": name, "feature": feature,
+                "permutation": permuted[j].mean(), "permutation_std": permuted[j].std(),
+                "drop_column": dropped[j].mean(),
+            })
+
+    importance = pd.DataFrame(importance_rows)
+    # Negative importances mean the column only added noise: they count as zero in the shares
+    positive = importance.pivot(index="feature", columns="model", values="permutation").clip(lower=0)
+    ranking = (positive / positive.sum()).fillna(0.0)[list(models)]
+    ranking["mean_share"] = ranking.mean(axis=1)
+    ranking = ranking.sort_values("mean_share", ascending=False)
+    ranking.insert(0, "rank", np.arange(1, len(ranking) + 1))
+
+    return {
+        "scores": pd.DataFrame(score_rows),
+        "importance": importance,
+        "ranking": ranking,
+        "n_rows": len(y),
+    }
+
+
+def load_candidates(spec):
+    return candidate_frame()
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("importance")
+def _get_importance(version):
+    return load_or_fit(IMPORTANCE_SPEC, compute_importance, version, load=load_candidates)
+
+
+@profiling.timed("fit:importance", cache="importance")
+def get_importance():
+    """
+    Returns the permutation and drop-column importances of the candidate predictors for the current dataset version.
+    """
+    return _get_importance(dataset_version())
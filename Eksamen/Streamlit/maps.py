@@ -0,0 +1,138 @@
+"""
+Choropleth maps for the World Map page.
+
+Every metric is a column (or the mean of columns) of the country master table. It is turned
+into a small ISO-3 keyed payload (iso_code, Country, value) and a plotly figure, once per
+dataset version. Only measured values are drawn: countries whose value was filled in with a
+median during cleaning are left blank. The figures are kept as serialized JSON and shared
+between sessions, so switching metric only loads a finished figure instead of reloading the
+data and rebuilding the map.
+
+The map can also be coloured by the risk-profile clusters from clustering.py, read from the
+saved assignments for the chosen number of clusters.
+"""
+import pandas as pd
+import plotly.io as pio
+import streamlit as st
+
+from data import require_master, dataset_version
+import profiling
+
+# Metric options: mapping metric name to master table column(s); several columns are averaged
+METRIC_OPTIONS = {
+    "Total Deaths": "total_deaths",
+    "Deaths per Million": "total_deaths_per_million",
+    "Life Expectancy": "life_expectancy",
+    "Human Development Index (HDI)": "human_development_index",
+    "Aged 65 and Older (%)": "aged_65_older",
+    "Cardiovascular Death Rate": "cardiovasc_death_rate",
+    "Smokers (Avg %)": ["female_smokers", "male_smokers"]
+}
+
+# Map option coloured by cluster instead of a metric
+CLUSTER_LABEL = "Risk Profile Cluster"
+
+
+def map_payload(label):
+    """
+    Returns the rows drawn for one metric: iso_code, Country and the metric value (named after the label).
+    Countries without a measured value or without an ISO code are left out.
+    """
+    column_name = METRIC_OPTIONS[label]
+    columns = column_name if isinstance(column_name, list) else [column_name]
+    df = require_master().observed(["iso_code"] + columns)
+
+    payload = pd.DataFrame({"iso_code": df["iso_code"].astype(str), "Country": df.index.astype(str)})
+    payload[label] = df[columns].mean(axis=1) if len(columns) > 1 else df[columns[0]]
+    return payload.reset_index(drop=True)
+
+
+def build_map_figure(label, payload):
+    """
+    Draws the choropleth for one metric. Countries are matched on ISO-3 codes, not names.
+    """
+    # Only needed to build the figures; the page itself only loads the finished JSON
+    import plotly.express as px
+
+    fig = px.choropleth(
+        payload,
+        locations="iso_code",
+        color=label,
+        hover_name="Country",
+        hover_data={"iso_code": False, label: True},
+        color_continuous_scale="Plasma",
+        title=f"{label} by Country"
+    )
+    fig.update_layout(
+        geo=dict(showframe=False, showcoastlines=False),
+        margin=dict(t=40, b=0, l=0, r=0),
+        coloraxis_colorbar=dict(title=label)
+    )
+    return fig
+
+
+def cluster_payload(k=None):
+    """
+    Returns iso_code, Country and the cluster of every clustered country (for k clusters, the best k by default).
+    """
+    import clustering
+
+    rows = clustering.country_clusters(clustering.get_clusters(), k)
+    payload = pd.DataFrame({"iso_code": rows["iso_code"].astype(str), "Country": rows["location"].astype(str)})
+    payload[CLUSTER_LABEL] = rows["cluster"].astype(str)
+    return payload
+
+
+def build_cluster_map_figure(payload):
+    """
+    Draws the countries coloured by cluster, with the clusters in order in the legend.
+    """
+    import plotly.express as px
+
+    clusters = sorted(payload[CLUSTER_LABEL].unique(), key=lambda name: int(name.split()[-1]))
+    fig = px.choropleth(
+        payload,
+        locations="iso_code",
+        color=CLUSTER_LABEL,
+        hover_name="Country",
+        hover_data={"iso_code": False, CLUSTER_LABEL: True},
+        category_orders={CLUSTER_LABEL: clusters},
+        color_discrete_sequence=px.colors.qualitative.Safe,
+        title="Countries by Age, Health and HDI Profile"
+    )
+    fig.update_layout(geo=dict(showframe=False, showcoastlines=False), margin=dict(t=40, b=0, l=0, r=0))
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+@profiling.counts_miss("maps")
+def _cluster_map_figure(version, k):
+    return build_cluster_map_figure(cluster_payload(k)).to_json()
+
+
+@profiling.timed("figure:cluster_map", cache="maps")
+def get_cluster_map_figure(k=None):
+    """
+    Returns the map coloured by cluster for k clusters (the best k by default).
+    """
+    return pio.from_json(_cluster_map_figure(dataset_version(), k))
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+@profiling.counts_miss("maps")
+def _map_figures(version):
+    # All metrics are built together, so the first visit pays for every later metric switch
+    return {
+        label: build_map_figure(label, map_payload(label)).to_json()
+        for label in METRIC_OPTIONS
+    }
+
+
+@profiling.timed("figure:map", cache="maps")
+def get_map_figure(label):
+    """
+    Returns the choropleth figure for a metric from the per-version figure cache.
+    """
+    if label not in METRIC_OPTIONS:
+        raise ValueError(f"Unknown metric '{label}'. Choose one of: {', '.join(METRIC_OPTIONS)}")
+    return pio.from_json(_map_figures(dataset_version())[label])
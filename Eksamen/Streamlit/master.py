@@ -0,0 +1,114 @@
+"""
+The country master table.
+
+The cleaning pipeline writes one typed table (snapshots/master.parquet) with a row per country
+and every column of the covid, age and health datasets, before any median is filled in. Next
+to the values it keeps:
+
+  - which countries belong to each dataset (the in_<dataset> flags), and
+  - the median each dataset fills its missing values with (stored in the file footer).
+
+The cleaned datasets are built from this table: the rows of one dataset and that dataset's
+medians where a value is missing. Each one is built once per table, on first use, and every
+load of it is a column selection of that frame, which shares its data (pandas copy-on-write)
+instead of copying it. They come out identical to the cleaned CSV files, so nothing downstream
+changes, but the data is read and parsed once. Only a view with its own rows mask builds a
+new frame.
+A missing-value mask per column says which values were measured and which were filled in,
+and columns from different datasets can be used together without merging frames.
+"""
+import numpy as np
+import pandas as pd
+
+import storage
+
+DATASETS = ["covid", "age", "health"]
+
+# Column order of each cleaned dataset (the same as its CSV file)
+DATASET_COLUMNS = {name: storage.SCHEMAS[name].names for name in DATASETS}
+
+
+class MasterTable:
+    """
+    One row per country, indexed by location. Typed like the snapshots: float32 for rates and
+    shares, float64 for counts, a category for continent.
+    """
+
+    def __init__(self, frame, fills):
+        flags = [f"in_{name}" for name in DATASETS]
+        self.members = frame.set_index("location")[flags].rename(columns=lambda c: c[3:])
+        self.frame = frame.drop(columns=flags).set_index("location")
+        self.fills = fills
+        # True where a value is missing in the source data (before any imputation)
+        self.missing = self.frame.isna()
+        # Filled frame of each dataset, built on first use (see filled)
+        self._filled = {}
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    def rows(self, datasets):
+        """
+        Returns a boolean mask of the countries that are in all the given datasets.
+        """
+        datasets = [datasets] if isinstance(datasets, str) else datasets
+        return self.members[datasets].all(axis=1).to_numpy()
+
+    def filled(self, dataset):
+        """
+        Returns every column of a dataset with its medians filled in. The frame is built once
+        and shared by all views of the dataset, so it must not be modified in place.
+        """
+        if dataset not in self._filled:
+            self._filled[dataset] = self._build(dataset, DATASET_COLUMNS[dataset], self.rows(dataset))
+        return self._filled[dataset]
+
+    def view(self, dataset, columns=None, rows=None):
+        """
+        Returns the given columns of a dataset with its medians filled in, in the same form as
+        the cleaned dataset file (location as a category column, default index).
+        Without rows this is a column selection of the shared filled frame, which copies no data.
+        rows is an optional boolean mask of countries to return instead of the dataset's own
+        rows; values of countries outside the dataset are returned as measured, without filling.
+        Such a view is built as a new frame.
+        """
+        if dataset not in DATASET_COLUMNS:
+            raise ValueError(f"Unknown dataset '{dataset}'. Choose one of: {', '.join(DATASETS)}")
+        columns = DATASET_COLUMNS[dataset] if columns is None else list(columns)
+        if rows is None and set(columns) <= set(DATASET_COLUMNS[dataset]):
+            return self.filled(dataset)[columns]
+        rows = self.rows(dataset) if rows is None else np.asarray(rows)
+        return self._build(dataset, columns, rows)
+
+    def _build(self, dataset, columns, rows):
+        values = [c for c in columns if c != "location"]
+        df = self.frame.loc[rows, values]
+        fills = {c: value for c, value in self.fills[dataset].items() if c in values}
+        if fills:
+            inside = self.rows(dataset)[rows]
+            for col, value in fills.items():
+                filled = df[col].where(~inside | df[col].notna(), value)
+                df = df.assign(**{col: filled.astype(df[col].dtype)})
+
+        df = df.reset_index()
+        # Categories in order of appearance, like the dataset snapshots
+        for col in ["location", "continent"]:
+            if col in df:
+                values = df[col].astype(str).to_numpy()
+                df[col] = pd.Categorical(values, categories=pd.unique(values))
+        return df[columns]
+
+    def observed(self, columns):
+        """
+        Returns the given columns for the countries where all of them were measured (nothing imputed).
+        """
+        columns = list(columns)
+        return self.frame.loc[~self.missing[columns].any(axis=1).to_numpy(), columns]
+
+
+def read_master(path):
+    """
+    Reads the master table snapshot.
+    """
+    return MasterTable(storage.read_snapshot(path), storage.read_snapshot_metadata(path)["fills"])
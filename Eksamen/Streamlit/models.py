@@ -0,0 +1,232 @@
+"""
+Model registry for the Data Modeling page.
+
+Every hypothesis model is fitted once per dataset version. The fitted model, its train/test
+split and its metrics are saved to disk under .cache/models and shared between sessions,
+so switching between hypotheses does not refit anything.
+
+scikit-learn and matplotlib are only imported when a model is fitted or drawn, so a page that
+reads the saved models (or only the model specs) does not pay for importing them.
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import load_dataset, dataset_version
+import profiling
+
+BASE_DIR = Path(__file__).resolve().parent
+MODEL_DIR = BASE_DIR / ".cache" / "models"
+
+# The regression models used for the hypotheses (same splits as in the notebook)
+MODEL_SPECS = {
+    "population_total_deaths": {
+        "dataset": "covid",
+        "features": ["population"],
+        "target": "total_deaths",
+        "test_size": 0.15,
+        "random_state": 123,
+    },
+    "population_deaths_per_million": {
+        "dataset": "covid",
+        "features": ["population"],
+        "target": "total_deaths_per_million",
+        "test_size": 0.15,
+        "random_state": 123,
+    },
+    "hdi_deaths_per_million": {
+        "dataset": "covid",
+        "features": ["human_development_index"],
+        "target": "total_deaths_per_million",
+        "test_size": 0.20,
+        "random_state": 123,
+    },
+    "age_factors": {
+        "dataset": "age",
+        "features": ["life_expectancy", "median_age", "aged_65_older"],
+        "target": "total_deaths_per_million",
+        "test_size": 0.25,
+        "random_state": 1,
+    },
+    "health_factors": {
+        "dataset": "health",
+        "features": ["cardiovasc_death_rate", "diabetes_prevalence", "female_smokers", "male_smokers"],
+        "target": "total_deaths_per_million",
+        "test_size": 0.20,
+        "random_state": 123,
+    },
+}
+
+# Decision tree from hypothesis 3: death rate split into 3 quantile classes
+TREE_SPEC = {
+    "dataset": "age",
+    "features": ["life_expectancy", "median_age", "aged_65_older"],
+    "target": "total_deaths_per_million",
+    "classes": ["Low", "Medium", "High"],
+    "max_depth": 4,
+    "test_size": 0.15,
+    "random_state": 12,
+}
+
+
+def model_key(spec, version):
+    """
+    Cache key for a model: dataset version + feature set + target + split settings.
+    """
+    text = json.dumps({"version": version, **spec}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def regression_metrics(y_test, y_pred):
+    from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error, explained_variance_score
+
+    mse = mean_squared_error(y_test, y_pred)
+    return {
+        "r2": r2_score(y_test, y_pred),
+        "mae": mean_absolute_error(y_test, y_pred),
+        "mse": mse,
+        "rmse": np.sqrt(mse),
+        "explained_variance": explained_variance_score(y_test, y_pred),
+    }
+
+
+def fit_regression(spec, df):
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
+
+    X = df[spec["features"]]
+    y = df[spec["target"]]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=spec["test_size"], random_state=spec["random_state"]
+    )
+    model = LinearRegression().fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+
+    result = {
+        "model": model,
+        "features": spec["features"],
+        "target": spec["target"],
+        "X": X,
+        "y": y,
+        "y_test": y_test,
+        "y_pred": y_pred,
+        "metrics": regression_metrics(y_test, y_pred),
+    }
+
+    # A straight line only needs its two end points, not a prediction for every country
+    if len(spec["features"]) == 1:
+        line_x = np.array([X.iloc[:, 0].min(), X.iloc[:, 0].max()])
+        result["line_x"] = line_x
+        result["line_y"] = model.coef_[0] * line_x + model.intercept_
+    return result
+
+
+def fit_tree(spec, df):
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeClassifier
+
+    df = df[spec["features"] + [spec["target"]]].copy()
+    df["death_rate_category"] = pd.qcut(df[spec["target"]], q=len(spec["classes"]), labels=spec["classes"])
+
+    X = df[spec["features"]]
+    y = df["death_rate_category"].astype(str)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=spec["test_size"], random_state=spec["random_state"]
+    )
+    classifier = DecisionTreeClassifier(
+        max_depth=spec["max_depth"],
+        min_samples_leaf=spec.get("min_samples_leaf", 1),
+        criterion=spec.get("criterion", "gini"),
+        random_state=0,
+    )
+    classifier.fit(X_train, y_train)
+    y_pred = classifier.predict(X_test)
+
+    return {
+        "model": classifier,
+        "features": spec["features"],
+        "classes": list(classifier.classes_),
+        "y_test": y_test,
+        "y_pred": y_pred,
+        "metrics": {"accuracy": accuracy_score(y_test, y_pred)},
+        "importances": pd.Series(classifier.feature_importances_, index=spec["features"]).sort_values(ascending=False),
+    }
+
+
+def load_or_fit(spec, fit, version, load=None):
+    """
+    Returns a fitted model from disk if it exists for this dataset version, otherwise fits and saves it.
+    The data is spec["features"] + spec["target"] of spec["dataset"], or load(spec) if given.
+    """
+    path = MODEL_DIR / f"{model_key(spec, version)}.joblib"
+    profiling.count("model files")
+    if path.exists():
+        try:
+            return joblib.load(path)
+        except Exception:
+            # A broken or outdated file is simply refitted
+            pass
+
+    profiling.count("model files", miss=True)
+    df = load(spec) if load is not None else load_dataset(spec["dataset"], spec["features"] + [spec["target"]])
+    result = fit(spec, df)
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    joblib.dump(result, path)
+    return result
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+@profiling.counts_miss("models")
+def _get_model(name, version):
+    return load_or_fit(MODEL_SPECS[name], fit_regression, version)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("models")
+def _get_tree(version):
+    return load_or_fit(TREE_SPEC, fit_tree, version)
+
+
+@profiling.timed("fit:{0}", cache="models")
+def get_model(name):
+    """
+    Returns the fitted regression model for a hypothesis together with its split and metrics.
+    """
+    if name not in MODEL_SPECS:
+        raise ValueError(f"Unknown model '{name}'. Choose one of: {', '.join(MODEL_SPECS)}")
+    return _get_model(name, dataset_version())
+
+
+@profiling.timed("fit:tree", cache="models")
+def get_tree():
+    """
+    Returns the fitted decision tree from hypothesis 3 with its accuracy and feature importances.
+    """
+    return _get_tree(dataset_version())
+
+
+@profiling.timed("figure:tree")
+def plot_tree_figure(result):
+    """
+    Draws the decision tree on a new matplotlib figure.
+    """
+    import matplotlib.pyplot as plt
+    from sklearn.tree import plot_tree
+
+    fig, ax = plt.subplots(figsize=(20, 10))
+    plot_tree(
+        result["model"],
+        feature_names=result["features"],
+        class_names=result["classes"],
+        filled=True,
+        rounded=True,
+        fontsize=8,
+        ax=ax,
+    )
+    return fig
@@ -1,7 +1,9 @@
 import streamlit as st
+import profiling
 
 # Page config
 st.set_page_config(page_title="Conclusion", page_icon="📌")
+profiling.page("Conclusion")
 
 # Title
 st.title("Conclusion")
@@ -1,16 +1,31 @@
 import streamlit as st
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error, explained_variance_score
-from sklearn.model_selection import train_test_split
-import matplotlib.pyplot as plt
-import numpy as np
-from PIL import Image
-
-# Load datasets
-df_covid = pd.read_csv("df_covid_cleaned.csv")
-df_age = pd.read_csv("df_age_cleaned.csv")
-df_health = pd.read_csv("df_health_cleaned.csv")
+from models import get_model, get_tree, plot_tree_figure
+from batch_regression import CANDIDATE_FEATURES, get_subset_table
+from classification import get_tree_search
+import precompute
+from resampling import evaluate_model, CONFIDENCE, DEFAULT_FOLDS, DEFAULT_REPEATS, DEFAULT_BOOTSTRAPS
+import profiling
+import rendering
+
+profiling.page("DataModeling")
+
+
+def show_resampling(name):
+    """
+    Shows cross-validated metrics and bootstrap confidence intervals for a hypothesis model.
+    """
+    with st.expander("Cross-validation and bootstrap confidence intervals", expanded=False):
+        if not precompute.ready("resampling", label="Resampling the models"):
+            return
+        evaluation = evaluate_model(name)
+        cv = evaluation["cv"]
+        st.write(f"{DEFAULT_REPEATS} x {DEFAULT_FOLDS}-fold cross-validation on {evaluation['n_rows']} countries: "
+                 f"R² {cv['r2'].mean():.4f} ± {cv['r2'].std():.4f}, "
+                 f"MAE {cv['mae'].mean():,.2f}, RMSE {cv['rmse'].mean():,.2f}")
+        st.write(f"{CONFIDENCE:.0%} confidence intervals from {DEFAULT_BOOTSTRAPS} bootstrap samples "
+                 "(metrics are measured on the countries left out of each sample):")
+        st.dataframe(evaluation["intervals"], hide_index=True)
+
 
 # Page title and introduction
 st.title("Data Modeling: COVID-19 Mortality Analysis")
@@ -41,169 +56,280 @@ section = st.selectbox("Choose a Hypothesis to Explore:", [
     "Hypothesis 1: Population vs COVID-19 Deaths",
     "Hypothesis 2: HDI vs COVID-19 Deaths",
     "Hypothesis 3: Age Factors",
-    "Hypothesis 4: Health Risk Factors"
+    "Hypothesis 4: Health Risk Factors",
+    "All Feature Combinations",
+    "Feature Importance",
+    "What-if Scenarios"
 ])
 
 # ---------------------- Hypothesis 1 ----------------------
 if section == "Hypothesis 1: Population vs COVID-19 Deaths":
     st.header("Hypothesis 1: Population Size and COVID-19 Deaths")
+    precompute.wait("models", label="Fitting the models")
+    import matplotlib.pyplot as plt
     st.write("Linear regression is a statistical method used to analyze the relationship between an independent variable (population) and a dependent variable (number of deaths). The model tries to find the best-fitting straight line that can predict the value of the dependent variable based on the input.")
 
     st.subheader("Model 1: Total Deaths")
-    X = df_covid[['population']]
-    y = df_covid[['total_deaths']]
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, random_state=123)
-    model1 = LinearRegression().fit(X_train, y_train)
-    y_pred = model1.predict(X_test)
+    result1 = get_model("population_total_deaths")
+    model1 = result1["model"]
+    metrics1 = result1["metrics"]
 
     fig1, ax1 = plt.subplots()
-    ax1.scatter(X, y, color='green')
-    ax1.plot(X, model1.predict(X), color='blue')
+    rendering.scatter(ax1, result1["X"], result1["y"], color='green')
+    ax1.plot(result1["line_x"], result1["line_y"], color='blue')
     ax1.set_title("Population vs Total Deaths")
     ax1.set_xlabel("Population")
     ax1.set_ylabel("Total Deaths")
     st.pyplot(fig1)
+    plt.close(fig1)
 
     st.markdown(f"""
-    **Equation:** y = {model1.coef_[0][0]:.6f} * x + {model1.intercept_[0]:.2f}  
-    **Prediction for x=170:** {model1.predict([[170]])[0][0]:.2f} deaths  
-    **R²:** {r2_score(y_test, y_pred):.4f}  
-    **MSE:** {mean_squared_error(y_test, y_pred):,.2f}  
-    **Explained Variance:** {explained_variance_score(y_test, y_pred):.2f}
+    **Equation:** y = {model1.coef_[0]:.6f} * x + {model1.intercept_:.2f}  
+    **Prediction for x=170:** {model1.coef_[0] * 170 + model1.intercept_:.2f} deaths  
+    **R²:** {metrics1["r2"]:.4f}  
+    **MSE:** {metrics1["mse"]:,.2f}  
+    **Explained Variance:** {metrics1["explained_variance"]:.2f}
     """)
 
+    show_resampling("population_total_deaths")
+
     st.write("The regression line between population and total deaths shows a very weak relationship (R² ≈ 0.0049), meaning that population size explains less than 1% of the variation in COVID-19 deaths across countries. This indicates that other factors play a much more significant role.")
 
 
     st.subheader("Model 2: Deaths per Million")
-    y2 = df_covid[['total_deaths_per_million']]
-    X_train2, X_test2, y_train2, y_test2 = train_test_split(X, y2, test_size=0.15, random_state=123)
-    model2 = LinearRegression().fit(X_train2, y_train2)
-    y_pred2 = model2.predict(X_test2)
+    result2 = get_model("population_deaths_per_million")
+    model2 = result2["model"]
+    metrics2 = result2["metrics"]
 
     fig2, ax2 = plt.subplots()
-    ax2.scatter(X, y2, color='green')
-    ax2.plot(X, model2.predict(X), color='blue')
+    rendering.scatter(ax2, result2["X"], result2["y"], color='green')
+    ax2.plot(result2["line_x"], result2["line_y"], color='blue')
     ax2.set_title("Population vs Deaths per Million")
     ax2.set_xlabel("Population")
     ax2.set_ylabel("Deaths per Million")
     st.pyplot(fig2)
+    plt.close(fig2)
 
     st.markdown(f"""
-    **Equation:** y = {model2.coef_[0][0]:.8f} * x + {model2.intercept_[0]:.2f}  
-    **Prediction for x=170:** {model2.predict([[170]])[0][0]:.2f} deaths/million  
-    **R²:** {r2_score(y_test2, y_pred2):.4f}  
-    **MSE:** {mean_squared_error(y_test2, y_pred2):,.2f}  
-    **Explained Variance:** {explained_variance_score(y_test2, y_pred2):.2f}
+    **Equation:** y = {model2.coef_[0]:.8f} * x + {model2.intercept_:.2f}  
+    **Prediction for x=170:** {model2.coef_[0] * 170 + model2.intercept_:.2f} deaths/million  
+    **R²:** {metrics2["r2"]:.4f}  
+    **MSE:** {metrics2["mse"]:,.2f}  
+    **Explained Variance:** {metrics2["explained_variance"]:.2f}
     """)
     
+    show_resampling("population_deaths_per_million")
+
     st.write("This plot examines the relationship between population size and COVID-19 deaths per million. Despite the upward regression line caused by outliers, the data points are mostly concentrated at the bottom, suggesting no clear correlation. This supports the idea that population size alone does not predict per capita death rates.")
 
 # ---------------------- Hypothesis 2 ----------------------
 elif section == "Hypothesis 2: HDI vs COVID-19 Deaths":
     st.header("Hypothesis 2: Human Development Index and Deaths per Million")
+    precompute.wait("models", label="Fitting the models")
+    import matplotlib.pyplot as plt
     st.write("Linear regression is a statistical method used to analyze the relationship between an independent variable (population) and a dependent variable (number of deaths). The model tries to find the best-fitting straight line that can predict the value of the dependent variable based on the input.")
 
-    X = df_covid[['human_development_index']]
-    y = df_covid[['total_deaths_per_million']]
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=123)
-
-    model = LinearRegression().fit(X_train, y_train)
-    y_pred = model.predict(X_test)
+    result = get_model("hdi_deaths_per_million")
+    model = result["model"]
+    metrics = result["metrics"]
 
     fig, ax = plt.subplots()
-    ax.scatter(X, y, color='green')
-    ax.plot(X, model.predict(X), color='blue')
+    rendering.scatter(ax, result["X"], result["y"], color='green')
+    ax.plot(result["line_x"], result["line_y"], color='blue')
     ax.set_title("HDI vs Deaths per Million")
     ax.set_xlabel("HDI")
     ax.set_ylabel("Deaths per Million")
     st.pyplot(fig)
+    plt.close(fig)
 
     st.markdown(f"""
-    **Equation:** y = {model.coef_[0][0]:.2f} * x + {model.intercept_[0]:.2f}  
-    **MAE:** {mean_absolute_error(y_test, y_pred):.2f}  
-    **MSE:** {mean_squared_error(y_test, y_pred):.2f}  
-    **RMSE:** {np.sqrt(mean_squared_error(y_test, y_pred)):.2f}  
-    **R²:** {r2_score(y_test, y_pred):.4f}
+    **Equation:** y = {model.coef_[0]:.2f} * x + {model.intercept_:.2f}  
+    **MAE:** {metrics["mae"]:.2f}  
+    **MSE:** {metrics["mse"]:.2f}  
+    **RMSE:** {metrics["rmse"]:.2f}  
+    **R²:** {metrics["r2"]:.4f}
     """)
 
+    show_resampling("hdi_deaths_per_million")
+
     st.write("This graph shows a weak positive trend between Human Development Index (HDI) and COVID-19 deaths per million, but the wide spread of data points suggests the relationship is not very strong.")
 
 # ---------------------- Hypothesis 3 ----------------------
 elif section == "Hypothesis 3: Age Factors":
     st.header("Hypothesis 3: Age-related Factors")
+    precompute.wait("models", label="Fitting the models")
+    import matplotlib.pyplot as plt
     st.write("The purpose of multiple linear regression is to model the relationship between one dependent variable and two or more independent variables. It helps identify how each predictor contributes to the outcome while controlling for the influence of other variables. This technique is useful for understanding which factors have the strongest impact and for making informed predictions.")
 
-    feature_cols = ['life_expectancy', 'median_age', 'aged_65_older']
-    X = df_age[feature_cols]
-    y = df_age['total_deaths_per_million']
-    X_train, X_test, y_train, y_test = train_test_split(X, y, random_state=1)
-
-    model = LinearRegression().fit(X_train, y_train)
-    y_pred = model.predict(X_test)
+    result = get_model("age_factors")
+    model = result["model"]
+    metrics = result["metrics"]
+    y_test, y_pred = result["y_test"], result["y_pred"]
 
     fig, ax = plt.subplots()
-    ax.scatter(y_test, y_pred, color='green', label='Predicted vs Actual')
+    rendering.scatter(ax, y_test, y_pred, color='green', label='Predicted vs Actual')
     ax.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label='Perfect Prediction')
     ax.set_xlabel('Actual')
     ax.set_ylabel('Predicted')
     ax.set_title('Multiple Linear Regression: Age Factors')
     ax.legend()
     st.pyplot(fig)
+    plt.close(fig)
 
     st.markdown(f"""
     **Intercept (b0):** {model.intercept_:.2f}  
-    **MAE:** {mean_absolute_error(y_test, y_pred):.2f}  
-    **MSE:** {mean_squared_error(y_test, y_pred):.2f}  
-    **RMSE:** {np.sqrt(mean_squared_error(y_test, y_pred)):.2f}  
-    **R²:** {r2_score(y_test, y_pred):.4f}  
-    **Explained Variance:** {explained_variance_score(y_test, y_pred):.2f}
+    **MAE:** {metrics["mae"]:.2f}  
+    **MSE:** {metrics["mse"]:.2f}  
+    **RMSE:** {metrics["rmse"]:.2f}  
+    **R²:** {metrics["r2"]:.4f}  
+    **Explained Variance:** {metrics["explained_variance"]:.2f}
     """)
 
+    show_resampling("age_factors")
+
     st.write("The model shows a clear correlation between age-related factors and COVID-19 death rates. It explains a large part of the variation across countries, but moderate errors (MAE and RMSE) indicate that other factors also play a role. Therefore, the model is useful for identifying overall trends – but not for making precise predictions.")
 
     st.subheader("Decision Tree")
-    st.image("../Data/DecisionTree.png", caption="Decision Tree Visualization", use_column_width=True)
-    st.write("Decision Tree Accuracy: 70%. Life expectancy emerged as the top predictor among age-related features.")
-    st.write("The decision tree, using demographic features, achieved 70% accuracy and revealed life expectancy as the key factor in predicting COVID-19 death rate categories.")
+    tree = get_tree()
+    tree_fig = plot_tree_figure(tree)
+    st.pyplot(tree_fig)
+    plt.close(tree_fig)
+    st.caption("Decision Tree Visualization")
+    top_feature = tree["importances"].index[0].replace('_', ' ')
+    st.write(f"Decision Tree Accuracy: {tree['metrics']['accuracy']:.0%}. {top_feature.capitalize()} emerged as the top predictor among age-related features.")
+    st.write(f"The decision tree, using demographic features, achieved {tree['metrics']['accuracy']:.0%} accuracy and revealed {top_feature} as the key factor in predicting COVID-19 death rate categories.")
+
+    st.subheader("Tuned Decision Tree")
+    st.write("The tree above uses settings picked by hand. Here the depth, minimum leaf size, split criterion and number of death rate classes are tuned with repeated 5-fold cross-validation. Weak settings are dropped after each round, so only the promising ones are tested on every fold.")
+
+    if precompute.ready("tree_search", label="Tuning the decision tree"):
+        search = get_tree_search()
+        n_bins = st.select_slider("Number of death rate classes:", options=sorted(search["best"]), value=3)
+        best_tree = search["best"][n_bins]
+        config = best_tree["config"]
+        depth = "no limit" if config["max_depth"] is None else config["max_depth"]
+
+        st.markdown(f"""
+        **Best settings:** max depth {depth}, min samples per leaf {config["min_samples_leaf"]}, criterion {config["criterion"]}  
+        **Cross-validated accuracy:** {best_tree["cv_accuracy"]:.0%} ± {best_tree["cv_std"]:.0%} (chance level {1 / n_bins:.0%})  
+        **Test accuracy:** {best_tree["metrics"]["accuracy"]:.0%}
+        """)
+        st.bar_chart(best_tree["importances"].rename("importance"))
+
+        tuned_fig = plot_tree_figure(best_tree)
+        st.pyplot(tuned_fig)
+        plt.close(tuned_fig)
+
+        with st.expander("All tested settings", expanded=False):
+            st.dataframe(search["table"][search["table"]["n_bins"] == n_bins], hide_index=True)
 
 # ---------------------- Hypothesis 4 ----------------------
 elif section == "Hypothesis 4: Health Risk Factors":
     st.header("Hypothesis 4: Health Risk Factors")
+    precompute.wait("models", label="Fitting the models")
+    import matplotlib.pyplot as plt
     st.write("The purpose of multiple linear regression is to model the relationship between one dependent variable and two or more independent variables. It helps identify how each predictor contributes to the outcome while controlling for the influence of other variables. This technique is useful for understanding which factors have the strongest impact and for making informed predictions.")
 
-    feature_cols = ['cardiovasc_death_rate', 'diabetes_prevalence', 'female_smokers', 'male_smokers']
-    X = df_health[feature_cols]
-    y = df_health['total_deaths_per_million']
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.20, random_state=123)
-    model = LinearRegression().fit(X_train, y_train)
-    y_pred = model.predict(X_test)
+    result = get_model("health_factors")
+    model = result["model"]
+    metrics = result["metrics"]
+    y_test, y_pred = result["y_test"], result["y_pred"]
 
     fig, ax = plt.subplots()
-    ax.scatter(y_test, y_pred, color='green', label='Predicted vs Actual')
+    rendering.scatter(ax, y_test, y_pred, color='green', label='Predicted vs Actual')
     ax.plot([y_test.min(), y_test.max()], [y_test.min(), y_test.max()], 'r--', label='Perfect Prediction')
     ax.set_xlabel('Actual')
     ax.set_ylabel('Predicted')
     ax.set_title('Multiple Linear Regression: Health Factors')
     ax.legend()
     st.pyplot(fig)
+    plt.close(fig)
 
-    coef_list = list(zip(feature_cols, model.coef_.flatten()))
-    
     st.markdown(f"""
     **Intercept (b0):** {model.intercept_:.2f}  
-    **MAE:** {mean_absolute_error(y_test, y_pred):.2f}  
-    **MSE:** {mean_squared_error(y_test, y_pred):.2f}  
-    **RMSE:** {np.sqrt(mean_squared_error(y_test, y_pred)):.2f}  
-    **R²:** {r2_score(y_test, y_pred):.4f}  
-    **Explained Variance:** {explained_variance_score(y_test, y_pred):.2f}
+    **MAE:** {metrics["mae"]:.2f}  
+    **MSE:** {metrics["mse"]:.2f}  
+    **RMSE:** {metrics["rmse"]:.2f}  
+    **R²:** {metrics["r2"]:.4f}  
+    **Explained Variance:** {metrics["explained_variance"]:.2f}
     """)
 
-    st.write("The green dots show actual COVID-19 death rates by country, while the y-axis shows model predictions. The red dashed line indicates perfect prediction. Since many dots deviate from this line—especially at higher values—it shows that the model struggles to accurately capture the true death rates based on the selected health features.")
-
-
-
-
+    show_resampling("health_factors")
 
+    st.write("The green dots show actual COVID-19 death rates by country, while the y-axis shows model predictions. The red dashed line indicates perfect prediction. Since many dots deviate from this line—especially at higher values—it shows that the model struggles to accurately capture the true death rates based on the selected health features.")
 
+# ---------------------- All Feature Combinations ----------------------
+elif section == "All Feature Combinations":
+    st.header("All Feature Combinations")
+    precompute.wait("subsets", label="Fitting all feature combinations")
+    st.write("Instead of testing a few hand-picked feature lists, this section fits a linear regression for every combination of the predictors above, for both target variables. The models are fitted on all countries that appear in every dataset, and ranked by adjusted R², which penalizes models for using more features.")
+
+    table = get_subset_table()
+    target = st.radio("Target variable:", table["target"].unique().tolist(), horizontal=True)
+    max_features = st.slider("Maximum number of features:", 1, len(CANDIDATE_FEATURES), len(CANDIDATE_FEATURES))
+
+    ranked = table[(table["target"] == target) & (table["n_features"] <= max_features)]
+    st.write(f"{len(ranked)} models. The 20 best by adjusted R²:")
+    st.dataframe(ranked[["features", "n_features", "r2", "adj_r2"]].head(20), hide_index=True)
+
+    with st.expander("Coefficients of the 20 best models", expanded=False):
+        st.dataframe(ranked[["features", "intercept"] + CANDIDATE_FEATURES].head(20), hide_index=True)
+
+    best = ranked.iloc[0]
+    st.write(f"The best model for {target.replace('_', ' ')} uses {best['features'].replace('_', ' ')} and explains {best['r2']:.0%} of the variation (adjusted R² {best['adj_r2']:.2f}).")
+
+# ---------------------- Feature Importance ----------------------
+elif section == "Feature Importance":
+    st.header("Feature Importance")
+    st.write("The hypotheses above each use their own features and their own train/test split, so their results cannot be compared directly. Here the linear regression and the decision tree are both fitted on every predictor, with 5-fold cross-validation. A feature's permutation importance is how much the held-out score drops when its values are shuffled between countries. Its drop-column importance is how much the score drops when the model is refitted without it.")
+    if precompute.ready("importance", label="Computing feature importances"):
+        from importance import IMPORTANCE_SPEC, get_importance
+        result = get_importance()
+        ranking = result["ranking"]
+        models = list(IMPORTANCE_SPEC["models"])
+
+        st.write(f"Share of each model's permutation importance, on {result['n_rows']} countries ({IMPORTANCE_SPEC['n_repeats']} shuffles per feature and fold):")
+        st.bar_chart(ranking[models], horizontal=True, stack=False, sort=False)
+        st.dataframe(ranking, column_config={
+            column: st.column_config.NumberColumn(format="percent") for column in models + ["mean_share"]
+        })
+
+        scores = ", ".join(f"{row.model} {row.metric} {row.score:.2f} ± {row.std:.2f}" for row in result["scores"].itertuples())
+        st.write(f"Cross-validated scores with every feature: {scores}.")
+        with st.expander("Permutation and drop-column importance per model", expanded=False):
+            st.write("Both are drops in the held-out score (R² or accuracy). A negative drop-column importance means the model did better without the feature, usually because another feature carries the same information.")
+            st.dataframe(result["importance"], hide_index=True)
+
+        top = ranking.index[0].replace('_', ' ')
+        st.write(f"Across both models, {top} is the most important predictor, followed by {ranking.index[1].replace('_', ' ')} and {ranking.index[2].replace('_', ' ')}.")
+
+# ---------------------- What-if Scenarios ----------------------
+elif section == "What-if Scenarios":
+    st.header("What-if Scenarios")
+    precompute.wait("models", label="Fitting models")
+    st.write("The fitted models can score any batch of countries at once. Here every country is scored with its measured values, and again after changing one feature, to see how the predicted death rates would move. Countries missing a feature the model needs are left out.")
+
+    from scoring import get_scorer, country_batch, Change
+    scorer = get_scorer()
+    regressions = [name for name in scorer.names if name != "tree"]
+    model_name = st.selectbox("Model:", regressions + ["tree"])
+    feature = st.selectbox("Feature to change:", scorer.features([model_name]))
+    change = st.slider(f"Change in {feature.replace('_', ' ')} (%):", -50, 50, 5, step=1)
+
+    predictions = scorer.score(country_batch(scorer.features([model_name])), [model_name], [Change(feature, "relative", change / 100)])
+    predictions = predictions.dropna(subset=[model_name])
+
+    if model_name == "tree":
+        moved = predictions[predictions["tree"] != predictions["tree_scenario"]]
+        st.write(f"{len(moved)} of {len(predictions)} countries change death rate category.")
+        st.dataframe(moved, hide_index=True)
+    else:
+        col1, col2 = st.columns(2)
+        col1.metric("Mean prediction", f"{predictions[model_name].mean():,.1f}")
+        col2.metric("With the change", f"{predictions[f'{model_name}_scenario'].mean():,.1f}",
+                    f"{predictions[f'{model_name}_change'].mean():+,.1f}")
+        st.dataframe(predictions.sort_values(f"{model_name}_change", key=abs, ascending=False), hide_index=True)
+    st.caption("The same scoring runs from the command line or as a local HTTP service: python scoring.py --help")
+
+# Rerun while results are still being computed in the background
+precompute.poll()
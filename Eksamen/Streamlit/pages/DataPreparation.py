@@ -1,19 +1,28 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import plotly.express as px
+from data import load_covid, load_age, load_health
+import data_profile
+import precompute
+import profiling
 
 # Page setup
 st.set_page_config(page_title="Data Preparation", page_icon="🧹")
+profiling.page("DataPreparation")
 st.title("🧹 Data Preparation")
 st.write("This page describes the cleaning and preprocessing steps applied to our COVID-19 dataset.")
 
+# Wait for the background worker to load the cleaned datasets
+precompute.wait("frame:covid", "frame:age", "frame:health", "profiles", label="Loading datasets")
+
 # Load datasets
 try:
-    df_raw = pd.read_csv("owid-covid-latest.csv")
-    df_covid = pd.read_csv("df_covid_cleaned.csv")
-    df_age = pd.read_csv("df_age_cleaned.csv")
-    df_health = pd.read_csv("df_health_cleaned.csv")
+    # The raw file is only shown through its profile (first rows, row count, missing values)
+    raw_profile = data_profile.get_profile("raw")
+    raw_rows = raw_profile.n_rows
+    df_covid = load_covid()
+    df_age = load_age()
+    df_health = load_health()
     st.success("Datasets successfully loaded!")
 except Exception as e:
     st.error(f"Error loading data: {e}")
@@ -52,7 +61,7 @@ st.markdown("""
 # Section: Raw Dataset
 st.markdown("#### Raw Dataset Samples")
 st.write("**Raw Dataset**")
-st.dataframe(df_raw.head(10))
+st.dataframe(raw_profile.head)
 
 # Section: Dataset Snapshots
 st.markdown("#### Cleaned Dataset Samples")
@@ -78,22 +87,18 @@ col2.metric("Age-Level", f"{df_age.shape[0]} rows")
 col3.metric("Health-Level", f"{df_health.shape[0]} rows")
 
 # Section: Missing Value Overview
-total_cols = df_raw.shape[1]
-empty_cols = (df_raw.isnull().sum() == df_raw.shape[0]).sum()
-some_data_cols = total_cols - empty_cols
-high_missing_cols = (df_raw.isnull().mean() > 0.5).sum()
+overview = raw_profile.missing_overview()
 
 st.markdown(f"""
 Missing Value Overview (Raw Dataset):
-- **Total columns:** {total_cols}  
-- **Columns with no data:** {empty_cols}  
-- **Columns with some data:** {some_data_cols}  
-- **Columns with >50% missing data:** {high_missing_cols}  
+- **Total columns:** {overview["total"]}  
+- **Columns with no data:** {overview["empty"]}  
+- **Columns with some data:** {overview["some_data"]}  
+- **Columns with >50% missing data:** {overview["high_missing"]}  
 """)
 
 # Section: Missing Value Visualization
-missing_percent = df_raw.isnull().mean() * 100
-missing_percent = missing_percent[(missing_percent > 0) & (missing_percent < 100)].sort_values(ascending=False)
+missing_percent = raw_profile.missing_percent()
 
 df_missing = pd.DataFrame({
     "Column": missing_percent.index,
@@ -110,6 +115,26 @@ fig = px.bar(
 fig.update_layout(xaxis_tickangle=45)
 st.plotly_chart(fig)
 
+# Section: Column Profiles
+st.markdown("#### Column Profiles")
+st.write(
+    "Dtype, missing and distinct values, quartiles and IQR outliers (values more than 1.5 x IQR "
+    "below Q1 or above Q3) of every column. Large files are profiled in chunks; quantiles and "
+    "distinct counts marked as not exact are estimated from a sample."
+)
+profile_labels = [label for label, name in data_profile.PAGE_PROFILES.items() if data_profile.profile_available(name)]
+profile_label = st.selectbox("Dataset:", profile_labels)
+profile = data_profile.get_profile(data_profile.PAGE_PROFILES[profile_label])
+st.caption(f"{profile.n_rows:,} rows")
+st.dataframe(profile.table, use_container_width=True)
+
+# IQR outliers of the key columns, as in the notebook
+covid_profile = data_profile.get_profile("covid")
+outlier_columns = ["population", "total_deaths", "total_deaths_per_million"]
+st.write("**Outliers in the Country-Level Dataset (IQR method)**")
+st.dataframe(covid_profile.table.loc[outlier_columns, ["q1", "q3", "iqr_low", "iqr_high", "outliers"]],
+             use_container_width=True)
+
 # Section: Key Features Explained
 st.markdown("#### Some Key Features Explained")
 feature_info = pd.DataFrame({
@@ -139,9 +164,9 @@ st.markdown("#### Dataset Reduction Overview")
 reduction_data = {
     "Dataset": ["Country-Level", "Age-Level", "Health-Level"],
     "Rows Removed": [
-        df_raw.shape[0] - df_covid.shape[0],
-        df_raw.shape[0] - df_age.shape[0],
-        df_raw.shape[0] - df_health.shape[0]
+        raw_rows - df_covid.shape[0],
+        raw_rows - df_age.shape[0],
+        raw_rows - df_health.shape[0]
     ],
     "Remaining Rows": [
         df_covid.shape[0],
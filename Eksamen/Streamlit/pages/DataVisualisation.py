@@ -1,22 +1,30 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
-import seaborn as sns  
+from data import load_covid, load_age
+from figures import render_png
+import precompute
+import profiling
+
+profiling.page("DataVisualisation")
 
 
 # Load datasets
 try:
-    df_covid = pd.read_csv("df_covid_cleaned.csv")
-    df_age = pd.read_csv("df_age_cleaned.csv")
+    load_covid(["population", "total_deaths", "total_deaths_per_million", "human_development_index"])
+    load_age(["total_deaths_per_million", "life_expectancy", "median_age", "aged_65_older", "aged_70_older"])
     st.success("Datasets successfully loaded!")
 except Exception as e:
     st.error(f"Error loading data: {e}")
     st.stop()
 
 
+def show_plot(section, name):
+    """
+    Shows a cached plot from figures.py once the background worker has drawn it.
+    """
+    if precompute.ready(f"figures:{section}", label="Drawing the plots"):
+        st.image(render_png(section, name), use_container_width=True)
+
+
 st.title("Data Visualization")
 
 st.write("""This section presents visual insights into the relationships between various demographic, 
@@ -34,48 +42,14 @@ section = st.selectbox("Jump to section:", [
 ])
 
 
-# Function used in hypothesis 3 for histograms
-def visualize_selected_histograms(df):
-    """
-    Visualizes the distribution of selected numeric columns from df_age_cleaned with histograms.
-    """
-    selected_cols = [
-        'total_deaths_per_million',
-        'life_expectancy',
-        'median_age',
-        'aged_65_older',
-        'aged_70_older'
-    ]
-
-    n = len(selected_cols)
-    n_cols = 3
-    n_rows = (n + n_cols - 1) // n_cols 
-
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(10, 3 * n_rows))
-    axes = axes.flatten()
-
-    for i, col in enumerate(selected_cols):
-        sns.histplot(df[col], kde=True, ax=axes[i], color='green')
-        axes[i].set_title(f'Distribution of {col}')
-        axes[i].set_xlabel(col.replace('_', ' ').title())
-
-    # Hide unused axes if any
-    for j in range(i + 1, len(axes)):
-        fig.delaxes(axes[j])
-
-    plt.tight_layout()
-    st.pyplot(plt)
-
-
-
 if section == "Histograms":
     st.header("Histograms")
     st.write("This section presents histograms that help us understand the distribution of the data and identify any potential outliers or skewness.")
     st.write("") 
 
 
-    plt.title('Visualizes the distribution of selected numeric columns from df_age_cleaned with histograms')
-    visualize_selected_histograms(df_age)
+    # Distribution of selected numeric columns from df_age_cleaned (hypothesis 3)
+    show_plot("Histograms", "age_histograms")
     st.write("The above histograms show the distribution of key variables. Most are right-skewed, especially age-related factors and total deaths per million, while life expectancy appears more normally distributed ") 
 
 
@@ -86,18 +60,14 @@ elif section == "Box Plots":
     st.write("") 
 
     # Total deaths pr milion from hypothesis 1
-    df_covid.boxplot(column='total_deaths_per_million', patch_artist=True, boxprops=dict(facecolor='lightgreen'))
-    plt.title('Outliers in total deaths pr million')
-    st.pyplot(plt)
+    show_plot("Box Plots", "deaths_per_million")
     st.write("""The box plot above shows the distribution of total deaths per million across countries. The outliers indicate a few countries with moderately higher death rates.""")
     st.write("")  
     st.write("") 
     st.write("") 
 
     # Total deathsfrom hypothesis 1
-    df_covid.boxplot(column='total_deaths', patch_artist=True, boxprops=dict(facecolor='lightgreen')) 
-    plt.title('Outliers in total deaths')
-    st.pyplot(plt)
+    show_plot("Box Plots", "total_deaths")
     st.write("""The box plot above shows the distribution of total deaths across countries. The outliers indicate many extreme values, likely from large countries with high populations.""")
 
 
@@ -108,18 +78,14 @@ elif section == "Scatter Plots":
     st.write("")  
 
     # Visualise the features and the response using scatterplots from hypothesis 2
-    plt.title('Human Development Index vs Total Deaths per Million')
-    sns.scatterplot(data=df_covid, x='human_development_index', y='total_deaths_per_million', color='green')
-    st.pyplot(plt)
+    show_plot("Scatter Plots", "hdi_deaths")
     st.write("This scatterplot above shows a moderate positive relationship between HDI and COVID-19 death rates per million, suggesting that countries with higher HDI tend to report more deaths — but also that HDI alone does not fully explain the variation.")
     st.write("")  
     st.write("") 
     st.write("") 
 
     # Visualise the features and the response using scatterplots from hypothesis 3
-    sns.pairplot(df_age, x_vars=['life_expectancy', 'median_age', 'aged_65_older'], y_vars='total_deaths_per_million', height=5, aspect=1, plot_kws={'color': 'green'})
-    plt.title('Scatterplot')
-    st.pyplot(plt)
+    show_plot("Scatter Plots", "age_factors")
     st.write("""These scatter plots above reveal positive relationships between age-related variables and COVID-19 death rates, indicating that older populations tend to experience higher death rates per million.""")
 
 
@@ -130,23 +96,15 @@ elif section == "Correlation Matrix":
     st.write("") 
 
     # Correlation matrix from hypothesis 2
-    corr_matrix = df_covid[['human_development_index', 'total_deaths_per_million']].corr()
-    sns.heatmap(corr_matrix, annot=True)
-    st.pyplot(plt)
+    show_plot("Correlation Matrix", "hdi_deaths")
     st.write("The matrix above shows a moderate positive correlation (0.47) between HDI and COVID-19 deaths per million — contrary to expectations. This suggests HDI alone doesn’t explain the variation in death rates.") 
     st.write("")  
     st.write("")  
     st.write("") 
 
     # Correlation matrix from hypothesis 1
-    corr_df = df_covid[['population', 'total_deaths', 'total_deaths_per_million']]
-    corr_matrix = corr_df.corr()
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm')
-    plt.title('Correlation Matrix')
-    st.pyplot(plt)
+    show_plot("Correlation Matrix", "population_deaths")
     st.write("The correlation matrix above shows a moderate link between population size and total deaths, but very weak correlation with deaths per million — suggesting population size doesn't strongly affect per capita death rates.") 
 
-
-
-
-
+# Rerun while plots are still being drawn in the background
+precompute.poll()
@@ -0,0 +1,83 @@
+import numpy as np
+import streamlit as st
+from cubes import BAND_LABELS, NO_DATA, PREDICTORS, TARGET, get_cubes, query, predictor_bands
+import precompute
+import profiling
+import rendering
+
+# Page config
+st.set_page_config(page_title="COVID-19 Explorer", page_icon="🔎")
+profiling.page("Explorer")
+st.title("🔎 COVID-19 Explorer")
+st.write("""
+Filter the countries by continent, Human Development Index (HDI) band and age band, and see the map, the scatter plot
+and the distribution of deaths per million update together. The bands split the countries into four equally large groups
+from the lowest to the highest HDI or median age.
+""")
+
+# The cubes are built in the background once per dataset version
+precompute.wait("cubes", label="Building the explorer")
+cubes = get_cubes()
+countries = cubes["countries"]
+
+# Filters
+col1, col2, col3 = st.columns(3)
+all_continents = sorted(countries["continent"].unique())
+continents = col1.multiselect("Continent:", all_continents, default=all_continents)
+# "No data" is only offered when some countries lack the predictor
+hdi_options = [b for b in BAND_LABELS + [NO_DATA] if (countries["hdi_band"] == b).any()]
+age_options = [b for b in BAND_LABELS + [NO_DATA] if (countries["age_band"] == b).any()]
+hdi_bands = col2.multiselect("HDI band:", hdi_options, default=hdi_options)
+age_bands = col3.multiselect("Age band:", age_options, default=age_options)
+
+result = query(cubes, continents, hdi_bands, age_bands)
+if result["count"] == 0:
+    st.warning("No countries match the selected filters.")
+    st.stop()
+
+# Summary from the cube cells
+col1, col2, col3 = st.columns(3)
+col1.metric("Countries", result["count"])
+col2.metric("Mean deaths per million", f"{result['mean']:,.0f}")
+col3.metric("Median deaths per million", f"{result['median']:,.0f}")
+
+selected = countries[result["countries"]]
+labels = {TARGET: "Deaths per Million", "human_development_index": "HDI", "location": "Country"}
+
+# plotly is only imported once there is something to draw
+import plotly.express as px
+
+# Map of the selected countries
+with profiling.span("figure:explorer_map"):
+    fig = px.choropleth(
+        selected, locations="iso_code", color=TARGET, hover_name="location",
+        color_continuous_scale="Plasma", labels=labels, title="Deaths per Million in the Selected Countries"
+    )
+    fig.update_layout(geo=dict(showframe=False, showcoastlines=False), margin=dict(t=40, b=0, l=0, r=0))
+st.plotly_chart(fig, use_container_width=True)
+
+# Scatter of HDI against deaths per million
+with profiling.span("figure:explorer_scatter"):
+    fig = rendering.scatter_figure(
+        selected, x="human_development_index", y=TARGET, color="continent", hover_name="location",
+        labels=labels, title="HDI vs Deaths per Million"
+    )
+st.plotly_chart(fig, use_container_width=True)
+
+# Distribution from the merged cube histograms
+edges = cubes["edges"]
+fig = px.bar(
+    x=(edges[:-1] + edges[1:]) / 2, y=result["histogram"],
+    labels={"x": "Deaths per Million", "y": "Countries"}, title="Distribution of Deaths per Million"
+)
+fig.update_traces(width=np.diff(edges))
+st.plotly_chart(fig, use_container_width=True)
+
+# Deaths per million by band of any predictor, for the selected continents
+st.subheader("Deaths per Million by Band")
+predictor = st.selectbox("Predictor:", PREDICTORS, format_func=lambda p: p.replace("_", " ").capitalize())
+bands = predictor_bands(cubes, predictor, continents)
+fig = px.bar(bands, x="band", y=["mean", "median"], barmode="group",
+             labels={"band": f"{predictor.replace('_', ' ').capitalize()} band", "value": "Deaths per Million", "variable": ""})
+st.plotly_chart(fig, use_container_width=True)
+st.dataframe(bands, hide_index=True)
@@ -0,0 +1,68 @@
+import streamlit as st
+from timeseries import DAILY_FILE, GROWTH_LAG, ROLLING_WINDOWS, daily_file_available, load_analytics, country_frame, country_summary
+import profiling
+
+# Page config
+st.set_page_config(page_title="COVID-19 Over Time", page_icon="📈")
+profiling.page("TimeSeries")
+st.title("📈 COVID-19 Deaths Over Time")
+st.write("""
+The other pages use the latest cumulative values for each country. This page follows the daily death rates instead:
+rolling 7- and 28-day deaths per million, the peaks of each wave and how fast deaths were growing or falling from week to week.
+""")
+
+if not daily_file_available():
+    st.info(f"""
+    This page needs the full daily dataset from Our World in Data, which is too large to include in the project.
+    Download **owid-covid-data.csv** from https://github.com/owid/covid-19-data/tree/master/public/data and save it as `{DAILY_FILE}`.
+    """)
+    st.stop()
+
+# plotly is only imported once the daily file is there
+import plotly.express as px
+
+# Load and analyse the daily data (once per file version)
+try:
+    with st.spinner("Computing rolling windows for all countries..."):
+        analytics = load_analytics()
+        summary = country_summary(analytics)
+except Exception as e:
+    st.error(f"Error loading data: {e}")
+    st.stop()
+
+# Country and window selection
+countries = st.multiselect(
+    "Select countries:",
+    options=summary.index.tolist(),
+    default=[code for code in ["NOR", "DNK", "SWE", "GBR"] if code in summary.index],
+    format_func=lambda code: summary.loc[code, "location"],
+)
+window = st.radio("Rolling window:", ROLLING_WINDOWS, format_func=lambda w: f"{w} days", horizontal=True)
+
+if not countries:
+    st.warning("Select at least one country.")
+    st.stop()
+
+df = country_frame(analytics, countries)
+column = f"deaths_per_million_{window}d"
+
+# Rolling deaths per million with the detected wave peaks
+st.subheader(f"{window}-day Rolling Deaths per Million")
+with profiling.span("figure:rolling_deaths"):
+    fig = px.line(df, x="date", y=column, color="location", labels={column: f"Deaths per million ({window} days)", "date": "Date"})
+    peaks = df[df["peak"]]
+    fig.add_scatter(x=peaks["date"], y=peaks[column], mode="markers", marker=dict(color="black", size=8, symbol="x"), name="Wave peak")
+st.plotly_chart(fig, use_container_width=True)
+st.write("Peaks are found on the 7-day series: a day is a peak when no day within four weeks on either side has more deaths, and it reaches at least 10% of the country's highest week.")
+
+# Week-over-week growth rate
+st.subheader("Weekly Growth Rate")
+with profiling.span("figure:growth_rate"):
+    fig = px.line(df, x="date", y="growth_rate", color="location", labels={"growth_rate": "Growth rate", "date": "Date"})
+    fig.update_yaxes(tickformat=".0%", range=[-1, 3])
+st.plotly_chart(fig, use_container_width=True)
+st.write(f"Change in 7-day deaths compared with {GROWTH_LAG} days earlier. Values above 0% mean deaths were rising.")
+
+# Summary for all countries
+st.subheader("All Countries")
+st.dataframe(summary, use_container_width=True)
@@ -1,9 +1,11 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+from maps import METRIC_OPTIONS, CLUSTER_LABEL, get_map_figure, get_cluster_map_figure
+import precompute
+import profiling
 
 # Page config
 st.set_page_config(page_title="COVID-19 Global Maps")
+profiling.page("WorldMap")
 st.title("COVID-19 WorldMap")
 st.markdown("""
 Welcome to this interactive COVID-19 global dashboard! 
@@ -12,81 +14,33 @@ By visualizing data such as death tolls, age structure, life expectancy, and hea
 Use the dropdown menu to select different metrics and discover key insights that may inform public health strategies and preparedness for future outbreaks.
 """)
 
-# Load datasets
+# User selects metric to visualize
+selected_label = st.selectbox("Select a metric to visualize on the world map:", list(METRIC_OPTIONS.keys()) + [CLUSTER_LABEL])
+
+# The maps for all metrics (and the clusters) are built in the background once per dataset version
+if selected_label == CLUSTER_LABEL:
+    precompute.wait("clusters", label="Clustering countries")
+    from clustering import get_clusters
+    clusters = get_clusters()
+    n_clusters = st.select_slider("Number of clusters:", options=clusters["sweep"]["k"].tolist(), value=clusters["k"])
+else:
+    precompute.wait("maps", label="Building the maps")
 try:
-    df_covid = pd.read_csv("df_covid_cleaned.csv")
-    df_age = pd.read_csv("df_age_cleaned.csv")
-    df_health = pd.read_csv("df_health_cleaned.csv")
+    fig = get_cluster_map_figure(n_clusters) if selected_label == CLUSTER_LABEL else get_map_figure(selected_label)
     st.success("Datasets successfully loaded!")
 except Exception as e:
     st.error(f"Error loading data: {e}")
     st.stop()
 
-# Rename location columns for consistency
-df_covid = df_covid.rename(columns={"location": "Country"})
-df_age = df_age.rename(columns={"location": "Country"})
-df_health = df_health.rename(columns={"location": "Country"})
-
-# Remove 'World' aggregate from all
-df_covid = df_covid[df_covid["Country"] != "World"]
-df_age = df_age[df_age["Country"] != "World"]
-df_health = df_health[df_health["Country"] != "World"]
-
-# Metric options: mapping metric name to (dataset, column(s))
-metric_options = {
-    "Total Deaths": ("df_covid", "total_deaths"),
-    "Deaths per Million": ("df_covid", "total_deaths_per_million"),
-    "Life Expectancy": ("df_age", "life_expectancy"),
-    "Human Development Index (HDI)": ("df_covid", "human_development_index"),
-    "Aged 65 and Older (%)": ("df_age", "aged_65_older"),
-    "Cardiovascular Death Rate": ("df_health", "cardiovasc_death_rate"),
-    "Smokers (Avg %)": ("df_health", ["female_smokers", "male_smokers"])
-}
-
-# User selects metric to visualize
-selected_label = st.selectbox("Select a metric to visualize on the world map:", list(metric_options.keys()))
-dataset_key, column_name = metric_options[selected_label]
-
-# Select and prepare correct dataframe
-if dataset_key == "df_covid":
-    df = df_covid[["Country", column_name]].dropna()
-    column_to_plot = column_name
-elif dataset_key == "df_age":
-    df = df_age[["Country", column_name]].dropna()
-    column_to_plot = column_name
-else:  # df_health
-    if isinstance(column_name, list):
-        df = df_health[["Country"] + column_name].dropna()
-        df["Smokers (Avg %)"] = df[column_name].mean(axis=1)
-        column_to_plot = "Smokers (Avg %)"
-    else:
-        df = df_health[["Country", column_name]].dropna()
-        column_to_plot = column_name
-
-# Rename column for display purposes
-df = df.rename(columns={column_to_plot: selected_label})
-
-# Create the choropleth map
-fig = px.choropleth(
-    df,
-    locations="Country",
-    locationmode="country names",
-    color=selected_label,
-    hover_name="Country",
-    hover_data={selected_label: True},
-    color_continuous_scale="Plasma",
-    title=f"{selected_label} by Country"
-)
-
-fig.update_layout(
-    geo=dict(showframe=False, showcoastlines=False),
-    margin=dict(t=40, b=0, l=0, r=0),
-    coloraxis_colorbar=dict(title=selected_label)
-)
-
 # Display the map
 st.plotly_chart(fig, use_container_width=True)
 
+if selected_label == CLUSTER_LABEL:
+    st.write(f"Average profile of each cluster ({n_clusters} clusters, numbered from the lowest to the highest HDI):")
+    st.dataframe(clusters["centers"][n_clusters].round(2), use_container_width=True)
+    st.write(f"The silhouette score of each number of clusters (higher means better separated clusters; {clusters['k']} scores best):")
+    st.dataframe(clusters["sweep"].set_index("k").round(3).T, use_container_width=True)
+
 # Info text for each metric
 info_texts = {
     "Total Deaths": (
@@ -119,6 +73,11 @@ info_texts = {
     "Smokers (Avg %)": (
         "The average percentage of male and female smokers in the population. "
         "Smoking affects lung health and immune response, which may impact COVID-19 severity."
+    ),
+    CLUSTER_LABEL: (
+        "Countries grouped by their combined age, health and development profile with k-means on "
+        "standardized features (HDI, age structure, life expectancy, cardiovascular death rate, diabetes and smoking). "
+        "Countries in the same cluster have similar risk profiles, whatever their COVID-19 outcome."
     )
 }
 
@@ -0,0 +1,244 @@
+"""
+Background precomputation for the Streamlit app.
+
+When a new dataset version lands, a small thread pool works through a queue of jobs that
+load the cleaned frames and fill the caches behind every page: map figures, plot images,
+fitted models, the all-subsets table, the resampling evaluations, the tree search and the
+feature importances.
+There is one worker per server (not per session), so the work is done once for everybody.
+
+Pages ask whether the jobs they need are done with ready(). Until then they show a progress
+bar instead of computing anything themselves, and poll() at the end of the page reruns it
+shortly afterwards. Once a job is done, its results come straight from the warm caches.
+A failed job is logged and tried again on a later start() or ready() call, waiting longer
+after every failure (RETRY_DELAY, doubled up to MAX_RETRY_DELAY), so a file read while the
+pipeline rewrites it does not block a page for the life of the server.
+"""
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from data import load_dataset, dataset_version
+
+# Threads running jobs; the heavy jobs share one process pool (workers.py)
+MAX_WORKERS = 2
+
+# Seconds between checks for a new dataset version on disk
+WATCH_INTERVAL = 30
+
+# Seconds a page waits before rerunning while its jobs are still running
+POLL_INTERVAL = 0.5
+
+# Seconds before a failed job is tried again, doubled after every further failure
+RETRY_DELAY = 5
+MAX_RETRY_DELAY = 300
+
+logger = logging.getLogger(__name__)
+
+
+def build_jobs():
+    """
+    Returns the jobs for one dataset version as {name: function}, cheapest first.
+    The functions fill the same caches the pages read from.
+    """
+    # Imported here so that importing this module stays cheap
+    import batch_regression
+    import classification
+    import cubes
+    import data_profile
+    import figures
+    import importance
+    import maps
+    import models
+    import resampling
+
+    jobs = {}
+    for name in ["covid", "age", "health", "raw"]:
+        jobs[f"frame:{name}"] = lambda name=name: load_dataset(name)
+    jobs["profiles"] = lambda: [data_profile.get_profile(name) for name in data_profile.PAGE_PROFILES.values()
+                                if data_profile.profile_available(name)]
+    jobs["maps"] = lambda: maps.get_map_figure(next(iter(maps.METRIC_OPTIONS)))
+    jobs["cubes"] = cubes.get_cubes
+    for section, plots in figures.PLOTS.items():
+        jobs[f"figures:{section}"] = lambda section=section, plots=plots: [
+            figures.render_png(section, name) for name in plots
+        ]
+    jobs["models"] = lambda: [models.get_model(name) for name in models.MODEL_SPECS] + [models.get_tree()]
+    jobs["clusters"] = maps.get_cluster_map_figure
+    jobs["subsets"] = batch_regression.get_subset_table
+    jobs["resampling"] = lambda: [resampling.evaluate_model(name) for name in models.MODEL_SPECS]
+    jobs["tree_search"] = classification.get_tree_search
+    jobs["importance"] = importance.get_importance
+    return jobs
+
+
+class Job:
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.state = "queued"
+        self.error = None
+        self.seconds = None
+        self.failures = 0
+        self.retry_at = None
+
+    def run(self):
+        self.state = "running"
+        start = time.perf_counter()
+        try:
+            self.func()
+            self.state = "done"
+            self.error = None
+        except Exception as error:
+            logger.error("Precompute job %s failed:\n%s", self.name, traceback.format_exc())
+            self.error = f"{type(error).__name__}: {error}"
+            self.failures += 1
+            delay = min(RETRY_DELAY * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+            self.retry_at = time.monotonic() + delay
+            self.state = "failed"
+        self.seconds = time.perf_counter() - start
+
+
+class Precomputer:
+    """
+    Runs the jobs for the newest dataset version on a thread pool and keeps their state.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        self.lock = threading.Lock()
+        self.version = None
+        self.jobs = {}
+        self.futures = []
+        self.watcher = None
+
+    def schedule(self, version):
+        """
+        Queues every job for a dataset version, unless that version is already scheduled.
+        """
+        with self.lock:
+            if version == self.version:
+                return
+            # Jobs for an older version that have not started yet are dropped
+            for future in self.futures:
+                future.cancel()
+            self.version = version
+            self.jobs = {name: Job(name, func) for name, func in build_jobs().items()}
+            self.futures = [self.pool.submit(job.run) for job in self.jobs.values()]
+
+    def retry(self):
+        """
+        Queues the failed jobs of the current version again once their retry delay has passed.
+        """
+        now = time.monotonic()
+        with self.lock:
+            for job in self.jobs.values():
+                if job.state == "failed" and now >= job.retry_at:
+                    job.state = "queued"
+                    self.futures.append(self.pool.submit(job.run))
+
+    def watch(self, interval=WATCH_INTERVAL):
+        """
+        Starts a daemon thread that schedules the jobs as soon as a new dataset version appears on disk.
+        """
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.schedule(dataset_version())
+                except OSError:
+                    # The files can be missing for a moment while the pipeline rewrites them
+                    pass
+
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=loop, name="precompute-watch", daemon=True)
+            self.watcher.start()
+
+    def status(self, names=None):
+        """
+        Returns {job name: state} for the given jobs (all jobs by default).
+        Raises ValueError for a name that is not one of the jobs from build_jobs().
+        """
+        with self.lock:
+            jobs = self.jobs
+        names = jobs if names is None else names
+        unknown = [name for name in names if name not in jobs]
+        if unknown:
+            raise ValueError(f"Unknown precompute job(s) {', '.join(unknown)}. Choose from: {', '.join(jobs)}")
+        return {name: jobs[name].state for name in names}
+
+    def failures(self, names):
+        """
+        Returns {job name: (short error message, seconds until the next try)} for the failed jobs.
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {
+                name: (self.jobs[name].error, max(0.0, self.jobs[name].retry_at - now))
+                for name in names if self.jobs[name].state == "failed"
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_precomputer():
+    precomputer = Precomputer()
+    precomputer.watch()
+    return precomputer
+
+
+def start():
+    """
+    Makes sure the jobs for the current dataset version are scheduled and returns the worker.
+    """
+    precomputer = get_precomputer()
+    precomputer.schedule(dataset_version())
+    precomputer.retry()
+    return precomputer
+
+
+def ready(*names, label="Preparing results"):
+    """
+    Returns True when the named jobs are done. Otherwise shows their progress (or a short
+    note that one failed and when it is tried again) in place and returns False; call poll()
+    at the end of the page to rerun it later.
+    """
+    precomputer = start()
+    status = precomputer.status(names)
+    if all(state == "done" for state in status.values()):
+        return True
+
+    failures = precomputer.failures(names)
+    if failures:
+        for name, (error, wait_seconds) in failures.items():
+            st.warning(f"{label} failed ({error}). It is tried again in {wait_seconds:.0f} seconds; reload the page then.")
+        return False
+
+    finished = sum(state == "done" for state in status.values())
+    running = [name for name, state in status.items() if state == "running"]
+    text = f"{label}... ({finished}/{len(status)} done{', running ' + ', '.join(running) if running else ''})"
+    st.progress(finished / len(status), text=text)
+    st.session_state["_precompute_pending"] = True
+    return False
+
+
+def wait(*names, label="Preparing results"):
+    """
+    Stops the page here until the named jobs are done: shows their progress and reruns the
+    page shortly (or stops it if a job failed).
+    """
+    if not ready(*names, label=label):
+        poll()
+        st.stop()
+
+
+def poll(interval=POLL_INTERVAL):
+    """
+    Reruns the page after a short wait if ready() reported unfinished jobs during this run.
+    """
+    if st.session_state.pop("_precompute_pending", False):
+        time.sleep(interval)
+        st.rerun()
@@ -0,0 +1,372 @@
+"""
+Opt-in timing instrumentation for the Streamlit app.
+
+Data loads, model fits, figure builds and the chart calls of every page are wrapped in timed
+spans. Each span is stored under the session and the page it ran in (work done by the
+background precompute threads counts as the "background" session); sessions idle for
+SESSION_TTL seconds are dropped with their spans. The cached functions also count their calls
+and misses, which gives the hit rate of each cache.
+
+Recording is off by default. Turn it on with the environment variable COVID_APP_PROFILE=1, or
+from the diagnostics page (open the app with ?diagnostics in the URL) when its controls are
+enabled with COVID_APP_DIAGNOSTICS_CONTROLS=1 or diagnostics_controls = true in the Streamlit
+secrets. Without that the diagnostics page is read-only for visitors. While it is off, a
+timed function costs one flag check, span() returns a shared no-op context and the Streamlit
+chart functions are not wrapped at all.
+
+The spans can be downloaded as JSON from the diagnostics page. For a cProfile dump of one
+page, run it headless from the Streamlit folder:
+    python profiling.py pages/WorldMap.py --pstats worldmap.prof --json worldmap.json
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+import streamlit as st
+
+try:
+    import resource
+except ImportError:
+    # Unix only; peak_memory_mb() falls back to psutil on Windows
+    resource = None
+
+ENABLED = os.environ.get("COVID_APP_PROFILE", "") not in ("", "0")
+
+# Durations kept per (session, page, stage); older ones are dropped
+MAX_SPANS = 2000
+
+# Session name for work done outside a page run (the precompute threads)
+BACKGROUND = "background"
+
+# Sessions (and their spans) are dropped this many seconds after their last page run, and
+# beyond MAX_SESSIONS the least recently seen ones go first
+SESSION_TTL = 30 * 60
+MAX_SESSIONS = 200
+
+# Streamlit functions timed as render stages while recording is on
+CHART_FUNCTIONS = ["plotly_chart", "pyplot", "image", "dataframe"]
+
+_local = threading.local()
+_original_charts = {}
+
+
+class Recorder:
+    """
+    Collects span durations and cache counters from all sessions and threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.cache_calls = Counter()
+        self.cache_misses = Counter()
+        self.sessions = {}
+
+    def add(self, stage, seconds):
+        key = (current_session(), getattr(_local, "page", None) or BACKGROUND, stage)
+        with self.lock:
+            if key not in self.spans:
+                self.spans[key] = deque(maxlen=MAX_SPANS)
+            self.spans[key].append(seconds)
+
+    def count(self, cache, miss=False):
+        with self.lock:
+            (self.cache_misses if miss else self.cache_calls)[cache] += 1
+
+    def visit(self, session, page, session_bytes):
+        now = time.time()
+        with self.lock:
+            self.sessions[session] = {"page": page, "last_seen": now, "session_state_bytes": session_bytes}
+            self._prune(now)
+
+    def _prune(self, now):
+        """
+        Drops sessions that have not run a page for SESSION_TTL seconds or are beyond the
+        MAX_SESSIONS most recent ones, together with their spans. Call with the lock held.
+        """
+        recent = sorted(self.sessions, key=lambda s: self.sessions[s]["last_seen"], reverse=True)
+        for session in recent[MAX_SESSIONS:]:
+            del self.sessions[session]
+        for session in recent[:MAX_SESSIONS]:
+            if now - self.sessions[session]["last_seen"] > SESSION_TTL:
+                del self.sessions[session]
+        for key in [key for key in self.spans if key[0] != BACKGROUND and key[0] not in self.sessions]:
+            del self.spans[key]
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+            self.cache_calls.clear()
+            self.cache_misses.clear()
+            self.sessions.clear()
+
+    def snapshot(self):
+        """
+        Returns a plain copy of everything recorded: spans as lists of seconds, cache counters and sessions.
+        """
+        with self.lock:
+            return {
+                "spans": [
+                    {"session": session, "page": page, "stage": stage, "seconds": list(durations)}
+                    for (session, page, stage), durations in self.spans.items()
+                ],
+                "caches": {
+                    cache: {"calls": self.cache_calls[cache], "misses": self.cache_misses[cache]}
+                    for cache in sorted(set(self.cache_calls) | set(self.cache_misses))
+                },
+                "sessions": {session: dict(info) for session, info in self.sessions.items()},
+            }
+
+
+recorder = Recorder()
+
+
+def current_session():
+    # Imported here: the script run context only exists inside a Streamlit session
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else BACKGROUND
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recorder.add(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(stage):
+    """
+    Context manager that records how long its block takes as one span of the given stage.
+    """
+    return _Span(stage) if ENABLED else _NO_SPAN
+
+
+def timed(stage, cache=None):
+    """
+    Decorator that records every call as a span. The stage name can refer to the call's
+    arguments, e.g. "load:{0}". With cache, the call also counts towards that cache's hit
+    rate; put counts_miss on the cached function behind it.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            if cache is not None:
+                recorder.count(cache)
+            with _Span(stage.format(*args, **kwargs) if "{" in stage else stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def counts_miss(cache):
+    """
+    Decorator for the function behind a st.cache_* decorator: it only runs on a cache miss,
+    so every call is counted as one.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if ENABLED:
+                recorder.count(cache, miss=True)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(cache, miss=False):
+    """
+    Counts one call (or miss) of a cache that is not a decorated function, e.g. a file cache.
+    """
+    if ENABLED:
+        recorder.count(cache, miss)
+
+
+def object_bytes(value):
+    """
+    Rough size of a session state value: pandas and NumPy objects by their data, the rest shallowly.
+    """
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def page(name):
+    """
+    Marks the start of a page run: later spans in this run are recorded under this page.
+    Also notes the session's state size for the diagnostics page.
+    """
+    _local.page = name
+    if not ENABLED:
+        return
+    session_bytes = sum(object_bytes(value) for value in st.session_state.to_dict().values())
+    recorder.visit(current_session(), name, session_bytes)
+
+
+def _instrument_streamlit():
+    for name in CHART_FUNCTIONS:
+        if name not in _original_charts:
+            _original_charts[name] = getattr(st, name)
+            setattr(st, name, timed(f"render:{name}")(_original_charts[name]))
+
+
+def _restore_streamlit():
+    for name, original in _original_charts.items():
+        setattr(st, name, original)
+    _original_charts.clear()
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+    _instrument_streamlit()
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    _restore_streamlit()
+
+
+def is_enabled():
+    return ENABLED
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident memory of this process in MB, or None where it cannot be measured
+    (Windows without psutil).
+    """
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss) / 2 ** 20
+
+
+if ENABLED:
+    _instrument_streamlit()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def summarize(spans, by=("stage",)):
+    """
+    Aggregates span records (from Recorder.snapshot) into one row per group: count, total,
+    p50, p95 and max in milliseconds, slowest total first.
+    """
+    groups = {}
+    for record in spans:
+        groups.setdefault(tuple(record[key] for key in by), []).extend(record["seconds"])
+    rows = []
+    for key, seconds in groups.items():
+        rows.append({
+            **dict(zip(by, key)),
+            "count": len(seconds),
+            "total_ms": 1000 * sum(seconds),
+            "p50_ms": 1000 * percentile(seconds, 0.5),
+            "p95_ms": 1000 * percentile(seconds, 0.95),
+            "max_ms": 1000 * max(seconds),
+        })
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def cache_hit_rates(caches):
+    """
+    Returns one row per cache with its calls, misses and hit rate.
+    """
+    return [
+        {"cache": cache, "calls": c["calls"], "misses": c["misses"],
+         "hit_rate": 1 - c["misses"] / c["calls"] if c["calls"] else float("nan")}
+        for cache, c in caches.items()
+    ]
+
+
+def export_json():
+    """
+    Returns everything recorded plus the per-stage summary as a JSON string.
+    """
+    data = recorder.snapshot()
+    data["summary"] = {
+        "by_stage": summarize(data["spans"]),
+        "by_page": summarize(data["spans"], by=("page", "stage")),
+        "caches": cache_hit_rates(data["caches"]),
+    }
+    return json.dumps(data, indent=2, default=str)
+
+
+def profile_page(path, pstats_path=None, timeout=600):
+    """
+    Runs one page headless with recording on, under cProfile. Writes the cProfile dump to
+    pstats_path if given and returns the recorded spans as JSON.
+    """
+    import cProfile
+    from streamlit.testing.v1 import AppTest
+
+    enable()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        at = AppTest.from_file(os.path.abspath(path), default_timeout=timeout).run()
+    finally:
+        profiler.disable()
+    if at.exception:
+        raise RuntimeError(f"{path} failed: {at.exception[0].value}")
+    if pstats_path is not None:
+        profiler.dump_stats(pstats_path)
+    return export_json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile one page of the app headless.")
+    parser.add_argument("page", help="page script, e.g. pages/WorldMap.py")
+    parser.add_argument("--pstats", help="write a cProfile dump to this file (open with pstats or snakeviz)")
+    parser.add_argument("--json", help="write the recorded spans to this file")
+    args = parser.parse_args()
+
+    # Run as __main__, this file is a different module from the "profiling" the pages import
+    import profiling
+    exported = profiling.profile_page(args.page, args.pstats)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(exported)
+    for row in json.loads(exported)["summary"]["by_stage"]:
+        print(f"{row['stage']:<40} {row['count']:>5} x  p50 {row['p50_ms']:9.2f} ms  p95 {row['p95_ms']:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
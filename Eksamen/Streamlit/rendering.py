@@ -0,0 +1,165 @@
+"""
+Scatter plots, histograms and box plots that stay fast for any number of rows.
+
+Up to ROW_THRESHOLD rows everything is drawn point by point, exactly as before. Above it:
+
+  - scatter plots become a 2D density grid (counts per cell, binned with NumPy) with a
+    stratified sample of at most SAMPLE_SIZE points on top, so sparse regions and outliers
+    stay visible; plotly figures draw the sample as a WebGL trace
+  - histograms are binned with NumPy and their KDE line is estimated from a sample
+  - box plots compute their statistics from all values but draw a sample of the outliers
+
+The figure then holds a fixed-size grid plus a capped sample whatever the row count, so its
+payload and drawing time are bounded.
+"""
+import numpy as np
+import pandas as pd
+
+# Above this many rows a plot switches from single points to binning and sampling
+ROW_THRESHOLD = 5000
+
+# Points drawn on top of a density grid, and outliers drawn on a box plot
+SAMPLE_SIZE = 2000
+
+# Cells per axis of a density grid
+GRID_SIZE = 80
+
+
+def is_large(n_rows, threshold=ROW_THRESHOLD):
+    return n_rows > threshold
+
+
+def stratified_sample(df, n=SAMPLE_SIZE, by=None, seed=0):
+    """
+    Returns about n rows of df, drawn at random. With by, every group (e.g. every continent
+    or country) keeps its share of the rows, and at least one row.
+    """
+    if len(df) <= n:
+        return df
+    rng = np.random.default_rng(seed)
+    if by is None:
+        return df.iloc[np.sort(rng.choice(len(df), n, replace=False))]
+    groups = pd.factorize(df[by], use_na_sentinel=False)[0]
+    sizes = np.bincount(groups)
+    quota = np.maximum(1, np.floor(n * sizes / len(df))).astype(int)
+    # A random rank within each group: keep the rows ranked below their group's quota
+    order = np.lexsort((rng.random(len(df)), groups))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.empty(len(df), dtype=np.int64)
+    rank[order] = np.arange(len(df)) - starts[groups[order]]
+    return df.iloc[np.flatnonzero(rank < quota[groups])]
+
+
+def finite_pairs(x, y):
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    keep = np.isfinite(x) & np.isfinite(y)
+    return x[keep], y[keep]
+
+
+def density_grid(x, y, bins=GRID_SIZE):
+    """
+    Counts the (x, y) pairs per cell of a bins x bins grid over their range. Returns the
+    counts (y cells by x cells) and the x and y cell edges.
+    """
+    x, y = finite_pairs(x, y)
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return counts.T, x_edges, y_edges
+
+
+def scatter(ax, x, y, threshold=ROW_THRESHOLD, **kwargs):
+    """
+    Draws x against y on a matplotlib axis: every point up to threshold rows, otherwise a
+    density grid with a sample of the points on top. kwargs go to ax.scatter.
+    """
+    x, y = finite_pairs(x, y)
+    if not is_large(len(x), threshold):
+        return ax.scatter(x, y, **kwargs)
+
+    from matplotlib.colors import LogNorm
+
+    counts, x_edges, y_edges = density_grid(x, y)
+    mesh = ax.pcolormesh(x_edges, y_edges, np.where(counts > 0, counts, np.nan), cmap="Greens",
+                         norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)))
+    ax.figure.colorbar(mesh, ax=ax, label="Rows per cell")
+    sample = np.random.default_rng(0).choice(len(x), min(SAMPLE_SIZE, len(x)), replace=False)
+    kwargs = {**kwargs, "s": kwargs.get("s", 4), "alpha": kwargs.get("alpha", 0.4)}
+    return ax.scatter(x[sample], y[sample], **kwargs)
+
+
+def histogram(ax, values, color=None, kde=True, threshold=ROW_THRESHOLD):
+    """
+    Draws a histogram with a KDE line like sns.histplot. Above threshold values the bins are
+    counted with NumPy and the KDE is estimated from a sample and scaled to the counts.
+    """
+    values = pd.Series(values).dropna()
+    if not is_large(len(values), threshold):
+        import seaborn as sns
+
+        return sns.histplot(values, kde=kde, ax=ax, color=color)
+
+    data = values.to_numpy(dtype=np.float64)
+    counts, edges = np.histogram(data, bins="auto")
+    if len(counts) > 200:
+        counts, edges = np.histogram(data, bins=200)
+    ax.stairs(counts, edges, fill=True, color=color, alpha=0.4)
+    ax.stairs(counts, edges, color=color)
+    if kde and np.ptp(data) > 0:
+        from scipy.stats import gaussian_kde
+
+        sample = data[np.random.default_rng(0).choice(len(data), min(SAMPLE_SIZE, len(data)), replace=False)]
+        grid = np.linspace(edges[0], edges[-1], 200)
+        ax.plot(grid, gaussian_kde(sample)(grid) * len(data) * np.diff(edges).mean(), color=color)
+    ax.set_ylabel("Count")
+    if values.name is not None:
+        ax.set_xlabel(values.name)
+    return ax
+
+
+def boxplot(ax, values, label=None, threshold=ROW_THRESHOLD, **kwargs):
+    """
+    Draws a box plot of values. Above threshold values, only a sample of the outliers is drawn.
+    kwargs go to ax.bxp (e.g. patch_artist, boxprops).
+    """
+    from matplotlib.cbook import boxplot_stats
+
+    data = pd.Series(values).dropna().to_numpy(dtype=np.float64)
+    stats = boxplot_stats(data, labels=[label])[0]
+    fliers = stats["fliers"]
+    if is_large(len(data), threshold) and len(fliers) > SAMPLE_SIZE:
+        stats["fliers"] = np.random.default_rng(0).choice(fliers, SAMPLE_SIZE, replace=False)
+    return ax.bxp([stats], **kwargs)
+
+
+def scatter_figure(df, x, y, color=None, hover_name=None, labels=None, title=None, strata=None,
+                   threshold=ROW_THRESHOLD):
+    """
+    Returns a plotly scatter of df: px.scatter up to threshold rows, otherwise a density
+    heatmap binned here and a WebGL scatter of a stratified sample (by strata, default color).
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    if not is_large(len(df), threshold):
+        return px.scatter(df, x=x, y=y, color=color, hover_name=hover_name, labels=labels, title=title)
+
+    labels = labels or {}
+    counts, x_edges, y_edges = density_grid(df[x], df[y])
+    fig = go.Figure(go.Heatmap(
+        z=np.where(counts > 0, np.log10(np.maximum(counts, 1)), np.nan),
+        x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+        customdata=counts, hovertemplate="%{customdata:,.0f} rows<extra></extra>",
+        colorscale="Greens", colorbar=dict(title="Rows (log10)"),
+    ))
+    sample = stratified_sample(df, by=strata or color)
+    groups = sample.groupby(color, observed=True, sort=False) if color else [(None, sample)]
+    for name, group in groups:
+        fig.add_trace(go.Scattergl(
+            x=group[x], y=group[y], mode="markers", name=str(name) if name is not None else "Sample",
+            text=group[hover_name] if hover_name else None, marker=dict(size=4, opacity=0.6),
+        ))
+    fig.update_layout(
+        title=f"{title} ({len(sample):,} of {len(df):,} rows shown as points)" if title else None,
+        xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y),
+    )
+    return fig
@@ -0,0 +1,191 @@
+"""
+Resampling evaluation for the Data Modeling regressions.
+
+A single train/test split on a few dozen countries gives a noisy R². This module evaluates a
+model with repeated k-fold cross-validation and with bootstrap confidence intervals for the
+coefficients and the out-of-bag metrics.
+
+Every resample is a weighted least squares fit: a bootstrap sample is a vector of row counts,
+a CV fold is a 0/1 mask of training rows. The weights for a whole batch are generated at once
+and all fits of the batch are solved together with numpy. Batches run on the process pool shared
+with importance.py (workers.py); the data is put in shared memory once, so the workers read it
+without copying frames.
+"""
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data import load_dataset, dataset_version
+import profiling
+import workers
+from models import MODEL_SPECS
+
+DEFAULT_BOOTSTRAPS = 2000
+DEFAULT_FOLDS = 5
+DEFAULT_REPEATS = 20
+
+# Bootstrap resamples solved together in one batch
+BATCH_SIZE = 500
+
+CONFIDENCE = 0.95
+
+
+def bootstrap_weights(rng, n_rows, n_resamples):
+    """
+    Draws n_resamples bootstrap samples at once and returns how often each row was drawn, shape (n_resamples, n_rows).
+    """
+    draws = rng.integers(0, n_rows, size=(n_resamples, n_rows))
+    offsets = (np.arange(n_resamples) * n_rows)[:, None]
+    return np.bincount((draws + offsets).ravel(), minlength=n_resamples * n_rows).reshape(n_resamples, n_rows)
+
+
+def kfold_weights(rng, n_rows, n_folds, n_repeats):
+    """
+    Returns 0/1 training masks for n_repeats shuffled k-fold splits, shape (n_repeats * n_folds, n_rows).
+    """
+    folds = np.tile(np.arange(n_rows) % n_folds, (n_repeats, 1))
+    folds = rng.permuted(folds, axis=1)
+    masks = folds[:, None, :] != np.arange(n_folds)[None, :, None]
+    return masks.reshape(n_repeats * n_folds, n_rows).astype(float)
+
+
+def weighted_ols(Z, y, W):
+    """
+    Solves one least squares fit per row of W (row weights), all at once. Z must contain the
+    intercept column. Returns the coefficients, shape (len(W), Z.shape[1]).
+    """
+    gram = np.einsum("bn,ni,nj->bij", W, Z, Z, optimize=True)
+    moments = np.einsum("bn,ni,n->bi", W, Z, y, optimize=True)
+    return np.linalg.solve(gram, moments[..., None])[..., 0]
+
+
+def held_out_metrics(Z, y, coefs, test):
+    """
+    R², MAE and RMSE of each fit on its held-out rows (test is a boolean mask per fit).
+    """
+    residuals = y - coefs @ Z.T
+    counts = test.sum(axis=1)
+    mean_y = (test * y).sum(axis=1) / counts
+    sse = (test * residuals ** 2).sum(axis=1)
+    sst = (test * (y - mean_y[:, None]) ** 2).sum(axis=1)
+    return {
+        "r2": 1 - sse / sst,
+        "mae": (test * np.abs(residuals)).sum(axis=1) / counts,
+        "rmse": np.sqrt(sse / counts),
+    }
+
+
+def _resample_batch(shm_name, shape, kind, seed, size, n_folds=DEFAULT_FOLDS):
+    """
+    Runs one batch of bootstrap or CV fits on the data in shared memory. The columns are the
+    standardized features with an intercept column first, and the target last.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        Z, y = data[:, :-1], data[:, -1]
+        rng = np.random.default_rng(seed)
+        if kind == "bootstrap":
+            W = bootstrap_weights(rng, len(y), size)
+        else:
+            W = kfold_weights(rng, len(y), n_folds, size)
+        coefs = weighted_ols(Z, y, W)
+        metrics = held_out_metrics(Z, y, coefs, W == 0)
+    finally:
+        shm.close()
+    return coefs, metrics
+
+
+def _run_batches(data, batches, n_jobs):
+    """
+    Copies data into shared memory once and runs the batches on the shared process pool.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+        args = [(shm.name, data.shape) + batch for batch in batches]
+        return workers.run_all(_resample_batch, args, n_jobs)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _combine(results):
+    coefs = np.concatenate([coefs for coefs, _ in results])
+    metrics = {name: np.concatenate([m[name] for _, m in results]) for name in results[0][1]}
+    return coefs, metrics
+
+
+def evaluate(df, features, target, n_bootstraps=DEFAULT_BOOTSTRAPS, n_folds=DEFAULT_FOLDS,
+             n_repeats=DEFAULT_REPEATS, seed=0, n_jobs=None):
+    """
+    Evaluates a linear regression with repeated k-fold CV and the bootstrap. Returns a dict with:
+      cv         one row per fold with its R², MAE and RMSE
+      intervals  point estimate and confidence interval for every coefficient and the
+                 out-of-bag metrics, from the bootstrap
+    """
+    X = df[features].to_numpy(dtype=float)
+    y = df[target].to_numpy(dtype=float)
+
+    # Standardized features keep the normal equations well conditioned (population is ~1e9)
+    mean, scale = X.mean(axis=0), X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.column_stack([np.ones(len(y)), (X - mean) / scale])
+    data = np.column_stack([Z, y])
+
+    # Independent random streams per batch, so results don't depend on the number of workers
+    n_batches = -(-n_bootstraps // BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(n_batches + 1)
+    sizes = [min(BATCH_SIZE, n_bootstraps - i * BATCH_SIZE) for i in range(n_batches)]
+    batches = [("bootstrap", s, size) for s, size in zip(seeds, sizes)]
+    batches.append(("cv", seeds[-1], n_repeats, n_folds))
+
+    n_jobs = n_jobs or min(len(batches), os.cpu_count() or 1)
+    results = _run_batches(data, batches, n_jobs)
+    boot_coefs, boot_metrics = _combine(results[:-1])
+    _, cv_metrics = results[-1]
+
+    # Back to the original units
+    def unscale(coefs):
+        slopes = coefs[:, 1:] / scale
+        return np.column_stack([coefs[:, 0] - slopes @ mean, slopes])
+
+    point = unscale(weighted_ols(Z, y, np.ones((1, len(y)))))[0]
+    boot = unscale(boot_coefs)
+
+    alpha = (1 - CONFIDENCE) / 2
+    names = ["intercept"] + list(features)
+    rows = []
+    for i, name in enumerate(names):
+        low, high = np.quantile(boot[:, i], [alpha, 1 - alpha])
+        rows.append({"term": name, "estimate": point[i], "std_error": boot[:, i].std(ddof=1), "ci_low": low, "ci_high": high})
+    for name, values in boot_metrics.items():
+        values = values[np.isfinite(values)]
+        low, high = np.quantile(values, [alpha, 1 - alpha])
+        rows.append({"term": f"out-of-bag {name}", "estimate": np.median(values), "std_error": values.std(ddof=1), "ci_low": low, "ci_high": high})
+
+    cv = pd.DataFrame(cv_metrics)
+    cv.insert(0, "repeat", np.repeat(np.arange(n_repeats), n_folds))
+    cv.insert(1, "fold", np.tile(np.arange(n_folds), n_repeats))
+    return {"cv": cv, "intervals": pd.DataFrame(rows), "n_rows": len(y)}
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+@profiling.counts_miss("resampling")
+def _evaluate_model(name, version, n_bootstraps, n_folds, n_repeats):
+    spec = MODEL_SPECS[name]
+    df = load_dataset(spec["dataset"], spec["features"] + [spec["target"]])
+    return evaluate(df, spec["features"], spec["target"], n_bootstraps, n_folds, n_repeats)
+
+
+@profiling.timed("fit:resampling/{0}", cache="resampling")
+def evaluate_model(name, n_bootstraps=DEFAULT_BOOTSTRAPS, n_folds=DEFAULT_FOLDS, n_repeats=DEFAULT_REPEATS):
+    """
+    Returns the CV and bootstrap evaluation of a registered hypothesis model, computed once per dataset version.
+    """
+    if name not in MODEL_SPECS:
+        raise ValueError(f"Unknown model '{name}'. Choose one of: {', '.join(MODEL_SPECS)}")
+    return _evaluate_model(name, dataset_version(), n_bootstraps, n_folds, n_repeats)
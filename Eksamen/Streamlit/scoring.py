@@ -0,0 +1,412 @@
+"""
+Batch scoring with the fitted hypothesis models.
+
+A Scorer holds the cached regression models and the decision tree from the Data Modeling
+page, reduced to what a prediction needs: the coefficients and intercept of each regression
+and the node arrays of the tree. A batch is a table with one column per feature (a DataFrame,
+or a CSV, Parquet or JSON file); it is validated once, every feature column is converted to
+a float64 array once, and each model then predicts the whole batch with a few NumPy
+operations. Rows with a missing feature get no prediction.
+
+A scenario changes feature columns before predicting, e.g. aged_65_older=+5% (relative),
+median_age=+2 (absolute), life_expectancy=*1.1 or population=1000000 (a fixed value), so a
+what-if question like "all countries with 5% more people aged 65+" is one batch.
+
+Run from the Streamlit folder with:
+    python scoring.py predict --scenario aged_65_older=+5%              (all countries)
+    python scoring.py predict batch.parquet --output predictions.csv
+    python scoring.py serve --port 8502
+The server answers GET /models and POST /predict with a CSV, Parquet or JSON body; the models
+and scenario go in the query string, e.g. /predict?models=age_factors&scenario=aged_65_older=%2B5%25
+(a + has to be sent as %2B; several changes are separated by commas or repeat scenario=).
+"""
+import argparse
+import io
+import json
+import re
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import models
+import profiling
+from data import dataset_version, require_master
+
+# Columns passed through from the batch to the predictions, when present
+ID_COLUMNS = ["location", "iso_code"]
+
+# Name of the decision tree among the scoring models
+TREE_NAME = "tree"
+
+DEFAULT_PORT = 8502
+
+# Request body content types -> batch format
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/vnd.apache.parquet": "parquet",
+    "application/octet-stream": "parquet",
+}
+
+
+@dataclass
+class Change:
+    """
+    One scenario change of a feature column: op is "relative", "add", "multiply" or "set".
+    """
+    column: str
+    op: str
+    value: float
+
+    def apply(self, values):
+        if self.op == "relative":
+            return values * (1 + self.value)
+        if self.op == "add":
+            return values + self.value
+        if self.op == "multiply":
+            return values * self.value
+        # A fixed value, but missing values stay missing
+        return np.where(np.isnan(values), np.nan, self.value)
+
+
+CHANGE_PATTERN = re.compile(r"^\s*(\w+)\s*=\s*([+\-*]?)\s*([0-9.eE+\-]+)\s*(%?)\s*$")
+
+
+def parse_change(text):
+    """
+    Parses a scenario change like "aged_65_older=+5%", "median_age=-2", "life_expectancy=*1.1" or "population=1e6".
+    """
+    match = CHANGE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Cannot read scenario change '{text}'. Use e.g. aged_65_older=+5%, median_age=+2 or population=*1.1")
+    column, sign, number, percent = match.groups()
+    value = float(number)
+    if percent:
+        if sign == "*":
+            raise ValueError(f"Use a factor without % to multiply: '{text}'")
+        return Change(column, "relative", -value / 100 if sign == "-" else value / 100)
+    if sign == "*":
+        return Change(column, "multiply", value)
+    if sign:
+        return Change(column, "add", -value if sign == "-" else value)
+    return Change(column, "set", value)
+
+
+def parse_scenario(texts):
+    """
+    Parses a list of changes (or one string) into a scenario. Every string can hold one change
+    or several comma-separated ones.
+    """
+    texts = [texts] if isinstance(texts, str) else texts
+    return [parse_change(part) for text in texts for part in text.split(",") if part.strip()]
+
+
+# A space after = or after the sign of a change, which is where an unencoded + ends up in a query string
+QUERY_SPACE_PATTERN = re.compile(r"=[+\-*]?\s")
+
+
+def parse_query_scenario(values):
+    """
+    Parses the scenario values of a query string like parse_scenario. parse_qs has already
+    decoded every unencoded + to a space, so "aged_65_older=+2" arrives as "aged_65_older= 2"
+    and would be read as a fixed value; such changes are refused instead.
+    """
+    for value in values:
+        if QUERY_SPACE_PATTERN.search(value):
+            raise ValueError(f"Cannot read scenario change '{value}': a + in the query string must be sent as %2B, "
+                             "e.g. scenario=aged_65_older=%2B5%25")
+    return parse_scenario(values)
+
+
+class Scorer:
+    """
+    Vectorized predictions of the regression models in models.MODEL_SPECS and the decision tree.
+    """
+
+    def __init__(self, regressions, tree=None):
+        # name -> (features, coefficients, intercept)
+        self.regressions = {
+            name: (list(result["features"]), np.asarray(result["model"].coef_, dtype=np.float64),
+                   float(result["model"].intercept_))
+            for name, result in regressions.items()
+        }
+        self.tree = None
+        if tree is not None:
+            nodes = tree["model"].tree_
+            # The class predicted in each node, so a prediction is a lookup of the leaf's class
+            node_classes = np.argmax(nodes.value[:, 0, :], axis=1)
+            self.tree = (list(tree["features"]), nodes, node_classes, list(tree["model"].classes_))
+
+    @property
+    def names(self):
+        return list(self.regressions) + ([TREE_NAME] if self.tree is not None else [])
+
+    def features(self, names=None):
+        """
+        Returns the feature columns the given models need, in a stable order.
+        """
+        features = []
+        for name in self.check_names(names):
+            for feature in self.tree[0] if name == TREE_NAME else self.regressions[name][0]:
+                if feature not in features:
+                    features.append(feature)
+        return features
+
+    def check_names(self, names=None):
+        names = self.names if names is None else list(names)
+        unknown = [name for name in names if name not in self.names]
+        if unknown:
+            raise ValueError(f"Unknown model(s) {', '.join(unknown)}. Choose from: {', '.join(self.names)}")
+        return names
+
+    def validate(self, batch, names=None, scenario=()):
+        """
+        Checks a batch once and returns its feature columns as float64 arrays, with the
+        scenario applied. Raises ValueError for missing or non-numeric columns.
+        """
+        features = self.features(names)
+        missing = [column for column in features if column not in batch.columns]
+        if missing:
+            raise ValueError(f"The batch is missing the column(s): {', '.join(missing)}")
+        columns = {}
+        for column in features:
+            try:
+                columns[column] = batch[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            except (TypeError, ValueError):
+                raise ValueError(f"Column '{column}' is not numeric") from None
+        for change in scenario:
+            if change.column not in features:
+                raise ValueError(f"The scenario changes '{change.column}', which none of the models uses")
+            columns[change.column] = change.apply(columns[change.column])
+        return columns
+
+    def predict_regression(self, name, columns):
+        features, coefficients, intercept = self.regressions[name]
+        prediction = np.full(len(columns[features[0]]), intercept)
+        for feature, coefficient in zip(features, coefficients):
+            prediction += coefficient * columns[feature]
+        return prediction
+
+    def predict_tree(self, columns):
+        features, nodes, node_classes, classes = self.tree
+        n_rows = len(columns[features[0]])
+        X = np.empty((n_rows, len(features)), dtype=np.float32)
+        for i, feature in enumerate(features):
+            X[:, i] = columns[feature]
+        complete = ~np.isnan(X).any(axis=1)
+        codes = np.full(n_rows, -1)
+        codes[complete] = node_classes[nodes.apply(np.ascontiguousarray(X[complete]))]
+        return pd.Categorical.from_codes(codes, categories=classes)
+
+    def predict(self, columns, names=None):
+        """
+        Returns {model name: predictions} for validated columns (see validate).
+        """
+        return {
+            name: self.predict_tree(columns) if name == TREE_NAME else self.predict_regression(name, columns)
+            for name in self.check_names(names)
+        }
+
+    @profiling.timed("score:batch")
+    def score(self, batch, names=None, scenario=()):
+        """
+        Scores a DataFrame with the given models (all by default). Returns the ID columns of
+        the batch and one column per model. With a scenario, there is also a <model>_scenario
+        column and, for the regressions, a <model>_change column.
+        """
+        baseline = self.predict(self.validate(batch, names), names)
+        result = {column: batch[column].to_numpy() for column in ID_COLUMNS if column in batch.columns}
+        if not scenario:
+            return pd.DataFrame({**result, **baseline})
+
+        changed = self.predict(self.validate(batch, names, scenario), names)
+        for name in baseline:
+            result[name] = baseline[name]
+            result[f"{name}_scenario"] = changed[name]
+            if name != TREE_NAME:
+                result[f"{name}_change"] = changed[name] - baseline[name]
+        return pd.DataFrame(result)
+
+
+def load_scorer(version=None):
+    """
+    Builds a Scorer from the models saved under .cache/models (fitting any that are missing),
+    without going through Streamlit's cache. Used by the command line and the server.
+    """
+    version = dataset_version() if version is None else version
+    regressions = {
+        name: models.load_or_fit(spec, models.fit_regression, version)
+        for name, spec in models.MODEL_SPECS.items()
+    }
+    return Scorer(regressions, models.load_or_fit(models.TREE_SPEC, models.fit_tree, version))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+@profiling.counts_miss("scorer")
+def _get_scorer(version):
+    return Scorer({name: models.get_model(name) for name in models.MODEL_SPECS}, models.get_tree())
+
+
+@profiling.timed("load:scorer", cache="scorer")
+def get_scorer():
+    """
+    Returns the Scorer for the current dataset version, built from the cached models.
+    """
+    return _get_scorer(dataset_version())
+
+
+def country_batch(features=None):
+    """
+    Returns one row per country of the master table with its ID columns and measured feature
+    values (missing where a value was not measured).
+    """
+    master = require_master()
+    frame = master.frame.reset_index()
+    features = [column for column in master.columns if column not in ID_COLUMNS] if features is None else features
+    return frame[ID_COLUMNS + [column for column in features if column not in ID_COLUMNS]]
+
+
+def batch_format(path_or_type):
+    """
+    Returns "csv", "parquet" or "json" for a file name or a request content type.
+    """
+    text = str(path_or_type).split(";")[0].strip().lower()
+    if text in CONTENT_TYPES:
+        return CONTENT_TYPES[text]
+    suffix = Path(text).suffix.lstrip(".")
+    if suffix in ("csv", "parquet", "json"):
+        return suffix
+    raise ValueError(f"Unknown batch format '{path_or_type}'. Use CSV, Parquet or JSON.")
+
+
+def read_batch(source, fmt):
+    """
+    Reads a batch from a path or bytes. JSON is either columnar ({"column": [values]}) or a list of row objects.
+    """
+    import pyarrow.csv
+    import pyarrow.parquet as pq
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    if fmt == "csv":
+        return pyarrow.csv.read_csv(source).to_pandas()
+    if fmt == "parquet":
+        return pq.read_table(source).to_pandas()
+    if fmt == "json":
+        content = json.load(source) if hasattr(source, "read") else json.loads(Path(source).read_text())
+        return pd.DataFrame(content)
+    raise ValueError(f"Unknown batch format '{fmt}'. Use csv, parquet or json.")
+
+
+def to_json(predictions):
+    """
+    Returns predictions as columnar JSON, with null for missing values.
+    """
+    columns = {
+        column: values.astype(object).where(values.notna(), None).tolist()
+        for column, values in predictions.items()
+    }
+    return json.dumps(columns)
+
+
+def write_predictions(predictions, path):
+    fmt = batch_format(path)
+    if fmt == "csv":
+        predictions.to_csv(path, index=False)
+    elif fmt == "parquet":
+        predictions.to_parquet(path, index=False)
+    else:
+        Path(path).write_text(to_json(predictions))
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """
+    GET /models lists the models and their features; POST /predict scores the request body.
+    """
+    scorer = None
+
+    def send(self, status, body, content_type="application/json"):
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/models":
+            return self.send(404, json.dumps({"error": "Not found. Use GET /models or POST /predict."}))
+        listing = {name: self.scorer.features([name]) for name in self.scorer.names}
+        self.send(200, json.dumps(listing))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            return self.send(404, json.dumps({"error": "Not found. Use GET /models or POST /predict."}))
+        query = parse_qs(url.query)
+        try:
+            names = query["models"][0].split(",") if "models" in query else None
+            scenario = parse_query_scenario(query.get("scenario", []))
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            batch = read_batch(body, batch_format(self.headers.get("Content-Type", "text/csv")))
+            predictions = self.scorer.score(batch, names, scenario)
+        except Exception as e:
+            return self.send(400, json.dumps({"error": str(e)}))
+        if "csv" in self.headers.get("Accept", ""):
+            return self.send(200, predictions.to_csv(index=False), "text/csv")
+        self.send(200, to_json(predictions))
+
+
+def serve(scorer, host="127.0.0.1", port=DEFAULT_PORT):
+    handler = type("Handler", (ScoringHandler,), {"scorer": scorer})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"..Scoring server on http://{host}:{port} (GET /models, POST /predict)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score batches with the fitted hypothesis models.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    predict = commands.add_parser("predict", help="score a CSV/Parquet/JSON file (all countries by default)")
+    predict.add_argument("input", nargs="?", help="batch file with one column per feature")
+    predict.add_argument("--output", help="write the predictions to this CSV/Parquet/JSON file instead of printing them")
+    predict.add_argument("--models", nargs="+", help="models to use (all by default)")
+    predict.add_argument("--scenario", nargs="+", default=[], help="feature changes, e.g. aged_65_older=+5%% median_age=+2")
+
+    serve_parser = commands.add_parser("serve", help="answer scoring requests over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    commands.add_parser("models", help="list the models and the features they need")
+    args = parser.parse_args()
+
+    scorer = load_scorer()
+    if args.command == "serve":
+        serve(scorer, args.host, args.port)
+    elif args.command == "models":
+        for name in scorer.names:
+            print(f"{name:<32} {', '.join(scorer.features([name]))}")
+    else:
+        batch = read_batch(args.input, batch_format(args.input)) if args.input else country_batch(scorer.features(args.models))
+        predictions = scorer.score(batch, args.models, parse_scenario(args.scenario))
+        if args.output:
+            write_predictions(predictions, args.output)
+            print(f"..Wrote {len(predictions)} predictions to {args.output}")
+        else:
+            with pd.option_context("display.width", 200, "display.max_columns", None):
+                print(predictions.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Columnar (Parquet) snapshots of the datasets.
+
+The cleaning pipeline writes one snapshot per dataset next to the CSV files. Snapshots keep
+the column types, so nothing has to be parsed or converted on load, and single columns can
+be read without touching the rest of the file.
+"""
+import json
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DIR = BASE_DIR / "snapshots"
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# Typed schemas for the cleaned datasets.
+# Counts above 2**24 (totals and population) stay float64 so they remain exact.
+SCHEMAS = {
+    "covid": pa.schema([
+        ("continent", CATEGORY),
+        ("location", CATEGORY),
+        ("total_cases", pa.float64()),
+        ("total_deaths", pa.float64()),
+        ("total_cases_per_million", pa.float32()),
+        ("total_deaths_per_million", pa.float32()),
+        ("life_expectancy", pa.float32()),
+        ("population", pa.float64()),
+        ("human_development_index", pa.float32()),
+    ]),
+    "age": pa.schema([
+        ("continent", CATEGORY),
+        ("location", CATEGORY),
+        ("total_deaths_per_million", pa.float32()),
+        ("median_age", pa.float32()),
+        ("aged_65_older", pa.float32()),
+        ("aged_70_older", pa.float32()),
+        ("life_expectancy", pa.float32()),
+    ]),
+    "health": pa.schema([
+        ("continent", CATEGORY),
+        ("location", CATEGORY),
+        ("total_deaths_per_million", pa.float32()),
+        ("cardiovasc_death_rate", pa.float32()),
+        ("diabetes_prevalence", pa.float32()),
+        ("female_smokers", pa.float32()),
+        ("male_smokers", pa.float32()),
+        ("life_expectancy", pa.float32()),
+    ]),
+    # One row per country with every column of the three datasets, before imputation (see master.py)
+    "master": pa.schema([
+        ("location", pa.string()),
+        ("iso_code", pa.string()),
+        ("continent", CATEGORY),
+        ("total_cases", pa.float64()),
+        ("total_deaths", pa.float64()),
+        ("total_cases_per_million", pa.float32()),
+        ("total_deaths_per_million", pa.float32()),
+        ("life_expectancy", pa.float32()),
+        ("population", pa.float64()),
+        ("human_development_index", pa.float32()),
+        ("median_age", pa.float32()),
+        ("aged_65_older", pa.float32()),
+        ("aged_70_older", pa.float32()),
+        ("cardiovasc_death_rate", pa.float32()),
+        ("diabetes_prevalence", pa.float32()),
+        ("female_smokers", pa.float32()),
+        ("male_smokers", pa.float32()),
+        ("in_covid", pa.bool_()),
+        ("in_age", pa.bool_()),
+        ("in_health", pa.bool_()),
+    ]),
+}
+
+# Prefix of the footer metadata keys written by write_snapshot
+METADATA_PREFIX = "covid_app."
+
+# Text columns of the raw OWID file; everything else is numeric
+RAW_TEXT_COLUMNS = ["iso_code", "continent", "location", "tests_units"]
+
+
+def snapshot_path(name, snapshot_dir=SNAPSHOT_DIR):
+    return Path(snapshot_dir) / f"{name}.parquet"
+
+
+def raw_schema(df):
+    """
+    Builds the schema for the raw OWID file: text columns as categories, the date as a date
+    and all other columns as float64.
+    """
+    fields = []
+    for col in df.columns:
+        if col in RAW_TEXT_COLUMNS:
+            fields.append((col, CATEGORY))
+        elif col.endswith("_date") or col == "date":
+            fields.append((col, pa.date32()))
+        else:
+            fields.append((col, pa.float64()))
+    return pa.schema(fields)
+
+
+def schema_for(name, df):
+    if name in SCHEMAS:
+        return SCHEMAS[name]
+    return raw_schema(df)
+
+
+def write_snapshot(df, name, snapshot_dir=SNAPSHOT_DIR, metadata=None):
+    """
+    Writes a DataFrame as a typed Parquet snapshot and returns its path.
+    metadata is an optional dict of JSON-serializable values stored in the file footer.
+    """
+    schema = schema_for(name, df)
+    df = df[schema.names].copy()
+    for field in schema:
+        if pa.types.is_date(field.type):
+            df[field.name] = pd.to_datetime(df[field.name]).dt.date
+        elif pa.types.is_dictionary(field.type):
+            # A text column can be all missing, which pandas reads as float
+            df[field.name] = df[field.name].astype("string")
+    table = pa.Table.from_pandas(df, preserve_index=False).cast(schema)
+    if metadata:
+        extra = {f"{METADATA_PREFIX}{key}": json.dumps(value) for key, value in metadata.items()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **extra})
+
+    path = snapshot_path(name, snapshot_dir)
+    path.parent.mkdir(exist_ok=True)
+    pq.write_table(table, path, compression="zstd")
+    return path
+
+
+def read_snapshot(path, columns=None):
+    """
+    Reads a snapshot into a DataFrame, optionally only the given columns.
+    """
+    return pq.read_table(path, columns=columns).to_pandas()
+
+
+def read_snapshot_metadata(path):
+    """
+    Returns the metadata dict written with write_snapshot, read from the file footer only.
+    """
+    metadata = pq.read_schema(path).metadata or {}
+    return {
+        key.decode()[len(METADATA_PREFIX):]: json.loads(value)
+        for key, value in metadata.items() if key.decode().startswith(METADATA_PREFIX)
+    }
@@ -0,0 +1,159 @@
+"""
+Streaming loader for the full daily OWID time series (owid-covid-data.csv).
+
+The daily file is hundreds of MB, so it is read in chunks and reduced to one row per country
+while streaming: the latest value of every column (like owid-covid-latest.csv) plus rolling
+and peak death rates. Memory use depends on the chunk size and the number of countries,
+not on the size of the file.
+
+The result has the same columns as owid-covid-latest.csv, so it can be passed straight to
+cleaning.build_datasets() to get df_covid, df_age and df_health. The command line build also
+writes the master table the pages read, so the app and its caches pick up the new data.
+
+Run from the Streamlit folder with:
+    python streaming.py ../Data/owid-covid-data.csv
+"""
+import argparse
+import pandas as pd
+
+import cleaning
+
+# Aggregates are dropped while streaming, as in the notebook
+AGGREGATE_CODES = set(cleaning.AGGREGATE_ROWS) | set(cleaning.CONTINENT_ROWS)
+
+KEY_COLUMNS = ["iso_code", "continent", "location", "date"]
+
+# Columns needed to build the three cleaned datasets
+DATASET_COLUMNS = list(dict.fromkeys(
+    [c for c in cleaning.COVID_COLUMNS + cleaning.AGE_COLUMNS + cleaning.HEALTH_COLUMNS if c not in KEY_COLUMNS]
+))
+
+# Daily deaths per million used for the rolling and peak aggregates
+DAILY_COLUMN = "new_deaths_per_million"
+
+ROLLING_WINDOWS = [7, 28]
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def read_chunks(path, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields chunks of the daily file with the aggregate rows removed and only the selected columns.
+    """
+    columns = KEY_COLUMNS + [c for c in (columns or DATASET_COLUMNS + [DAILY_COLUMN]) if c not in KEY_COLUMNS]
+    text_columns = {"iso_code": "string", "continent": "string", "location": "string"}
+    reader = pd.read_csv(
+        path, usecols=lambda c: c in columns, dtype=text_columns,
+        parse_dates=["date"], chunksize=chunksize
+    )
+    for chunk in reader:
+        chunk = chunk[chunk["iso_code"].notna() & ~chunk["iso_code"].isin(AGGREGATE_CODES)]
+        if len(chunk):
+            yield chunk
+
+
+class CountryAggregator:
+    """
+    Reduces daily rows to one row per country, one chunk at a time.
+
+    Chunks are expected in file order (OWID sorts by country and date). The last window-1 days
+    of each country are carried over to the next chunk, so rolling sums are exact across chunk borders.
+    """
+
+    def __init__(self, windows=ROLLING_WINDOWS):
+        self.windows = windows
+        self.carry = None
+        self.latest = None
+        self.peak = None
+
+    def update(self, chunk):
+        chunk = chunk.assign(_new=True)
+        frame = chunk if self.carry is None else pd.concat([self.carry, chunk], ignore_index=True)
+        frame = frame.sort_values(["iso_code", "date"], kind="stable", ignore_index=True)
+
+        # Rolling sums as a difference of cumulative sums within each country (no Python loop)
+        daily = frame[DAILY_COLUMN].fillna(0)
+        cumulative = daily.groupby(frame["iso_code"]).cumsum()
+        for window in self.windows:
+            before_window = cumulative.groupby(frame["iso_code"]).shift(window).fillna(0)
+            frame[f"deaths_per_million_{window}d"] = cumulative - before_window
+
+        self.carry = frame.groupby("iso_code").tail(max(self.windows) - 1).assign(_new=False)
+
+        new_rows = frame[frame["_new"]].drop(columns="_new")
+        self._update_latest(new_rows)
+        self._update_peak(new_rows)
+
+    def _update_latest(self, rows):
+        # groupby().last() takes the last non-missing value of every column
+        chunk_latest = rows.groupby("iso_code").last()
+        if self.latest is None:
+            self.latest = chunk_latest
+        else:
+            self.latest = pd.concat([self.latest, chunk_latest]).groupby(level=0).last()
+
+    def _update_peak(self, rows):
+        column = f"deaths_per_million_{self.windows[0]}d"
+        idx = rows.groupby("iso_code")[column].idxmax()
+        chunk_peak = rows.loc[idx, ["iso_code", column, "date"]].set_index("iso_code")
+        chunk_peak.columns = ["peak_deaths_per_million", "peak_date"]
+        if self.peak is None:
+            self.peak = chunk_peak
+        else:
+            both = pd.concat([self.peak, chunk_peak]).reset_index()
+            best = both.groupby("iso_code")["peak_deaths_per_million"].idxmax()
+            self.peak = both.loc[best].set_index("iso_code")
+
+    def result(self):
+        """
+        Returns one row per country shaped like owid-covid-latest.csv, plus the rolling and peak columns.
+        """
+        if self.latest is None:
+            return pd.DataFrame(columns=KEY_COLUMNS)
+        df = self.latest.join(self.peak).reset_index()
+        df = df.rename(columns={"date": "last_updated_date"})
+        # Same row order as owid-covid-latest.csv
+        df = df.sort_values("location", ignore_index=True)
+        first = ["iso_code", "continent", "location", "last_updated_date"]
+        return df[first + [c for c in df.columns if c not in first]]
+
+
+def stream_latest(path, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """
+    Streams the daily file and returns the per-country aggregates.
+    """
+    aggregator = CountryAggregator()
+    for chunk in read_chunks(path, columns=columns, chunksize=chunksize):
+        aggregator.update(chunk)
+    return aggregator.result()
+
+
+def stream_datasets(path, hdi_path=cleaning.HDI_FILE, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Builds df_covid, df_age and df_health from the daily file without loading it into memory.
+    """
+    df_latest = stream_latest(path, chunksize=chunksize)
+    return cleaning.build_datasets(df_latest, hdi_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the cleaned datasets from the daily OWID file.")
+    parser.add_argument("path", help="path to owid-covid-data.csv")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows read per chunk")
+    parser.add_argument("--output-dir", default=str(cleaning.BASE_DIR), help="folder the cleaned datasets are written to")
+    args = parser.parse_args()
+
+    df_latest = stream_latest(args.path, chunksize=args.chunksize)
+    cleaning.write_dataset(df_latest, "raw", args.output_dir)
+    print(f"..Reduced {args.path} to {df_latest.shape[0]} countries")
+
+    # Same stages as cleaning.run_pipeline, including the master table with its median fills
+    prepared = cleaning.prepare_datasets(df_latest, cleaning.load_hdi_index(df_latest))
+    for stage in ["covid", "age", "health", "master"]:
+        df, metadata = cleaning.build_stage(stage, df_latest, prepared)
+        outputs = cleaning.write_dataset(df, stage, args.output_dir, metadata)
+        print(f"..Wrote {stage}: {df.shape[0]} rows -> {', '.join(output.name for output in outputs)}")
+
+
+if __name__ == "__main__":
+    main()
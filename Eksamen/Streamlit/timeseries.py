@@ -0,0 +1,201 @@
+"""
+Rolling-window analytics over the daily OWID time series (owid-covid-data.csv).
+
+The daily rows are sorted by (iso_code, date) and laid out as a dense country x day array,
+so every statistic is a NumPy operation along the day axis for all countries at once:
+
+  - rolling 7/28-day deaths per million from differences of a cumulative sum
+  - week-over-week growth rates of the rolling series
+  - wave peaks: days that are the highest value within +-PEAK_HALF_WINDOW days (found with
+    strided sliding windows) and reach at least PEAK_MIN_SHARE of the country's highest value
+
+The daily file is not part of the repository; download it from Our World in Data into the
+Data folder to use the Time Series page.
+"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from numpy.lib.stride_tricks import sliding_window_view
+
+import profiling
+import streaming
+from cleaning import DATA_DIR
+
+DAILY_FILE = DATA_DIR / "owid-covid-data.csv"
+
+DAILY_COLUMN = streaming.DAILY_COLUMN
+
+ROLLING_WINDOWS = streaming.ROLLING_WINDOWS
+
+# Days compared for the growth rate (this week vs the week before)
+GROWTH_LAG = 7
+
+# A peak is the highest 7-day value within this many days on either side...
+PEAK_HALF_WINDOW = 28
+# ...and at least this share of the country's highest 7-day value
+PEAK_MIN_SHARE = 0.1
+
+
+@dataclass
+class DailyPanel:
+    """
+    One value per (country, day). Days without a row in the file are NaN.
+    """
+    codes: pd.Index
+    names: pd.Series
+    dates: pd.DatetimeIndex
+    values: np.ndarray
+
+
+def build_panel(df, column=DAILY_COLUMN):
+    """
+    Turns daily rows (iso_code, location, date, column) into a country x day array.
+    """
+    df = df.sort_values(["iso_code", "date"], kind="stable")
+    code_idx, codes = pd.factorize(df["iso_code"], sort=True)
+    dates = pd.to_datetime(df["date"])
+    first = dates.min()
+    day_idx = (dates - first).dt.days.to_numpy()
+
+    values = np.full((len(codes), day_idx.max() + 1), np.nan)
+    values[code_idx, day_idx] = df[column].to_numpy(dtype=float)
+
+    names = df.drop_duplicates("iso_code").set_index("iso_code")["location"].astype(str).reindex(codes)
+    return DailyPanel(pd.Index(codes, name="iso_code"), names,
+                      pd.date_range(first, periods=values.shape[1], freq="D"), values)
+
+
+def observed(values):
+    """
+    True from a country's first to its last day with data, so gaps inside the series count as 0.
+    """
+    has_value = ~np.isnan(values)
+    started = np.maximum.accumulate(has_value, axis=1)
+    not_ended = np.maximum.accumulate(has_value[:, ::-1], axis=1)[:, ::-1]
+    return started & not_ended
+
+
+def rolling_sum(values, window):
+    """
+    Sum of the last window days for every country and day (NaN outside the country's data).
+    """
+    filled = np.nan_to_num(values)
+    cumulative = np.concatenate([np.zeros((len(filled), 1)), np.cumsum(filled, axis=1)], axis=1)
+    lagged = np.concatenate(
+        [np.zeros((len(filled), window)), cumulative[:, :-window]], axis=1
+    )[:, :cumulative.shape[1]]
+    result = (cumulative - lagged)[:, 1:]
+    return np.where(observed(values), result, np.nan)
+
+
+def growth_rate(rolling, lag=GROWTH_LAG):
+    """
+    Relative change of a rolling series against lag days earlier (NaN where the earlier value is 0).
+    """
+    previous = np.full_like(rolling, np.nan)
+    previous[:, lag:] = rolling[:, :-lag]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(previous > 0, rolling / previous - 1, np.nan)
+
+
+def detect_peaks(series, half_window=PEAK_HALF_WINDOW, min_share=PEAK_MIN_SHARE):
+    """
+    Returns a boolean array marking wave peaks in a (country x day) series.
+    """
+    padded = np.pad(np.nan_to_num(series, nan=-np.inf), ((0, 0), (half_window, half_window)),
+                    constant_values=-np.inf)
+    window_max = sliding_window_view(padded, 2 * half_window + 1, axis=1).max(axis=2)
+
+    # On a flat top only the first day counts
+    previous = np.concatenate([np.full((len(series), 1), -np.inf), np.nan_to_num(series, nan=-np.inf)[:, :-1]], axis=1)
+    country_max = np.nanmax(np.where(np.isnan(series), -np.inf, series), axis=1, keepdims=True)
+    return (series == window_max) & (series > previous) & (series > 0) & (series >= min_share * country_max)
+
+
+@dataclass
+class DailyAnalytics:
+    panel: DailyPanel
+    rolling: dict
+    growth: np.ndarray
+    peaks: np.ndarray
+
+
+def analyse(panel, windows=ROLLING_WINDOWS):
+    """
+    Computes the rolling sums for each window, the growth rate and the peaks of the shortest window.
+    """
+    rolling = {window: rolling_sum(panel.values, window) for window in windows}
+    short = rolling[min(windows)]
+    return DailyAnalytics(panel, rolling, growth_rate(short), detect_peaks(short))
+
+
+def country_frame(analytics, iso_codes):
+    """
+    Returns the daily rows of the given countries in long format, ready for plotting.
+    """
+    panel = analytics.panel
+    rows = panel.codes.get_indexer(iso_codes)
+    rows = rows[rows >= 0]
+    n_days = len(panel.dates)
+    frame = pd.DataFrame({
+        "iso_code": np.repeat(panel.codes[rows], n_days),
+        "location": np.repeat(panel.names.iloc[rows].to_numpy(), n_days),
+        "date": np.tile(panel.dates, len(rows)),
+        DAILY_COLUMN: panel.values[rows].ravel(),
+        "growth_rate": analytics.growth[rows].ravel(),
+        "peak": analytics.peaks[rows].ravel(),
+    })
+    for window, values in analytics.rolling.items():
+        frame[f"deaths_per_million_{window}d"] = values[rows].ravel()
+    return frame[observed(panel.values[rows]).ravel()].reset_index(drop=True)
+
+
+def country_summary(analytics):
+    """
+    One row per country: number of waves, the highest peak and when it happened, and the latest values.
+    """
+    panel = analytics.panel
+    short = analytics.rolling[min(analytics.rolling)]
+    has_data = ~np.isnan(short)
+    last_day = np.where(has_data.any(axis=1), has_data.shape[1] - 1 - np.argmax(has_data[:, ::-1], axis=1), 0)
+    rows = np.arange(len(panel.codes))
+    highest = np.argmax(np.where(has_data, short, -np.inf), axis=1)
+
+    summary = pd.DataFrame({
+        "location": panel.names.to_numpy(),
+        "waves": analytics.peaks.sum(axis=1),
+        "highest_7d_deaths_per_million": short[rows, highest],
+        "highest_peak_date": panel.dates[highest],
+        "latest_date": panel.dates[last_day],
+        "latest_7d_deaths_per_million": short[rows, last_day],
+        "latest_growth_rate": analytics.growth[rows, last_day],
+    }, index=panel.codes)
+    return summary[has_data.any(axis=1)].sort_values("location")
+
+
+def read_daily(path=DAILY_FILE):
+    """
+    Reads the columns needed from the daily file in chunks, without the aggregate rows.
+    """
+    return pd.concat(streaming.read_chunks(path, columns=[DAILY_COLUMN]), ignore_index=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+@profiling.counts_miss("daily")
+def _load_analytics(path, mtime_ns):
+    return analyse(build_panel(read_daily(path)))
+
+
+def daily_file_available(path=DAILY_FILE):
+    return os.path.exists(path)
+
+
+@profiling.timed("load:daily", cache="daily")
+def load_analytics(path=DAILY_FILE):
+    """
+    Returns the rolling-window analytics for the daily file, computed once per file version.
+    """
+    return _load_analytics(str(path), os.stat(path).st_mtime_ns)
@@ -0,0 +1,60 @@
+"""
+One process pool shared by the parallel model evaluations (resampling.py and importance.py).
+
+The evaluations run inside the Streamlit server, often from a precompute thread. Forking a
+process that runs threads can copy a lock some other thread is holding, and the child then
+hangs on it, so the workers are started with forkserver (spawn where forkserver does not
+exist) instead of fork. Starting such a worker costs an interpreter start and the imports of
+the module it runs, so the pool is created once per server and reused by every evaluation.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+_pool_workers = 0
+_lock = threading.Lock()
+
+
+def get_pool(n_workers):
+    """
+    Returns the shared process pool, with at least n_workers workers (and at least one per
+    CPU). A pool that is too small is replaced; work already submitted to it still finishes.
+    """
+    global _pool, _pool_workers
+    with _lock:
+        if _pool is None or n_workers > _pool_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool_workers = max(n_workers, os.cpu_count() or 1)
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers,
+                                        mp_context=multiprocessing.get_context(START_METHOD))
+        return _pool
+
+
+def _discard(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+
+
+def run_all(func, args, n_jobs):
+    """
+    Returns [func(*a) for a in args], run in this process when n_jobs is 1 and on the shared
+    pool otherwise. func must be a module-level function, so the workers can import it.
+    A pool whose worker died is dropped, so the next call starts a new one.
+    """
+    if n_jobs == 1:
+        return [func(*a) for a in args]
+    pool = get_pool(n_jobs)
+    try:
+        futures = [pool.submit(func, *a) for a in args]
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        _discard(pool)
+        raise